@@ -2,6 +2,29 @@ const express = require('express');
 const router = express.Router();
 const auth = require('../middleware/auth');
 const axios = require('axios');
+const http = require('http');
+
+// One pool of keep-alive connections to the Python ML service, so requests
+// reuse connections instead of opening a new one per call
+const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:8050';
+const mlClient = axios.create({
+  baseURL: ML_SERVICE_URL,
+  timeout: 5000,
+  httpAgent: new http.Agent({ keepAlive: true, maxSockets: 16 })
+});
+
+// Score many payloads in one request to the ML service's streaming endpoint
+// (newline-delimited JSON both ways); results come back in payload order
+async function streamPredictions(payloads) {
+  const body = payloads.map(payload => JSON.stringify(payload)).join('\n') + '\n';
+  const response = await mlClient.post('/api/predict/stream', body, {
+    headers: { 'Content-Type': 'application/x-ndjson' },
+    responseType: 'text',
+    transformResponse: [data => data],
+    timeout: 30000
+  });
+  return response.data.split('\n').filter(line => line.trim()).map(line => JSON.parse(line));
+}
 
 // Predictions endpoint that uses the Python ML service
 router.get('/grain-price/:customerId', auth, async (req, res) => {
@@ -40,15 +63,17 @@ router.get('/grain-price/:customerId', auth, async (req, res) => {
       }, 0) / allocations.length,
       monthly_rent_per_bag: allocations[0].rentPerBag || 50,
       total_rent_paid: allocations.reduce((sum, a) => sum + (a.totalRentPaid || 0), 0),
-      activity_status: 'active',
-      sold_status: 'not_sold'
+      activity_status: 'storing',
+      sold_status: 'no'
     };
 
     // Call Python ML service (dashboard_app.py should be running)
     try {
-      const mlResponse = await axios.post('http://localhost:8050/api/predict/price', features, {
-        timeout: 5000
-      });
+      const mlResponse = await mlClient.post('/api/predict/price', features);
+      // Band models answer with a label such as 'High Price'
+      if (typeof mlResponse.data.predicted_price !== 'number') {
+        throw new Error(`No numeric price from the ML service (${mlResponse.data.predicted_price})`);
+      }
       
       return res.json({
         prediction: mlResponse.data.predicted_price,
@@ -115,13 +140,11 @@ router.get('/profit-loss/:customerId', auth, async (req, res) => {
       }, 0) / allocations.length,
       monthly_rent_per_bag: allocations[0].rentPerBag || 50,
       total_rent_paid: totalCost,
-      activity_status: 'active'
+      activity_status: 'storing'
     };
 
     try {
-      const mlResponse = await axios.post('http://localhost:8050/api/predict/profit', features, {
-        timeout: 5000
-      });
+      const mlResponse = await mlClient.post('/api/predict/profit', features);
       
       return res.json({
         prediction: mlResponse.data.is_profitable,
@@ -170,13 +193,15 @@ router.get('/storage-duration/:customerId', auth, async (req, res) => {
       total_bags: allocations.reduce((sum, a) => sum + (a.totalBags || 0), 0),
       total_weight_kg: allocations.reduce((sum, a) => sum + (a.totalWeight || 0), 0),
       monthly_rent_per_bag: allocations[0].rentPerBag || 50,
-      activity_status: 'active'
+      activity_status: 'storing'
     };
 
     try {
-      const mlResponse = await axios.post('http://localhost:8050/api/predict/duration', features, {
-        timeout: 5000
-      });
+      const mlResponse = await mlClient.post('/api/predict/duration', features);
+      // Band models answer with a label such as 'Long-term'
+      if (typeof mlResponse.data.predicted_duration !== 'number') {
+        throw new Error(`No numeric duration from the ML service (${mlResponse.data.predicted_duration})`);
+      }
       
       const currentDuration = Math.floor((new Date() - new Date(allocations[0].startDate)) / (1000 * 60 * 60 * 24));
       const predictedDuration = mlResponse.data.predicted_duration;
@@ -240,18 +265,43 @@ router.get('/dashboard-predictions', auth, async (req, res) => {
       });
     }
 
-    for (const allocation of activeAllocations) {
-      try {
-        if (!allocation.customer) continue;
+    const allocations = activeAllocations.filter(allocation => allocation.customer);
+    const storageDays = allocation => Math.floor((new Date() - new Date(allocation.startDate)) / (1000 * 60 * 60 * 24));
 
+    // All allocations are scored in one request to the ML service
+    let mlResults = [];
+    try {
+      mlResults = await streamPredictions(allocations.map((allocation, index) => ({
+        customerId: index,
+        grain_type: allocation.grainType || 'wheat',
+        total_bags: allocation.totalBags || 0,
+        total_weight_kg: allocation.totalWeight || 0,
+        storage_duration_days: storageDays(allocation),
+        monthly_rent_per_bag: allocation.rentPerBag || 50,
+        total_rent_paid: allocation.totalRentPaid || 0,
+        activity_status: 'storing',
+        sold_status: 'no'
+      })));
+    } catch (mlError) {
+      console.error('ML service error:', mlError.message);
+    }
+
+    for (const [index, allocation] of allocations.entries()) {
+      try {
         const customerId = allocation.customer._id;
-        
-        // Simple profit/loss estimation
+        const mlPrediction = (mlResults[index] && mlResults[index].predictions) || {};
+
+        // Simple profit/loss estimation; isProfitable always agrees with
+        // profitLoss, the ML verdict is reported separately as mlProfitable
         const totalCost = allocation.totalRentPaid || 0;
         const avgPrice = 25; // ₹25/kg average
         const estimatedRevenue = (allocation.totalWeight || 0) * avgPrice;
         const profitLoss = estimatedRevenue - totalCost;
         const isProfitable = profitLoss > 0;
+        const mlProfitable = typeof mlPrediction.profitable === 'boolean' ? mlPrediction.profitable : null;
+        const predictedPrice = typeof mlPrediction.price === 'number'
+          ? mlPrediction.price
+          : avgPrice + ((allocation.totalBags || 0) * 0.01);
         
         // Safely get customer name
         let customerName = 'Unknown Customer';
@@ -270,9 +320,10 @@ router.get('/dashboard-predictions', auth, async (req, res) => {
           grainType: allocation.grainType || 'Unknown',
           totalBags: allocation.totalBags || 0,
           totalWeight: allocation.totalWeight || 0,
-          storageDuration: Math.floor((new Date() - new Date(allocation.startDate)) / (1000 * 60 * 60 * 24)),
-          predictedPrice: avgPrice + ((allocation.totalBags || 0) * 0.01),
+          storageDuration: storageDays(allocation),
+          predictedPrice: predictedPrice,
           isProfitable: isProfitable,
+          mlProfitable: mlProfitable,
           profitLoss: profitLoss,
           totalRentPaid: totalCost
         });
@@ -291,7 +342,7 @@ router.get('/dashboard-predictions', auth, async (req, res) => {
         }
 
         // Alert for long storage duration
-        const duration = Math.floor((new Date() - new Date(allocation.startDate)) / (1000 * 60 * 60 * 24));
+        const duration = storageDays(allocation);
         if (duration > 180) {
           alerts.push({
             type: 'info',
@@ -0,0 +1,127 @@
+"""
+WMS Analytics - Arrow Batch Format
+==================================
+Apache Arrow IPC stream encoding of /api/predict/batch requests and
+responses, for bulk callers that would otherwise spend longer encoding and
+decoding JSON than the models spend predicting.
+
+A request is one record batch (or several) with a column per payload key:
+
+    customerId (optional, any type), grain_type (string or dictionary),
+    total_bags, total_weight_kg, storage_duration_days,
+    monthly_rent_per_bag, total_rent_paid (numeric),
+    activity_status, sold_status (string or dictionary)
+
+Absent columns take the same defaults as absent JSON keys, and a null
+marks the value of that row as missing, which makes the row invalid. The
+response has customerId (when sent), a column per prediction (price,
+profitable, probability, duration; null where there is no prediction) and
+error (null for valid rows). Price and duration are string columns of band
+labels when the models are classifiers.
+
+Numeric float64 columns without nulls are read as NumPy views of the
+request body rather than copied, and categorical columns are encoded once
+per distinct value. Prediction arrays are handed to Arrow without copying
+and the response is written in one piece.
+
+Without pyarrow the service answers Arrow requests with 415.
+"""
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # JSON only
+    pa = None
+
+from feature_assembly import FEATURE_FIELDS
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+CATEGORICAL_KEYS = {key for key, _, encoder in FEATURE_FIELDS.values() if encoder}
+NUMERIC_KEYS = {key for key, _, encoder in FEATURE_FIELDS.values() if not encoder}
+
+
+def read_table(body):
+    """The record batches of an IPC stream, without copying the body"""
+    return pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+
+
+def _numeric(column):
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_floating(array.type) or pa.types.is_integer(array.type):
+        if array.type != pa.float64():
+            array = array.cast(pa.float64())
+        # Views the Arrow buffer when there are no nulls; nulls become NaN
+        return array.to_numpy(zero_copy_only=False)
+    raise ValueError(f'expected a numeric column, got {array.type}')
+
+
+def _categorical(column):
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if not pa.types.is_dictionary(array.type):
+        array = array.dictionary_encode()
+    return array.dictionary.to_pylist(), array.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+
+
+def feature_columns(table):
+    """{payload key: array} for FeatureAssembler.arrays(), from a request table"""
+    columns = {}
+    for name in table.column_names:
+        try:
+            if name in NUMERIC_KEYS:
+                columns[name] = _numeric(table.column(name))
+            elif name in CATEGORICAL_KEYS:
+                columns[name] = _categorical(table.column(name))
+        except (pa.ArrowException, ValueError) as e:
+            raise ValueError(f'column {name}: {e}') from e
+    return columns
+
+
+def customer_ids(table):
+    return table.column('customerId') if 'customerId' in table.column_names else None
+
+
+def _customer_id_array(values):
+    if pa is not None and isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    try:
+        return pa.array(values)
+    except (pa.ArrowException, TypeError):
+        # Mixed id types from a JSON request
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+
+def write_results(ids, outputs, errors, n_rows):
+    """IPC stream bytes for a batch's predictions
+
+    `outputs` are the arrays of batch_outputs(), NaN (or None for class
+    labels) where there is no prediction; `errors` maps invalid row indexes
+    to messages.
+    """
+    names, arrays = [], []
+    if ids is not None:
+        names.append('customerId')
+        arrays.append(_customer_id_array(ids))
+    for name, values in outputs.items():
+        names.append(name)
+        if values.dtype == object:
+            arrays.append(pa.array(values, pa.string()))
+            continue
+        missing = np.isnan(values)
+        if name == 'profitable':
+            arrays.append(pa.array(values == 1, mask=missing))
+        else:
+            arrays.append(pa.array(values, mask=missing if missing.any() else None))
+    names.append('error')
+    if errors:
+        arrays.append(pa.array([errors.get(i) for i in range(n_rows)], pa.string()))
+    else:
+        arrays.append(pa.nulls(n_rows, pa.string()))
+
+    table = pa.Table.from_arrays(arrays, names=names)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    # WSGI servers only send bytes
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,109 @@
+"""
+WMS Analytics - Batch Format Benchmark
+======================================
+Compares JSON with Arrow IPC for /api/predict/batch at 10k and 100k rows,
+through the Flask test client: client-side encoding of the request, the
+request itself (parse, assemble, predict, serialize on the server), and
+client-side decoding of the response.
+
+Run from wms-analytics/ (models must be trained):
+    python benchmarks/bench_batch_formats.py
+    python benchmarks/bench_batch_formats.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Measure the models and formats, not the cache or background threads
+os.environ['ML_CACHE_MAX_MB'] = '0'
+os.environ['ML_RELOAD_INTERVAL_SECONDS'] = '0'
+
+import pyarrow as pa  # noqa: E402
+
+import ml_api_service as svc  # noqa: E402
+from arrow_batch import ARROW_MIMETYPE  # noqa: E402
+from bench_suite import service_payloads  # noqa: E402
+
+
+def encode_json(payloads):
+    return json.dumps({'customers': payloads}).encode()
+
+
+def encode_arrow(payloads):
+    table = pa.Table.from_pylist(payloads)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_json(body):
+    return json.loads(body)['results']
+
+
+def decode_arrow(body):
+    return pa.ipc.open_stream(body).read_all()
+
+
+FORMATS = {
+    # name: (encode, Content-Type, Accept, decode)
+    'JSON': (encode_json, 'application/json', 'application/json', decode_json),
+    'Arrow IPC': (encode_arrow, ARROW_MIMETYPE, ARROW_MIMETYPE, decode_arrow),
+}
+
+
+def best_of(fn, repeats):
+    timings, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON vs Arrow IPC batch predictions')
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if not any(svc.models.values()):
+        print("✗ No models loaded; run train_models.py first")
+        return
+    client = svc.app.test_client()
+
+    print("=" * 80)
+    print("BATCH PREDICTION FORMATS")
+    print("=" * 80)
+    print(f"{'rows':>9} {'format':<11}{'req MB':>8}{'resp MB':>9}{'encode s':>10}{'request s':>11}"
+          f"{'decode s':>10}{'rows/s':>12}")
+    for n_rows in args.rows:
+        payloads = service_payloads(n_rows, 7)
+        totals = {}
+        for name, (encode, content_type, accept, decode) in FORMATS.items():
+            encode_s, body = best_of(lambda: encode(payloads), args.repeats)
+
+            def post():
+                response = client.post('/api/predict/batch', data=body, content_type=content_type,
+                                       headers={'Accept': accept})
+                assert response.status_code == 200, response.data[:200]
+                return response.data
+            request_s, response_body = best_of(post, args.repeats)
+            decode_s, decoded = best_of(lambda: decode(response_body), args.repeats)
+            assert len(decoded) == n_rows
+
+            totals[name] = encode_s + request_s + decode_s
+            print(f"{n_rows:>9,} {name:<11}{len(body) / 1e6:>8.2f}{len(response_body) / 1e6:>9.2f}"
+                  f"{encode_s:>10.3f}{request_s:>11.3f}{decode_s:>10.3f}{n_rows / totals[name]:>12,.0f}")
+        print(f"{'':>9} Arrow speedup end to end: {totals['JSON'] / totals['Arrow IPC']:.1f}x")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
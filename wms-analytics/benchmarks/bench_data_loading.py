@@ -0,0 +1,101 @@
+"""
+WMS Analytics - Data Loading Benchmark
+======================================
+Compares loading GRAIN_MOVEMENTS the way the scripts used to (read_csv plus
+to_datetime) with the Parquet store written by wms_data.py: full reads,
+column-pruned reads and column- plus partition-pruned reads of one
+financial year.
+
+The CSV is replicated --scale times (with dates spread over the same range)
+into a temporary directory, so larger volumes can be tried locally.
+
+Run from wms-analytics/:
+    python benchmarks/bench_data_loading.py
+    python benchmarks/bench_data_loading.py --scale 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import wms_data  # noqa: E402
+
+DASHBOARD_COLUMNS = ['transaction_date', 'grain_type', 'operation', 'total_weight_kg', 'number_of_bags']
+FY_START, FY_END = pd.Timestamp('2024-04-01'), pd.Timestamp('2025-03-31')
+
+
+def build_csv(path, scale):
+    movements = pd.read_csv(os.path.join(BASE_DIR, 'GRAIN_MOVEMENTS.csv'))
+    if scale > 1:
+        copies = []
+        for i in range(scale):
+            copy = movements.copy()
+            copy['transaction_id'] += i * len(movements)
+            copies.append(copy)
+        movements = pd.concat(copies, ignore_index=True)
+    movements.to_csv(path, index=False)
+    return len(movements)
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = len(fn())
+        timings.append(time.perf_counter() - start)
+    return min(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV vs Parquet loading')
+    parser.add_argument('--scale', type=int, default=10, help='copies of GRAIN_MOVEMENTS.csv to load')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if wms_data.pa is None:
+        print("✗ pyarrow is not installed; only the CSV path is available")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'GRAIN_MOVEMENTS.csv')
+        store = os.path.join(tmp, 'data_store')
+        rows = build_csv(csv_path, args.scale)
+        start = time.perf_counter()
+        wms_data.convert('grain_movements', csv_path=csv_path, store_dir=store)
+        convert_time = time.perf_counter() - start
+
+        def csv_legacy():
+            frame = pd.read_csv(csv_path)
+            frame['transaction_date'] = pd.to_datetime(frame['transaction_date'])
+            return frame
+
+        cases = [
+            ('CSV + to_datetime (all columns)', csv_legacy),
+            ('Parquet, all columns', lambda: wms_data.load_dataset('grain_movements', store_dir=store)),
+            ('Parquet, dashboard columns', lambda: wms_data.load_dataset(
+                'grain_movements', DASHBOARD_COLUMNS, store_dir=store)),
+            ('Parquet, dashboard columns, FY 2024-25', lambda: wms_data.load_dataset(
+                'grain_movements', DASHBOARD_COLUMNS, FY_START, FY_END, store_dir=store)),
+        ]
+
+        print("=" * 80)
+        print(f"DATA LOADING: {rows:,} grain movement rows (one-off conversion {convert_time:.2f}s)")
+        print("=" * 80)
+        print(f"{'case':<42}{'rows':>12}{'seconds':>10}{'speedup':>10}")
+        baseline = None
+        for label, fn in cases:
+            seconds, loaded = best_of(fn, args.repeats)
+            baseline = baseline or seconds
+            print(f"{label:<42}{loaded:>12,}{seconds:>10.3f}{baseline / seconds:>9.1f}x")
+        print("\n" + "=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+WMS Analytics - Feature Assembly Micro-benchmark
+================================================
+Compares building a one-row pandas DataFrame (the old request path) with
+FeatureAssembler.row() for a single prediction payload: time per request
+and memory allocated per request.
+
+Run from wms-analytics/:
+    python benchmarks/bench_feature_assembly.py
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from feature_assembly import MODEL_FEATURES, FeatureAssembler  # noqa: E402
+from feature_transform import FeatureTransform  # noqa: E402
+
+PAYLOAD = {
+    'grain_type': 'wheat',
+    'total_bags': 100,
+    'total_weight_kg': 5000,
+    'storage_duration_days': 90,
+    'monthly_rent_per_bag': 50,
+    'total_rent_paid': 15000,
+    'activity_status': 'storing',
+    'sold_status': 'no'
+}
+
+ENCODERS = FeatureTransform({
+    'grain': ['Barley', 'Maize', 'Millet', 'Rice', 'Sorghum', 'Wheat'],
+    'activity': ['sold', 'stored', 'storing'],
+    'sold': ['no', 'partial', 'yes']
+}).encoders()
+
+
+def dataframe_row(data):
+    """The per-request DataFrame the service used to build for the price model"""
+    return pd.DataFrame([{
+        'grain_type_encoded': ENCODERS['grain'](data.get('grain_type', 'wheat')),
+        'total_bags': float(data.get('total_bags', 0)),
+        'total_weight_kg': float(data.get('total_weight_kg', 0)),
+        'storage_duration_days': float(data.get('storage_duration_days', 0)),
+        'monthly_rent_per_bag': float(data.get('monthly_rent_per_bag', 50)),
+        'total_rent_paid': float(data.get('total_rent_paid', 0)),
+        'activity_status_encoded': ENCODERS['activity'](data.get('activity_status', 'storing')),
+        'sold_status_encoded': ENCODERS['sold'](data.get('sold_status', 'no'))
+    }])
+
+
+def peak_bytes(fn, calls=200):
+    """Peak traced memory per call"""
+    fn()
+    peaks = []
+    for _ in range(calls):
+        tracemalloc.start()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return float(np.median(peaks))
+
+
+def main():
+    assembler = FeatureAssembler(MODEL_FEATURES['price'], ENCODERS)
+    candidates = [
+        ('pandas DataFrame', lambda: dataframe_row(PAYLOAD)),
+        ('FeatureAssembler', lambda: assembler.row(PAYLOAD)),
+    ]
+
+    # Both paths must produce the same feature values in the same order
+    expected = dataframe_row(PAYLOAD)[MODEL_FEATURES['price']].to_numpy(dtype=np.float64)
+    assert np.array_equal(expected, assembler.row(PAYLOAD)), 'feature vectors differ'
+
+    print("=" * 80)
+    print("PER-REQUEST FEATURE ASSEMBLY")
+    print("=" * 80)
+    print(f"{'Method':<20}{'mean (us)':>12}{'best (us)':>12}{'peak alloc (B)':>18}")
+    results = {}
+    for name, fn in candidates:
+        runs = timeit.repeat(fn, number=2000, repeat=5)
+        mean_us = sum(runs) / len(runs) / 2000 * 1e6
+        best_us = min(runs) / 2000 * 1e6
+        peak = peak_bytes(fn)
+        results[name] = (mean_us, peak)
+        print(f"{name:<20}{mean_us:>12.2f}{best_us:>12.2f}{peak:>18,.0f}")
+
+    old, new = results['pandas DataFrame'], results['FeatureAssembler']
+    print("-" * 80)
+    print(f"Speedup: {old[0] / new[0]:.1f}x   Allocation reduction: {old[1] / max(new[1], 1):.1f}x")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
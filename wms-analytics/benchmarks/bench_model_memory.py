@@ -0,0 +1,133 @@
+"""
+WMS Analytics - Model Memory Benchmark
+======================================
+Starts several independent worker processes that each load the three
+models, either from the pickles (private copies, scikit-learn imported) or
+from the memory-mapped `.compiled/` artifacts, and reports per-worker cold
+start time and memory while all workers are alive.
+
+RSS counts shared pages in full for every process; PSS divides them between
+the processes mapping them, so the PSS column shows what each extra worker
+really costs. PSS is read from /proc and is only available on Linux.
+
+Run from wms-analytics/ after training and compiling the models:
+    python tree_engine.py
+    python benchmarks/bench_model_memory.py --workers 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = [
+    ('model1_price_prediction_BEST', 8),
+    ('model2_profit_classification_BEST', 7),
+    ('model3_storage_duration_BEST', 5),
+]
+
+
+def memory_kb():
+    """Rss and Pss of the current process in kB (Pss is None off Linux)"""
+    usage = {'Rss': None, 'Pss': None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in usage:
+                    usage[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        usage['Rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def load_models(mode):
+    if mode == 'pickle':
+        import pickle
+        models = []
+        for name, _ in MODELS:
+            with open(os.path.join(BASE_DIR, name + '.pkl'), 'rb') as f:
+                models.append(pickle.load(f))
+        return models
+
+    sys.path.insert(0, BASE_DIR)
+    from tree_engine import COMPILED_SUFFIX, CompiledModel
+    return [CompiledModel.load(os.path.join(BASE_DIR, name + COMPILED_SUFFIX)) for name, _ in MODELS]
+
+
+def worker(mode, started_at, barrier, results):
+    warnings.filterwarnings('ignore')
+    cold_start = time.time() - started_at
+    load_start = time.perf_counter()
+    models = load_models(mode)
+    load_time = time.perf_counter() - load_start
+
+    # Predict once per model so every node array is actually paged in
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for model, (_, n_features) in zip(models, MODELS):
+        model.predict(rng.uniform(0, 1000, size=(1000, n_features)))
+
+    # Measure only once every worker has loaded, so shared pages are split
+    barrier.wait()
+    usage = memory_kb()
+    results.put({'cold_start_s': cold_start + load_time, 'load_s': load_time,
+                 'rss_kb': usage['Rss'], 'pss_kb': usage['Pss']})
+    barrier.wait()
+
+
+def run(mode, workers):
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = []
+    for _ in range(workers):
+        process = ctx.Process(target=worker, args=(mode, time.time(), barrier, results))
+        process.start()
+        processes.append(process)
+    samples = [results.get(timeout=300) for _ in range(workers)]
+    for process in processes:
+        process.join()
+    return samples
+
+
+def mean(samples, key):
+    values = [s[key] for s in samples if s[key] is not None]
+    return sum(values) / len(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pickle and memory-mapped model loading')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    modes = []
+    if all(os.path.exists(os.path.join(BASE_DIR, name + '.pkl')) for name, _ in MODELS):
+        modes.append('pickle')
+    if all(os.path.isdir(os.path.join(BASE_DIR, name + '.compiled')) for name, _ in MODELS):
+        modes.append('compiled')
+    if not modes:
+        print("✗ No models found. Train the notebooks and run python tree_engine.py first.")
+        return
+
+    print("=" * 80)
+    print(f"MODEL MEMORY: {args.workers} independent workers")
+    print("=" * 80)
+    print(f"{'mode':>10}{'cold start s':>14}{'load s':>9}{'RSS MB':>9}{'PSS MB':>9}{'total PSS MB':>14}")
+    for mode in modes:
+        samples = run(mode, args.workers)
+        pss = mean(samples, 'pss_kb')
+        pss_text = f"{pss / 1024:>9.1f}{pss * len(samples) / 1024:>14.1f}" if pss else f"{'n/a':>9}{'n/a':>14}"
+        print(f"{mode:>10}{mean(samples, 'cold_start_s'):>14.3f}{mean(samples, 'load_s'):>9.3f}"
+              f"{mean(samples, 'rss_kb') / 1024:>9.1f}{pss_text}")
+
+    print("\n" + "=" * 80)
+
+
+if __name__ == '__main__':
+    main()
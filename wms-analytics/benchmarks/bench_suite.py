@@ -0,0 +1,498 @@
+"""
+WMS Analytics - Benchmark Suite
+===============================
+Reproducible end-to-end benchmarks, written to JSON so runs on different
+commits can be compared:
+
+- data:      generating synthetic CUSTOMER_ACTIVITIES and GRAIN_MOVEMENTS
+             exports, converting them to the Parquet store and rebuilding the
+             dashboard rollups
+- dashboard: dashboard_app.py's rollup load and date slicing, and full page
+             runs (cold and cached) through Streamlit's AppTest
+- report:    data_visualization.py's aggregation (in memory and streamed)
+             and figure rendering
+- service:   ml_api_service.py's single and batch prediction endpoints
+             through the Flask test client: latency percentiles and
+             throughput
+
+The synthetic exports have the same columns as the real ones and plausible
+values (rent = bags x rent per bag x months, profit = sales - rent, ...).
+They are generated from --seed in fixed-size chunks, so a given size and
+seed always yields the same rows, and are kept under --data-dir between
+runs. Every dataset size is benchmarked in its own process, pointed at its
+own data through WMS_DATA_DIR and WMS_DATA_STORE.
+
+The service section uses the models the service itself loads (run
+train_models.py first), with the prediction cache and hot reload disabled
+and distinct payloads for every request.
+
+Run from wms-analytics/:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --rows 10k 1M 10M --output bench-$(git rev-parse --short HEAD).json
+    python benchmarks/bench_suite.py --sections service --compare bench-old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+SECTIONS = ['data', 'dashboard', 'report', 'service']
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+GENERATE_CHUNK_ROWS = 500_000
+
+GRAIN_TYPES = ['Barley', 'Maize', 'Millet', 'Rice', 'Sorghum', 'Wheat']
+CUSTOMERS = 2000
+ACTIVITY_START, ACTIVITY_DAYS = pd.Timestamp('2023-01-01'), 601
+MOVEMENT_START, MOVEMENT_DAYS = pd.Timestamp('2023-01-01'), 701
+
+DASHBOARD_PAGES = ['Grain Movement Analysis', 'Customer Activity & Sales']
+DASHBOARD_FILTERS = [('All Time', None), ('Financial Year', '2024-2025')]
+FY_START, FY_END = pd.Timestamp('2024-04-01'), pd.Timestamp('2025-03-31')
+
+
+def parse_rows(value):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    suffix = value[-1:].lower()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(value)
+
+
+def size_label(rows):
+    for suffix, factor in (('M', 1_000_000), ('k', 1_000)):
+        if rows >= factor and rows % factor == 0:
+            return f'{rows // factor}{suffix}'
+    return str(rows)
+
+
+# =============================================================================
+# Synthetic data
+# =============================================================================
+
+def _customers(rng, n):
+    ids = rng.integers(1, CUSTOMERS + 1, n)
+    text = pd.Series(ids).astype(str)
+    return ids, text
+
+
+def customer_activities_chunk(rng, n):
+    customer_id, text_id = _customers(rng, n)
+    start = ACTIVITY_START + pd.to_timedelta(rng.integers(0, ACTIVITY_DAYS, n), unit='D')
+    duration = rng.integers(10, 181, n)
+    end = start + pd.to_timedelta(duration, unit='D')
+    bags = rng.integers(10, 201, n)
+    weight = bags * rng.choice([25, 50], n)
+    rent_per_bag = rng.integers(20, 61, n)
+    rent = np.round(bags * rent_per_bag * duration / 30, 2)
+    price = rng.integers(25, 56, n)
+    sales = np.where(rng.random(n) < 0.5, weight * price, 0)
+    return pd.DataFrame({
+        'customer_id': customer_id,
+        'customer_name': 'Customer_' + text_id,
+        'customer_email': 'customer' + text_id + '@mail.com',
+        'activity_status': rng.choice(['sold', 'stored', 'storing'], n),
+        'grain_type': rng.choice(GRAIN_TYPES, n),
+        'storage_start_date': start.strftime('%Y-%m-%d'),
+        'storage_end_date': end.strftime('%Y-%m-%d'),
+        'total_bags': bags,
+        'total_weight_kg': weight,
+        'storage_duration_days': duration,
+        'monthly_rent_per_bag': rent_per_bag,
+        'total_rent_paid': rent,
+        'sold_status': rng.choice(['no', 'partial', 'yes'], n),
+        'sale_price_per_kg': price,
+        'total_sale_amount': sales,
+        'sale_date': end.strftime('%Y-%m-%d'),
+        'profit_loss': np.round(sales - rent, 2),
+    })
+
+
+def grain_movements_chunk(rng, n, first_id):
+    customer_id, text_id = _customers(rng, n)
+    dates = MOVEMENT_START + pd.to_timedelta(rng.integers(0, MOVEMENT_DAYS, n), unit='D')
+    bags = rng.integers(10, 201, n)
+    bag_weight = rng.choice([25, 50], n)
+    return pd.DataFrame({
+        'transaction_id': np.arange(first_id, first_id + n),
+        'transaction_date': dates.strftime('%Y-%m-%d'),
+        'transaction_type': 'Warehouse Movement',
+        'customer_id': customer_id,
+        'customer_name': 'Customer_' + text_id,
+        'grain_type': rng.choice(GRAIN_TYPES, n),
+        'operation': rng.choice(['IN', 'OUT'], n),
+        'number_of_bags': bags,
+        'bag_weight_kg': bag_weight,
+        'total_weight_kg': bags * bag_weight,
+        'quality_grade': rng.choice(['A', 'B', 'C'], n),
+        'moisture_content': np.round(rng.uniform(10, 16.5, n), 2),
+    })
+
+
+def generate(name, rows, path, seed):
+    """Write `rows` synthetic rows of dataset `name` to the CSV at `path`"""
+    import wms_data
+    columns = list(pd.read_csv(os.path.join(BASE_DIR, wms_data.DATASETS[name]['csv']), nrows=0).columns)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for index, first in enumerate(range(0, rows, GENERATE_CHUNK_ROWS)):
+            n = min(GENERATE_CHUNK_ROWS, rows - first)
+            # Seeded per chunk, so the same size and seed always give the same rows
+            rng = np.random.default_rng([seed, index, name == 'grain_movements'])
+            if name == 'grain_movements':
+                chunk = grain_movements_chunk(rng, n, first + 1)
+            else:
+                chunk = customer_activities_chunk(rng, n)
+            chunk[columns].to_csv(f, header=index == 0, index=False)
+    os.replace(tmp_path, path)
+
+
+def ensure_data(data_dir, rows, seed):
+    """Directory holding both synthetic exports at this size; generated once"""
+    import wms_data
+    directory = os.path.join(data_dir, f'{size_label(rows)}-seed{seed}')
+    os.makedirs(directory, exist_ok=True)
+    timings = {}
+    for name, spec in wms_data.DATASETS.items():
+        path = os.path.join(directory, spec['csv'])
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            generate(name, rows, path, seed)
+            timings[name] = time.perf_counter() - start
+            print(f"✓ Generated {rows:,} {name} rows in {timings[name]:.1f}s")
+    return directory, timings
+
+
+# =============================================================================
+# Measurement helpers
+# =============================================================================
+
+def timed(fn, repeats):
+    """Best and mean wall time of `repeats` calls"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {'seconds': min(timings), 'mean_seconds': sum(timings) / len(timings), 'repeats': repeats}
+
+
+def latency_stats(latencies, wall_seconds, errors, rows_per_request=1):
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'mean_ms': float(latencies_ms.mean()),
+        'max_ms': float(latencies_ms.max()),
+        'requests_per_second': len(latencies) / wall_seconds,
+        'rows_per_second': len(latencies) * rows_per_request / wall_seconds,
+    }
+
+
+# =============================================================================
+# Sections (each size runs in a child process, see run_child)
+# =============================================================================
+
+def bench_data(repeats):
+    import wms_data
+    import wms_rollups
+    results = {}
+    for name in wms_data.DATASETS:
+        # Conversion rewrites the store, so it is timed once
+        start = time.perf_counter()
+        wms_data.convert(name)
+        results[f'convert.{name}'] = {'seconds': time.perf_counter() - start, 'mean_seconds': None,
+                                      'repeats': 1}
+
+    def rebuild_rollups():
+        shutil.rmtree(wms_rollups.rollup_dir(), ignore_errors=True)
+        wms_rollups.update_rollups()
+
+    results['rollups.rebuild'] = timed(rebuild_rollups, repeats)
+    results['rollups.noop_update'] = timed(wms_rollups.update_rollups, repeats)
+    return results
+
+
+def bench_dashboard(repeats):
+    # AppTest runs the script outside `streamlit run`; keep its log quiet
+    os.environ.setdefault('STREAMLIT_LOGGER_LEVEL', 'error')
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    from wms_rollups import date_slice, load_rollup
+
+    results = {
+        'load_rollups': timed(lambda: (load_rollup('movements_daily'), load_rollup('activities_daily')),
+                              repeats),
+    }
+    movements = load_rollup('movements_daily')
+    results['date_slice.fy'] = timed(lambda: date_slice('movements_daily', movements, FY_START, FY_END),
+                                     repeats * 100)
+
+    app_path = os.path.join(BASE_DIR, 'dashboard_app.py')
+    for page in DASHBOARD_PAGES:
+        for filter_type, year in DASHBOARD_FILTERS:
+            def run_page():
+                at = AppTest.from_file(app_path, default_timeout=600)
+                at.run()
+                at.sidebar.radio[0].set_value(page)
+                at.sidebar.selectbox[0].set_value(filter_type).run()
+                if year:
+                    at.sidebar.selectbox[1].set_value(year).run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+
+            def cold():
+                st.cache_data.clear()
+                st.cache_resource.clear()
+                run_page()
+
+            key = f"page.{page.split()[0].lower()}.{filter_type.replace(' ', '_').lower()}"
+            results[f'{key}.cold'] = timed(cold, repeats)
+            results[f'{key}.cached'] = timed(run_page, repeats)
+    return results
+
+
+def bench_report(repeats, chunk_rows, dpi):
+    import matplotlib
+    matplotlib.use('Agg')
+    import data_visualization as dv
+
+    results = {
+        'aggregate.in_memory': timed(lambda: dv.compute_aggregates(), repeats),
+        'aggregate.streamed': timed(lambda: dv.compute_aggregates(True, chunk_rows), repeats),
+        'aggregate.per_grain': timed(lambda: dv.compute_aggregates(True, chunk_rows, by_grain=True), repeats),
+    }
+    reports = dv.compute_aggregates()
+    with tempfile.TemporaryDirectory() as output_dir:
+        jobs = dv.figure_jobs(reports, list(dv.FIGURES), output_dir, dpi)
+        results['render'] = timed(lambda: list(dv.render_all(jobs, 1)), repeats)
+    results['render']['figures'] = len(jobs)
+    return results
+
+
+def service_payloads(n, seed):
+    from feature_assembly import FEATURE_FIELDS
+    rows = customer_activities_chunk(np.random.default_rng([seed, n]), n)
+    keys = [key for key, _, _ in FEATURE_FIELDS.values()]
+    payloads = rows[keys].to_dict('records')
+    for i, payload in enumerate(payloads):
+        payload['customerId'] = i
+        # Plain Python numbers for the JSON encoder
+        for key, value in payload.items():
+            if isinstance(value, np.generic):
+                payload[key] = value.item()
+    return payloads
+
+
+def drive(client, path, bodies, warmup):
+    for body in bodies[:warmup]:
+        client.post(path, json=body)
+    latencies, errors = [], 0
+    wall_start = time.perf_counter()
+    for body in bodies[warmup:]:
+        start = time.perf_counter()
+        response = client.post(path, json=body)
+        latencies.append(time.perf_counter() - start)
+        errors += response.status_code != 200
+    return latencies, time.perf_counter() - wall_start, errors
+
+
+def bench_service(requests, batch_sizes, batch_requests, seed):
+    # Measure the models, not the cache or background threads
+    os.environ['ML_CACHE_MAX_MB'] = '0'
+    os.environ['ML_RELOAD_INTERVAL_SECONDS'] = '0'
+    import ml_api_service as svc
+
+    loaded = [name for name, model in svc.models.items() if model is not None]
+    if not loaded:
+        print("✗ No models loaded; run train_models.py first")
+        return {'models': []}
+    client = svc.app.test_client()
+    warmup = min(50, requests)
+    results = {'models': {name: svc.models[name].version for name in loaded}}
+
+    payloads = service_payloads(requests + warmup, seed)
+    for name in loaded:
+        latencies, wall, errors = drive(client, f'/api/predict/{name}', payloads, warmup)
+        results[f'single.{name}'] = latency_stats(latencies, wall, errors)
+
+    for size in batch_sizes:
+        count = batch_requests + 2
+        payloads = service_payloads(size * count, seed + size)
+        bodies = [{'customers': payloads[i * size:(i + 1) * size]} for i in range(count)]
+        latencies, wall, errors = drive(client, '/api/predict/batch', bodies, 2)
+        results[f'batch.{size}'] = latency_stats(latencies, wall, errors, size)
+    return results
+
+
+def run_child(args):
+    """One section for one dataset size, in this process; returns its results"""
+    if args.section == 'data':
+        return bench_data(args.repeats)
+    if args.section == 'dashboard':
+        return bench_dashboard(args.repeats)
+    if args.section == 'report':
+        return bench_report(args.repeats, args.chunk_rows, args.dpi)
+    return bench_service(args.requests, args.batch_sizes, args.batch_requests, args.seed)
+
+
+def spawn(args, section, data_directory=None):
+    """Run one section in a fresh process and return its results"""
+    env = dict(os.environ)
+    if data_directory:
+        env['WMS_DATA_DIR'] = data_directory
+        env['WMS_DATA_STORE'] = os.path.join(data_directory, 'data_store')
+    with tempfile.NamedTemporaryFile('r', suffix='.json') as result:
+        command = [sys.executable, os.path.abspath(__file__), '--child-section', section,
+                   '--child-result', result.name, '--seed', str(args.seed), '--repeats', str(args.repeats),
+                   '--chunk-rows', str(args.chunk_rows), '--dpi', str(args.dpi),
+                   '--requests', str(args.requests), '--batch-requests', str(args.batch_requests),
+                   '--batch-sizes', *map(str, args.batch_sizes)]
+        completed = subprocess.run(command, cwd=BASE_DIR, env=env)
+        if completed.returncode != 0:
+            print(f"✗ {section} benchmark failed (exit code {completed.returncode})")
+            return {'error': f'exit code {completed.returncode}'}
+        return json.load(result)
+
+
+# =============================================================================
+# Reporting
+# =============================================================================
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': {'seconds': 1}}} -> {'a.b': {'seconds': 1}}"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict) and not any(k in value for k in ('seconds', 'p50_ms')):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, dict):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def headline(stats):
+    """(value, unit) that best summarizes one measurement; lower is better"""
+    if 'p50_ms' in stats:
+        return stats['p50_ms'], 'p50 ms'
+    return stats['seconds'], 's'
+
+
+def print_results(report, baseline=None):
+    flat = flatten(report['results'])
+    old = flatten(baseline['results']) if baseline else {}
+    print("=" * 80)
+    print(f"BENCHMARK RESULTS ({report['meta']['commit'] or 'no commit'})")
+    if baseline:
+        print(f"compared with {baseline['meta']['commit'] or 'no commit'}")
+    print("=" * 80)
+    print(f"{'case':<52}{'value':>12}{'':<8}{'vs base':>8}")
+    for key, stats in flat.items():
+        value, unit = headline(stats)
+        change = ''
+        if key in old:
+            before = headline(old[key])[0]
+            change = f'{value / before:.2f}x' if before else ''
+        print(f"{key:<52}{value:>12.4f} {unit:<7}{change:>8}")
+    print("=" * 80)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the WMS data pipeline, dashboard, report and ML service')
+    parser.add_argument('--rows', nargs='+', default=['10k'],
+                        help='synthetic dataset sizes, e.g. 10k 1M 10M')
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'wms-bench-data'),
+                        help='where the synthetic exports are kept between runs')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per timed case (best is reported)')
+    parser.add_argument('--chunk-rows', type=int, default=250_000, help='chunk size for the streamed report')
+    parser.add_argument('--dpi', type=int, default=100, help='figure resolution for the report')
+    parser.add_argument('--requests', type=int, default=500, help='requests per single-prediction endpoint')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[10, 100, 1000],
+                        help='customers per /api/predict/batch request')
+    parser.add_argument('--batch-requests', type=int, default=20, help='requests per batch size')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--child-section', choices=SECTIONS, help=argparse.SUPPRESS)
+    parser.add_argument('--child-result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_section:
+        args.section = args.child_section
+        results = run_child(args)
+        with open(args.child_result, 'w') as f:
+            json.dump(results, f)
+        return
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'args': {key: value for key, value in vars(args).items() if not key.startswith('child')},
+        },
+        'results': {},
+    }
+
+    data_sections = [section for section in ('data', 'dashboard', 'report') if section in args.sections]
+    for rows in map(parse_rows, args.rows) if data_sections else []:
+        label = size_label(rows)
+        directory, generated = ensure_data(args.data_dir, rows, args.seed)
+        size_results = report['results'].setdefault(label, {})
+        for name, seconds in generated.items():
+            size_results.setdefault('generate', {})[name] = {'seconds': seconds, 'mean_seconds': None,
+                                                             'repeats': 1}
+        for section in ('data', 'dashboard', 'report'):
+            # The dashboard and report read the store that the data section writes
+            if section in data_sections or (section == 'data' and not os.path.isdir(
+                    os.path.join(directory, 'data_store'))):
+                print(f"Running {section} benchmarks on {label} rows...")
+                size_results[section] = spawn(args, section, directory)
+
+    if 'service' in args.sections:
+        print("Running service benchmarks...")
+        report['results']['service'] = spawn(args, 'service')
+
+    tmp_path = f'{args.output}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, args.output)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(report, baseline)
+    print(f"✓ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
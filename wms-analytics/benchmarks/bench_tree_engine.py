@@ -0,0 +1,98 @@
+"""
+WMS Analytics - Compiled Engine Benchmark
+=========================================
+Checks that the compiled NumPy models agree with the pickled scikit-learn
+models on CUSTOMER_ACTIVITIES.csv and compares single-row latency.
+
+Run from wms-analytics/ after training and compiling the models:
+    python tree_engine.py
+    python benchmarks/bench_tree_engine.py
+"""
+
+import os
+import pickle
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from tree_engine import COMPILED_SUFFIX, CompiledModel  # noqa: E402
+
+warnings.filterwarnings('ignore')
+
+MODELS = [
+    ('model1_price_prediction_BEST', 8),
+    ('model2_profit_classification_BEST', 7),
+    ('model3_storage_duration_BEST', 5),
+]
+
+NUMERIC_COLUMNS = ['total_bags', 'total_weight_kg', 'storage_duration_days',
+                   'monthly_rent_per_bag', 'total_rent_paid']
+
+
+def sample_matrix(n_features):
+    """Realistic feature rows built from the activity export"""
+    activities = pd.read_csv(os.path.join(BASE_DIR, 'CUSTOMER_ACTIVITIES.csv'))
+    grain = activities['grain_type'].astype('category').cat.codes.to_numpy(float)
+    status = activities['activity_status'].astype('category').cat.codes.to_numpy(float)
+    sold = activities['sold_status'].astype('category').cat.codes.to_numpy(float)
+    numeric = activities[NUMERIC_COLUMNS].to_numpy(float)
+    if n_features == 8:
+        return np.column_stack([grain, numeric, status, sold])
+    if n_features == 7:
+        return np.column_stack([grain, numeric, status])
+    return np.column_stack([grain, numeric[:, [0, 1, 3]], status])
+
+
+def latency_ms(predict, rows, repeats=500):
+    timings = []
+    for i in range(repeats):
+        row = rows[i % len(rows):i % len(rows) + 1]
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    print("=" * 80)
+    print("COMPILED ENGINE vs SCIKIT-LEARN")
+    print("=" * 80)
+    for name, n_features in MODELS:
+        pkl_path = os.path.join(BASE_DIR, name + '.pkl')
+        compiled_path = os.path.join(BASE_DIR, name + COMPILED_SUFFIX)
+        if not (os.path.exists(pkl_path) and os.path.exists(compiled_path)):
+            print(f"\n✗ {name}: missing .pkl or {COMPILED_SUFFIX} artifact, skipped")
+            continue
+
+        with open(pkl_path, 'rb') as f:
+            sk_model = pickle.load(f)
+        compiled = CompiledModel.load(compiled_path)
+
+        X = sample_matrix(n_features)
+        labels_match = np.array_equal(sk_model.predict(X), compiled.predict(X))
+        proba_diff = np.abs(sk_model.predict_proba(X) - compiled.predict_proba(X)).max()
+
+        # sklearn is timed the way the service calls it: one-row DataFrame in
+        columns = getattr(sk_model, 'feature_names_in_', None)
+        sk_p50, sk_p99 = latency_ms(lambda row: sk_model.predict(pd.DataFrame(row, columns=columns)), X)
+        np_p50, np_p99 = latency_ms(compiled.predict, X)
+
+        print(f"\n{name}:")
+        print(f"  Rows checked:          {len(X):,}")
+        print(f"  Labels identical:      {'✓' if labels_match else '✗'}")
+        print(f"  Max probability diff:  {proba_diff:.3e}")
+        print(f"  sklearn  p50 / p99:    {sk_p50:.3f} / {sk_p99:.3f} ms")
+        print(f"  compiled p50 / p99:    {np_p50:.3f} / {np_p99:.3f} ms")
+        print(f"  p99 speedup:           {sk_p99 / np_p99:.1f}x")
+
+    print("\n" + "=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+WMS Analytics - ML Service Load Test
+====================================
+Starts serve_ml.py with an increasing number of worker processes and drives
+each configuration with concurrent keep-alive clients, reporting requests
+per second so scaling with cores can be checked on a local machine.
+
+Run from wms-analytics/ (models must be trained):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workers 1 2 4 8 --clients 32 --duration 15
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Distinct payloads so the prediction cache does not answer every request
+BODIES = [json.dumps({
+    'grain_type': 'wheat',
+    'total_bags': 50 + i,
+    'total_weight_kg': (50 + i) * 50,
+    'storage_duration_days': 30 + i % 300,
+    'monthly_rent_per_bag': 50,
+    'total_rent_paid': 1500 + 25 * i,
+    'activity_status': 'storing'
+}) for i in range(2000)]
+
+
+def wait_until_healthy(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client_loop(port, path, duration, connections):
+    """Send requests over `connections` keep-alive connections for `duration` seconds"""
+    conns = [http.client.HTTPConnection('127.0.0.1', port, timeout=10) for _ in range(connections)]
+    headers = {'Content-Type': 'application/json'}
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        conn = conns[i % connections]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=BODIES[i % len(BODIES)], headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_config(workers, args):
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, 'serve_ml.py'),
+         '--workers', str(workers), '--threads', str(args.threads),
+         '--bind', f'127.0.0.1:{port}'],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_healthy(port):
+            raise RuntimeError(f'server with {workers} workers did not become healthy')
+
+        processes = max(1, min(args.clients, os.cpu_count() or 1))
+        per_process = max(1, args.clients // processes)
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(client_loop, port, args.path, args.duration, per_process)
+                       for _ in range(processes)]
+            results = [f.result() for f in futures]
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(l for lats, _ in results for l in lats)
+    errors = sum(e for _, e in results)
+    count = len(latencies)
+    return {
+        'workers': workers,
+        'requests': count,
+        'errors': errors,
+        'rps': count / args.duration,
+        'p50_ms': latencies[count // 2] * 1000 if count else None,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] * 1000 if count else None,
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Load test the WMS ML service')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, max(1, cores // 2), cores}))
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=4 * cores)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--path', default='/api/predict/profit')
+    parser.add_argument('--port', type=int, default=8061)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"LOAD TEST: {args.path}, {args.clients} clients, {args.duration:.0f}s per run, {cores} cores")
+    print("=" * 80)
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    results = []
+    for workers in args.workers:
+        result = run_config(workers, args)
+        results.append(result)
+        print(f"{result['workers']:>8}{result['requests']:>10}{result['errors']:>8}"
+              f"{result['rps']:>10.0f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cores': cores, 'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n✓ Saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
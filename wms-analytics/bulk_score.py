@@ -0,0 +1,322 @@
+"""
+WMS Analytics - Bulk Scoring
+============================
+Price, profit and duration predictions for every row of an export, without
+going through the HTTP API. The models, encoders and batch code are those of
+ml_api_service.py, so the predictions are the ones the service would give,
+and rows it would reject get a prediction_error instead.
+
+The input is read in chunks (CSV, Parquet, or newline-delimited JSON such as
+a mongoexport dump, where nested fields become dotted column names). Chunks
+are scored by a pool of worker processes, a few at a time, and written out
+in input order with the prediction columns appended:
+
+    predicted_price, predicted_profitable, profit_probability,
+    predicted_duration, prediction_error
+
+Price and duration are the band labels ('High Price', 'Long-term', ...) of
+the classifiers train_models.py produces. A run where a prediction column
+stays empty for every valid row, or an input without rows, fails without
+writing any output.
+
+Memory is bounded by --chunk-rows times the number of chunks in flight,
+whatever the size of the input.
+
+Run with:
+    python bulk_score.py CUSTOMER_ACTIVITIES.csv --output scored.parquet
+    python bulk_score.py allocations.json --output scored.csv --workers 4 \\
+        --rename storageDetails.totalWeight=total_weight_kg --set activity_status=storing
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV only
+    pa = None
+
+from feature_assembly import FEATURE_FIELDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# batch_outputs() key -> output column
+PREDICTION_COLUMNS = {
+    'price': 'predicted_price',
+    'profitable': 'predicted_profitable',
+    'probability': 'profit_probability',
+    'duration': 'predicted_duration',
+}
+ERROR_COLUMN = 'prediction_error'
+
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.json': 'ndjson', '.jsonl': 'ndjson', '.ndjson': 'ndjson'}
+
+
+def file_format(path, given=None):
+    if given:
+        return given
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f'Cannot tell the format of {path}; pass it explicitly')
+    return FORMATS[extension]
+
+
+# =============================================================================
+# Input
+# =============================================================================
+
+def read_chunks(path, input_format, chunk_rows):
+    """DataFrames of at most chunk_rows rows, in file order"""
+    if input_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif input_format == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        records = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+                if len(records) >= chunk_rows:
+                    yield pd.json_normalize(records)
+                    records = []
+        if records:
+            yield pd.json_normalize(records)
+
+
+# =============================================================================
+# Scoring (runs in the worker processes)
+# =============================================================================
+
+def feature_columns(frame, sources, constants):
+    """{payload key: array} for FeatureAssembler.arrays(), from one chunk"""
+    n_rows = len(frame)
+    columns = {}
+    for key, _, encoder in FEATURE_FIELDS.values():
+        if key in constants:
+            values = pd.Series([constants[key]] * n_rows)
+        elif sources.get(key, key) in frame:
+            values = frame[sources.get(key, key)]
+        else:
+            continue  # the service's default applies
+        if encoder:
+            codes, categories = pd.factorize(values)
+            columns[key] = (list(categories), codes)
+        else:
+            # Values that are not numbers count as missing, making the row invalid
+            columns[key] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return columns
+
+
+def score_chunk(frame, sources, constants):
+    """The chunk with prediction columns appended, its invalid row count, and
+    the number of predictions in each prediction column"""
+    import ml_api_service as service
+
+    loaded = dict(service.models)
+    n_rows = len(frame)
+    matrices, valid, errors = service.assemble_columns(loaded, feature_columns(frame, sources, constants), n_rows)
+    outputs = service.batch_outputs(loaded, matrices, valid)
+    frame = frame.reset_index(drop=True)
+    filled = {}
+    for key, values in outputs.items():
+        name = PREDICTION_COLUMNS[key]
+        if key == 'profitable':
+            column = pd.array(values == 1, dtype='boolean')
+            column[np.isnan(values)] = pd.NA
+            frame[name] = column
+        elif values.dtype == object:
+            # Band labels of the price and duration classifiers
+            frame[name] = pd.array(values, dtype='string')
+        else:
+            frame[name] = values
+        filled[name] = int(frame[name].notna().sum())
+    frame[ERROR_COLUMN] = pd.Series([errors.get(i) for i in range(n_rows)] if errors else [None] * n_rows,
+                                    dtype='string')
+    return frame, len(errors), filled
+
+
+def _init_worker():
+    # Forked workers inherit the parent's models; spawned ones load them here
+    import ml_api_service  # noqa: F401
+
+
+def scored_chunks(chunks, workers, sources, constants):
+    """Yield score_chunk() results in input order, at most 2 chunks per worker in flight"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk, sources, constants)
+        return
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk, sources, constants))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# =============================================================================
+# Output
+# =============================================================================
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file, renamed into place on close"""
+
+    def __init__(self, path, output_format, metadata):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.tmp'
+        self.output_format = output_format
+        self.metadata = metadata
+        self._parquet = None
+        self._schema = None
+        self._rows = 0
+
+    def write(self, frame):
+        if self.output_format == 'csv':
+            frame.to_csv(self.tmp_path, mode='a' if self._rows else 'w', header=not self._rows, index=False)
+        else:
+            if self._parquet is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                self._schema = table.schema.with_metadata({**(table.schema.metadata or {}), **self.metadata})
+                self._parquet = pq.ParquetWriter(self.tmp_path, self._schema)
+            try:
+                table = pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False)
+            except (pa.ArrowException, ValueError) as e:
+                raise ValueError(f'rows {self._rows:,}+ do not fit the column types of the first chunk ({e}); '
+                                 f'write CSV or use a larger --chunk-rows') from e
+            self._parquet.write_table(table)
+        self._rows += len(frame)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._rows:
+            os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def peak_memory_mb():
+    """Peak RSS of this process and of its largest worker, or None"""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def parse_pairs(pairs, option):
+    parsed = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f'{option} expects KEY=VALUE, got {pair!r}')
+        parsed[key] = value
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every row of an export with the ML service models')
+    parser.add_argument('input', help='CSV, Parquet or newline-delimited JSON export')
+    parser.add_argument('--output', required=True, help='.csv or .parquet file to write')
+    parser.add_argument('--input-format', choices=sorted(set(FORMATS.values())))
+    parser.add_argument('--output-format', choices=['csv', 'parquet'])
+    parser.add_argument('--chunk-rows', type=int, default=100_000, help='rows scored per task (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='scoring processes (default: CPU count)')
+    parser.add_argument('--rename', nargs='+', metavar='COLUMN=KEY',
+                        help='take a feature from a differently named column, e.g. totalBags=total_bags')
+    parser.add_argument('--set', nargs='+', metavar='KEY=VALUE', dest='constants',
+                        help='use one value for a feature on every row, e.g. activity_status=storing')
+    args = parser.parse_args()
+
+    try:
+        input_format = file_format(args.input, args.input_format)
+        output_format = file_format(args.output, args.output_format)
+        sources = {key: column for column, key in parse_pairs(args.rename, '--rename').items()}
+        constants = parse_pairs(args.constants, '--set')
+    except ValueError as e:
+        parser.error(str(e))
+    if output_format not in ('csv', 'parquet'):
+        parser.error('--output must be a .csv or .parquet file')
+    if pa is None and 'parquet' in (input_format, output_format):
+        parser.error('Parquet needs pyarrow: pip install -r requirements.txt')
+
+    print("=" * 80)
+    print("BULK SCORING")
+    print("=" * 80)
+    # Loaded once here; forked workers share them copy-on-write
+    import ml_api_service as service
+    versions = service.model_versions()
+    if not any(versions.values()):
+        print("✗ No models loaded; run train_models.py first")
+        sys.exit(1)
+    workers = max(1, args.workers)
+    print(f"Scoring {args.input} -> {args.output} in chunks of {args.chunk_rows:,} rows with {workers} worker(s)")
+
+    writer = ChunkWriter(args.output, output_format, {'model_versions': json.dumps(versions)})
+    start = time.perf_counter()
+    rows = invalid = 0
+    filled = {}
+    try:
+        chunks = read_chunks(args.input, input_format, args.chunk_rows)
+        for frame, chunk_invalid, chunk_filled in scored_chunks(chunks, workers, sources, constants):
+            writer.write(frame)
+            rows += len(frame)
+            invalid += chunk_invalid
+            for name, count in chunk_filled.items():
+                filled[name] = filled.get(name, 0) + count
+            elapsed = time.perf_counter() - start
+            print(f"  {rows:>12,} rows  {rows / elapsed:>10,.0f} rows/s")
+        if not rows:
+            print(f"✗ No rows in {args.input}; nothing written")
+            sys.exit(1)
+        # A model that failed on every chunk must not pass for a finished run
+        empty = [name for name, count in filled.items() if not count]
+        if empty and rows > invalid:
+            print(f"✗ No predictions in {', '.join(empty)} for any of the {rows - invalid:,} valid rows; "
+                  f"nothing written")
+            sys.exit(1)
+        writer.close()
+    except BaseException:
+        writer.discard()
+        raise
+
+    elapsed = time.perf_counter() - start
+    print("-" * 80)
+    print(f"✓ Scored {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s), "
+          f"{invalid:,} invalid")
+    memory = peak_memory_mb()
+    if memory:
+        worker_memory = f", {memory[1]:,.0f} MB largest worker" if workers > 1 else ''
+        print(f"  Peak memory: {memory[0]:,.0f} MB main process{worker_memory}")
+    print(f"  Model versions: {versions}")
+    print(f"✓ Saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ Author: WMS Analytics Team
 Date: January 2026
 """
 
+import os
+
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
@@ -16,6 +18,8 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import streamlit as st
 
+from wms_rollups import date_slice, load_rollup, rollups_version
+
 # Page configuration
 st.set_page_config(
     page_title="WMS Analytics Dashboard",
@@ -145,37 +149,289 @@ else:  # All Time
 st.sidebar.markdown("---")
 st.sidebar.info("**Tip:** Use date filters to analyze specific time periods.")
 
-# Load data
-@st.cache_data
-def load_data():
-    grain_movements = pd.read_csv('GRAIN_MOVEMENTS.csv')
-    customer_activities = pd.read_csv('CUSTOMER_ACTIVITIES.csv')
+# Load data: daily rollups maintained by wms_rollups.py, so the work done
+# here depends on the number of days in the period, not on the raw row count.
+# The rollups version is part of the cache keys so new data shows up.
+@st.cache_resource(max_entries=2)
+def load_rollups(version=None):
+    # Loaded once per data version and kept sorted by date; shared by all
+    # sessions, filters only slice it
+    return load_rollup('movements_daily'), load_rollup('activities_daily')
+
+@st.cache_resource(max_entries=64)
+def load_data(start_date=None, end_date=None, version=None):
+    # Slices of the shared rollups, returned without a copy; treat as read-only
+    grain_movements, customer_activities = load_rollups(version)
+    return (date_slice('movements_daily', grain_movements, start_date, end_date),
+            date_slice('activities_daily', customer_activities, start_date, end_date))
+
+# Chart construction: each page's figure and summary numbers are built once
+# per (period, data version) and shared by all sessions, so
+# switching pages or returning to a period reuses the finished figure.
+# Treat the returned objects as read-only.
+MAX_TREND_BARS = 36
+TREND_PERIODS = [('M', 'Monthly'), ('Q', 'Quarterly'), ('Y', 'Yearly')]
+
+def trend_period(dates):
+    """Coarsest-needed period for the trend chart: monthly bars, downsampled
+    to quarters or years over long ranges to bound the chart payload"""
+    for freq, label in TREND_PERIODS:
+        periods = dates.dt.to_period(freq)
+        if periods.nunique() <= MAX_TREND_BARS:
+            break
+    return periods.astype(str), label
+
+@st.cache_resource(max_entries=64)
+def grain_movement_view(start_date, end_date, version):
+    grain_movements, _ = load_data(start_date, end_date, version)
+
+    # Prepare data
+    operation_summary = grain_movements.groupby('operation').agg({
+        'total_weight_kg': 'sum',
+        'number_of_bags': 'sum'
+    }).reset_index()
+    
+    grain_type_summary = grain_movements.groupby(['grain_type', 'operation']).agg({
+        'total_weight_kg': 'sum'
+    }).reset_index()
+    
+    # Monthly trend
+    period, period_label = trend_period(grain_movements['transaction_date'])
+    monthly_trend = grain_movements.groupby([period.rename('month'), 'operation']).agg({
+        'total_weight_kg': 'sum'
+    }).reset_index()
+    
+    # Create 2x2 subplot layout
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            "Total Grain IN vs OUT (Tons)",
+            "Grain Type Distribution by Operation",
+            f"{period_label} Movement Trend",
+            "Total Bags Moved"
+        ),
+        specs=[[{"type": "bar"}, {"type": "bar"}],
+               [{"type": "bar"}, {"type": "bar"}]]
+    )
+    
+    # Chart 1: Total IN vs OUT
+    total_in = operation_summary[operation_summary['operation'] == 'IN']['total_weight_kg'].sum() / 1000
+    total_out = operation_summary[operation_summary['operation'] == 'OUT']['total_weight_kg'].sum() / 1000
+    
+    fig.add_trace(
+        go.Bar(
+            x=['IN', 'OUT'],
+            y=[total_in, total_out],
+            marker_color=['#2ecc71', '#e74c3c'],
+            text=[f'{total_in:.2f}', f'{total_out:.2f}'],
+            textposition='outside',
+            showlegend=False
+        ),
+        row=1, col=1
+    )
+    
+    # Chart 2: Grain type distribution
+    grain_type_pivot = grain_type_summary.pivot(index='grain_type', columns='operation', values='total_weight_kg').fillna(0) / 1000
+    
+    for operation in ['IN', 'OUT']:
+        if operation in grain_type_pivot.columns:
+            fig.add_trace(
+                go.Bar(
+                    x=grain_type_pivot.index,
+                    y=grain_type_pivot[operation],
+                    name=operation,
+                    marker_color='#2ecc71' if operation == 'IN' else '#e74c3c'
+                ),
+                row=1, col=2
+            )
+    
+    # Chart 3: Monthly trend
+    monthly_pivot = monthly_trend.pivot(index='month', columns='operation', values='total_weight_kg').fillna(0) / 1000
+    
+    for operation in ['IN', 'OUT']:
+        if operation in monthly_pivot.columns:
+            fig.add_trace(
+                go.Bar(
+                    x=monthly_pivot.index,
+                    y=monthly_pivot[operation],
+                    name=operation,
+                    marker_color='#2ecc71' if operation == 'IN' else '#e74c3c',
+                    showlegend=False
+                ),
+                row=2, col=1
+            )
+    
+    # Chart 4: Total bags
+    bags_in = operation_summary[operation_summary['operation'] == 'IN']['number_of_bags'].sum()
+    bags_out = operation_summary[operation_summary['operation'] == 'OUT']['number_of_bags'].sum()
+    
+    fig.add_trace(
+        go.Bar(
+            x=['IN', 'OUT'],
+            y=[bags_in, bags_out],
+            marker_color=['#2ecc71', '#e74c3c'],
+            text=[f'{bags_in:,}', f'{bags_out:,}'],
+            textposition='outside',
+            showlegend=False
+        ),
+        row=2, col=2
+    )
+    
+    # Update layout
+    fig.update_xaxes(title_text="Operation", row=1, col=1)
+    fig.update_yaxes(title_text="Weight (Tons)", row=1, col=1)
+    
+    fig.update_xaxes(title_text="Grain Type", row=1, col=2)
+    fig.update_yaxes(title_text="Weight (Tons)", row=1, col=2)
+    
+    fig.update_xaxes(title_text={'Monthly': 'Month', 'Quarterly': 'Quarter', 'Yearly': 'Year'}[period_label], row=2, col=1)
+    fig.update_yaxes(title_text="Weight (Tons)", row=2, col=1)
+    
+    fig.update_xaxes(title_text="Operation", row=2, col=2)
+    fig.update_yaxes(title_text="Number of Bags", row=2, col=2)
+    
+    fig.update_layout(
+        height=800,
+        showlegend=True,
+        title_text="Grain Movement Dashboard",
+        title_font_size=20
+    )
+
+    summary = {
+        'total_in': total_in,
+        'total_out': total_out,
+        'bags_in': bags_in,
+        'bags_out': bags_out,
+        'grain_type_totals': grain_movements.groupby('grain_type')['total_weight_kg'].sum().sort_values(ascending=False) / 1000,
+    }
+    return fig, summary
+
+@st.cache_resource(max_entries=64)
+def customer_activity_view(start_date, end_date, version):
+    _, customer_activities = load_data(start_date, end_date, version)
+
+    # Prepare data
+    activity_counts = customer_activities.groupby('activity_status')['records'].sum().sort_values(ascending=False, kind='stable')
+    
+    # Sales by grain type (the rollup keeps price sums, so the mean is sum / records)
+    sales_by_grain = customer_activities.groupby('grain_type').agg({
+        'total_sale_amount': 'sum',
+        'sale_price_per_kg': 'sum',
+        'profit_loss': 'sum',
+        'records': 'sum'
+    }).reset_index()
+    sales_by_grain['sale_price_per_kg'] /= sales_by_grain['records']
+    
+    # Profit/loss by status
+    profit_by_status = customer_activities.groupby('activity_status')['profit_loss'].sum().reset_index()
+    
+    # Create 2x2 subplot layout
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            "Customer Count by Activity Status",
+            "Total Sales Revenue by Grain Type",
+            "Average Sale Price per KG",
+            "Net Profit/Loss by Activity Status"
+        ),
+        specs=[[{"type": "bar"}, {"type": "bar"}],
+               [{"type": "bar"}, {"type": "bar"}]]
+    )
+    
+    # Chart 1: Customer count
+    fig.add_trace(
+        go.Bar(
+            x=activity_counts.index,
+            y=activity_counts.values,
+            marker_color=['#3498db', '#9b59b6', '#e67e22'],
+            text=activity_counts.values,
+            textposition='outside',
+            showlegend=False
+        ),
+        row=1, col=1
+    )
+    
+    # Chart 2: Sales revenue
+    fig.add_trace(
+        go.Bar(
+            x=sales_by_grain['grain_type'],
+            y=sales_by_grain['total_sale_amount'] / 1000,
+            marker_color='#27ae60',
+            text=[f'₹{val/1000:.0f}K' for val in sales_by_grain['total_sale_amount']],
+            textposition='outside',
+            showlegend=False
+        ),
+        row=1, col=2
+    )
+    
+    # Chart 3: Average price
+    fig.add_trace(
+        go.Bar(
+            x=sales_by_grain['grain_type'],
+            y=sales_by_grain['sale_price_per_kg'],
+            marker_color='#f39c12',
+            text=[f'₹{val:.2f}' for val in sales_by_grain['sale_price_per_kg']],
+            textposition='outside',
+            showlegend=False
+        ),
+        row=2, col=1
+    )
+    
+    # Chart 4: Profit/loss
+    colors = ['#27ae60' if val > 0 else '#e74c3c' for val in profit_by_status['profit_loss']]
+    fig.add_trace(
+        go.Bar(
+            x=profit_by_status['activity_status'],
+            y=profit_by_status['profit_loss'] / 1000,
+            marker_color=colors,
+            text=[f'₹{val/1000:.0f}K' for val in profit_by_status['profit_loss']],
+            textposition='outside',
+            showlegend=False
+        ),
+        row=2, col=2
+    )
     
-    # Convert dates
-    grain_movements['transaction_date'] = pd.to_datetime(grain_movements['transaction_date'])
-    customer_activities['storage_start_date'] = pd.to_datetime(customer_activities['storage_start_date'])
+    # Update layout
+    fig.update_xaxes(title_text="Activity Status", row=1, col=1)
+    fig.update_yaxes(title_text="Number of Customers", row=1, col=1)
     
-    return grain_movements, customer_activities
+    fig.update_xaxes(title_text="Grain Type", row=1, col=2)
+    fig.update_yaxes(title_text="Revenue (₹ Thousands)", row=1, col=2)
+    
+    fig.update_xaxes(title_text="Grain Type", row=2, col=1)
+    fig.update_yaxes(title_text="Price (₹/kg)", row=2, col=1)
+    
+    fig.update_xaxes(title_text="Activity Status", row=2, col=2)
+    fig.update_yaxes(title_text="Profit/Loss (₹ Thousands)", row=2, col=2)
+    
+    fig.update_layout(
+        height=800,
+        showlegend=False,
+        title_text="Customer Activity & Sales Dashboard",
+        title_font_size=20
+    )
+
+    summary = {
+        'activity_counts': activity_counts,
+        'sales_by_grain': sales_by_grain,
+        'total_sales': customer_activities['total_sale_amount'].sum(),
+        'total_rent': customer_activities['total_rent_paid'].sum(),
+        'total_profit': customer_activities['profit_loss'].sum(),
+    }
+    return fig, summary
 
 try:
-    grain_movements, customer_activities = load_data()
+    version = rollups_version()
+    grain_movements, customer_activities = load_data(start_date, end_date, version)
+    movement_records = int(grain_movements['records'].sum())
+    activity_records = int(customer_activities['records'].sum())
     
-    # Apply date filters
     if start_date is not None and end_date is not None:
-        grain_movements = grain_movements[
-            (grain_movements['transaction_date'] >= start_date) & 
-            (grain_movements['transaction_date'] <= end_date)
-        ]
-        customer_activities = customer_activities[
-            (customer_activities['storage_start_date'] >= start_date) & 
-            (customer_activities['storage_start_date'] <= end_date)
-        ]
-        
         # Display filter badge
-        if len(grain_movements) == 0:
+        if movement_records == 0:
             st.warning(f"No data found for the selected period: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}")
         else:
-            st.success(f"Filtered Data: {len(grain_movements)} grain movement records | {len(customer_activities)} customer activity records")
+            st.success(f"Filtered Data: {movement_records} grain movement records | {activity_records} customer activity records")
     
     # ============================================================================
     # PAGE 1: GRAIN MOVEMENT ANALYSIS
@@ -187,117 +443,9 @@ try:
         st.markdown("Analysis of grain IN/OUT operations, trends, and inventory status")
         st.markdown("---")
         
-        # Prepare data
-        operation_summary = grain_movements.groupby('operation').agg({
-            'total_weight_kg': 'sum',
-            'number_of_bags': 'sum'
-        }).reset_index()
-        
-        grain_type_summary = grain_movements.groupby(['grain_type', 'operation']).agg({
-            'total_weight_kg': 'sum'
-        }).reset_index()
-        
-        # Monthly trend
-        grain_movements['month'] = grain_movements['transaction_date'].dt.to_period('M').astype(str)
-        monthly_trend = grain_movements.groupby(['month', 'operation']).agg({
-            'total_weight_kg': 'sum'
-        }).reset_index()
-        
-        # Create 2x2 subplot layout
-        fig = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=(
-                "Total Grain IN vs OUT (Tons)",
-                "Grain Type Distribution by Operation",
-                "Monthly Movement Trend",
-                "Total Bags Moved"
-            ),
-            specs=[[{"type": "bar"}, {"type": "bar"}],
-                   [{"type": "bar"}, {"type": "bar"}]]
-        )
-        
-        # Chart 1: Total IN vs OUT
-        total_in = operation_summary[operation_summary['operation'] == 'IN']['total_weight_kg'].sum() / 1000
-        total_out = operation_summary[operation_summary['operation'] == 'OUT']['total_weight_kg'].sum() / 1000
-        
-        fig.add_trace(
-            go.Bar(
-                x=['IN', 'OUT'],
-                y=[total_in, total_out],
-                marker_color=['#2ecc71', '#e74c3c'],
-                text=[f'{total_in:.2f}', f'{total_out:.2f}'],
-                textposition='outside',
-                showlegend=False
-            ),
-            row=1, col=1
-        )
-        
-        # Chart 2: Grain type distribution
-        grain_type_pivot = grain_type_summary.pivot(index='grain_type', columns='operation', values='total_weight_kg').fillna(0) / 1000
-        
-        for operation in ['IN', 'OUT']:
-            if operation in grain_type_pivot.columns:
-                fig.add_trace(
-                    go.Bar(
-                        x=grain_type_pivot.index,
-                        y=grain_type_pivot[operation],
-                        name=operation,
-                        marker_color='#2ecc71' if operation == 'IN' else '#e74c3c'
-                    ),
-                    row=1, col=2
-                )
-        
-        # Chart 3: Monthly trend
-        monthly_pivot = monthly_trend.pivot(index='month', columns='operation', values='total_weight_kg').fillna(0) / 1000
-        
-        for operation in ['IN', 'OUT']:
-            if operation in monthly_pivot.columns:
-                fig.add_trace(
-                    go.Bar(
-                        x=monthly_pivot.index,
-                        y=monthly_pivot[operation],
-                        name=operation,
-                        marker_color='#2ecc71' if operation == 'IN' else '#e74c3c',
-                        showlegend=False
-                    ),
-                    row=2, col=1
-                )
-        
-        # Chart 4: Total bags
-        bags_in = operation_summary[operation_summary['operation'] == 'IN']['number_of_bags'].sum()
-        bags_out = operation_summary[operation_summary['operation'] == 'OUT']['number_of_bags'].sum()
-        
-        fig.add_trace(
-            go.Bar(
-                x=['IN', 'OUT'],
-                y=[bags_in, bags_out],
-                marker_color=['#2ecc71', '#e74c3c'],
-                text=[f'{bags_in:,}', f'{bags_out:,}'],
-                textposition='outside',
-                showlegend=False
-            ),
-            row=2, col=2
-        )
-        
-        # Update layout
-        fig.update_xaxes(title_text="Operation", row=1, col=1)
-        fig.update_yaxes(title_text="Weight (Tons)", row=1, col=1)
-        
-        fig.update_xaxes(title_text="Grain Type", row=1, col=2)
-        fig.update_yaxes(title_text="Weight (Tons)", row=1, col=2)
-        
-        fig.update_xaxes(title_text="Month", row=2, col=1)
-        fig.update_yaxes(title_text="Weight (Tons)", row=2, col=1)
-        
-        fig.update_xaxes(title_text="Operation", row=2, col=2)
-        fig.update_yaxes(title_text="Number of Bags", row=2, col=2)
-        
-        fig.update_layout(
-            height=800,
-            showlegend=True,
-            title_text="Grain Movement Dashboard",
-            title_font_size=20
-        )
+        fig, summary = grain_movement_view(start_date, end_date, version)
+        total_in, total_out = summary['total_in'], summary['total_out']
+        bags_in, bags_out = summary['bags_in'], summary['bags_out']
         
         # Display chart
         st.plotly_chart(fig, use_container_width=True)
@@ -344,8 +492,7 @@ try:
             
             with col1:
                 st.markdown("**Movement by Grain Type:**")
-                grain_type_totals = grain_movements.groupby('grain_type')['total_weight_kg'].sum().sort_values(ascending=False) / 1000
-                for grain, weight in grain_type_totals.items():
+                for grain, weight in summary['grain_type_totals'].items():
                     st.write(f"- {grain}: {weight:,.2f} Tons")
             
             with col2:
@@ -364,104 +511,9 @@ try:
         st.markdown("Analysis of customer behavior, sales revenue, and profitability")
         st.markdown("---")
         
-        # Prepare data
-        activity_counts = customer_activities['activity_status'].value_counts()
-        
-        # Sales by grain type
-        sales_by_grain = customer_activities.groupby('grain_type').agg({
-            'total_sale_amount': 'sum',
-            'sale_price_per_kg': 'mean',
-            'profit_loss': 'sum'
-        }).reset_index()
-        
-        # Profit/loss by status
-        profit_by_status = customer_activities.groupby('activity_status')['profit_loss'].sum().reset_index()
-        
-        # Create 2x2 subplot layout
-        fig = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=(
-                "Customer Count by Activity Status",
-                "Total Sales Revenue by Grain Type",
-                "Average Sale Price per KG",
-                "Net Profit/Loss by Activity Status"
-            ),
-            specs=[[{"type": "bar"}, {"type": "bar"}],
-                   [{"type": "bar"}, {"type": "bar"}]]
-        )
-        
-        # Chart 1: Customer count
-        fig.add_trace(
-            go.Bar(
-                x=activity_counts.index,
-                y=activity_counts.values,
-                marker_color=['#3498db', '#9b59b6', '#e67e22'],
-                text=activity_counts.values,
-                textposition='outside',
-                showlegend=False
-            ),
-            row=1, col=1
-        )
-        
-        # Chart 2: Sales revenue
-        fig.add_trace(
-            go.Bar(
-                x=sales_by_grain['grain_type'],
-                y=sales_by_grain['total_sale_amount'] / 1000,
-                marker_color='#27ae60',
-                text=[f'₹{val/1000:.0f}K' for val in sales_by_grain['total_sale_amount']],
-                textposition='outside',
-                showlegend=False
-            ),
-            row=1, col=2
-        )
-        
-        # Chart 3: Average price
-        fig.add_trace(
-            go.Bar(
-                x=sales_by_grain['grain_type'],
-                y=sales_by_grain['sale_price_per_kg'],
-                marker_color='#f39c12',
-                text=[f'₹{val:.2f}' for val in sales_by_grain['sale_price_per_kg']],
-                textposition='outside',
-                showlegend=False
-            ),
-            row=2, col=1
-        )
-        
-        # Chart 4: Profit/loss
-        colors = ['#27ae60' if val > 0 else '#e74c3c' for val in profit_by_status['profit_loss']]
-        fig.add_trace(
-            go.Bar(
-                x=profit_by_status['activity_status'],
-                y=profit_by_status['profit_loss'] / 1000,
-                marker_color=colors,
-                text=[f'₹{val/1000:.0f}K' for val in profit_by_status['profit_loss']],
-                textposition='outside',
-                showlegend=False
-            ),
-            row=2, col=2
-        )
-        
-        # Update layout
-        fig.update_xaxes(title_text="Activity Status", row=1, col=1)
-        fig.update_yaxes(title_text="Number of Customers", row=1, col=1)
-        
-        fig.update_xaxes(title_text="Grain Type", row=1, col=2)
-        fig.update_yaxes(title_text="Revenue (₹ Thousands)", row=1, col=2)
-        
-        fig.update_xaxes(title_text="Grain Type", row=2, col=1)
-        fig.update_yaxes(title_text="Price (₹/kg)", row=2, col=1)
-        
-        fig.update_xaxes(title_text="Activity Status", row=2, col=2)
-        fig.update_yaxes(title_text="Profit/Loss (₹ Thousands)", row=2, col=2)
-        
-        fig.update_layout(
-            height=800,
-            showlegend=False,
-            title_text="Customer Activity & Sales Dashboard",
-            title_font_size=20
-        )
+        fig, summary = customer_activity_view(start_date, end_date, version)
+        activity_counts = summary['activity_counts']
+        sales_by_grain = summary['sales_by_grain']
         
         # Display chart
         st.plotly_chart(fig, width='stretch')
@@ -508,9 +560,9 @@ try:
         
         col1, col2, col3 = st.columns(3)
         
-        total_sales = customer_activities['total_sale_amount'].sum()
-        total_rent = customer_activities['total_rent_paid'].sum()
-        total_profit = customer_activities['profit_loss'].sum()
+        total_sales = summary['total_sales']
+        total_rent = summary['total_rent']
+        total_profit = summary['total_profit']
         
         with col1:
             st.markdown("### Total Sales Revenue")
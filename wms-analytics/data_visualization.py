@@ -6,213 +6,445 @@ This script creates visualizations for warehouse management data analysis.
 Required Visualizations:
 1. Grain IN/OUT Movement Analysis (Bar Graph)
 2. Customer Activity & Sales Analysis (Bar Graph)
+
+All charts and summary figures are drawn from a small set of aggregates
+computed in one pass over each dataset. With --stream the datasets are read
+in chunks and the per-chunk aggregates are merged, so memory is bounded by
+the chunk size rather than the size of the export:
+    python data_visualization.py
+    python data_visualization.py --stream --chunk-rows 500000
+
+Headless batch runs (report server, cron) skip plt.show() and render the
+figures in parallel worker processes, optionally per grain type:
+    python data_visualization.py --batch --per-grain --workers 4 --dpi 200 --output-dir reports/
 """
 
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from datetime import datetime
 
+from wms_data import iter_dataset, load_dataset
+
 # Set style
 plt.style.use('seaborn-v0_8-darkgrid')
 sns.set_palette("husl")
 
-# Load datasets
-print("Loading datasets...")
-grain_movements = pd.read_csv('GRAIN_MOVEMENTS.csv')
-customer_activities = pd.read_csv('CUSTOMER_ACTIVITIES.csv')
+MOVEMENT_COLUMNS = ['transaction_date', 'grain_type', 'operation', 'total_weight_kg', 'number_of_bags']
+ACTIVITY_COLUMNS = [
+    'activity_status', 'grain_type', 'sold_status', 'total_sale_amount',
+    'sale_price_per_kg', 'total_rent_paid', 'profit_loss'
+]
+
+# =============================================================================
+# Aggregation
+# =============================================================================
+# Each *_partials() call summarizes one chunk of rows into sums and counts
+# keyed by category values; merge_partials() adds two such summaries, so the
+# result does not depend on how the rows were chunked.
+
+def _plain_index(series):
+    """Category-typed group keys as plain values, so chunks line up"""
+    index = series.index
+    if isinstance(index, pd.MultiIndex):
+        series.index = index.set_levels([
+            level.astype(str) if isinstance(level, pd.CategoricalIndex) else level
+            for level in index.levels
+        ])
+    elif isinstance(index, pd.CategoricalIndex):
+        series.index = index.astype(str)
+    return series
+
+
+def movement_partials(grain_movements):
+    month = grain_movements['transaction_date'].dt.to_period('M').rename('month')
+    by_operation = grain_movements.groupby('operation', observed=True)
+    return {
+        'records': len(grain_movements),
+        'weight_by_operation': _plain_index(by_operation['total_weight_kg'].sum()),
+        'bags_by_operation': _plain_index(by_operation['number_of_bags'].sum()),
+        'weight_by_grain': _plain_index(grain_movements.groupby(
+            ['grain_type', 'operation'], observed=True)['total_weight_kg'].sum()),
+        'weight_by_month': _plain_index(grain_movements.groupby(
+            [month, 'operation'], observed=True)['total_weight_kg'].sum()),
+    }
+
+
+def activity_partials(customer_activities):
+    sold = customer_activities[customer_activities['sold_status'] == 'yes']
+    priced = sold[sold['sale_price_per_kg'] > 0].groupby('grain_type', observed=True)['sale_price_per_kg']
+    with_profit = customer_activities[customer_activities['profit_loss'] != 0]
+    return {
+        'records': len(customer_activities),
+        'status_counts': _plain_index(customer_activities.groupby('activity_status', observed=True).size()),
+        'sales_by_grain': _plain_index(sold.groupby('grain_type', observed=True)['total_sale_amount'].sum()),
+        'price_sum_by_grain': _plain_index(priced.sum()),
+        'price_count_by_grain': _plain_index(priced.count()),
+        'profit_by_status': _plain_index(with_profit.groupby('activity_status', observed=True)['profit_loss'].sum()),
+        'total_sales': sold.loc[sold['total_sale_amount'] > 0, 'total_sale_amount'].sum(),
+        'total_rent': customer_activities['total_rent_paid'].sum(),
+        'net_profit': customer_activities['profit_loss'].sum(),
+    }
+
+
+def merge_partials(total, part):
+    if total is None:
+        return part
+    merged = {}
+    for key, value in total.items():
+        if isinstance(value, pd.Series):
+            merged[key] = value.add(part[key], fill_value=0).astype(np.result_type(value.dtype, part[key].dtype))
+        else:
+            merged[key] = value + part[key]
+    return merged
+
+
+def _finish(partials):
+    """Sort the group keys the way a single groupby over all rows would"""
+    return {key: value.sort_index() if isinstance(value, pd.Series) else value
+            for key, value in partials.items()}
+
 
-# Convert date columns
-grain_movements['transaction_date'] = pd.to_datetime(grain_movements['transaction_date'])
-customer_activities['storage_start_date'] = pd.to_datetime(customer_activities['storage_start_date'])
-customer_activities['storage_end_date'] = pd.to_datetime(customer_activities['storage_end_date'], errors='coerce')
-customer_activities['sale_date'] = pd.to_datetime(customer_activities['sale_date'], errors='coerce')
+def _summarize(frame, partials, by_grain):
+    """Partials for all rows, plus one per grain type when by_grain is set"""
+    summary = {None: partials(frame)}
+    if by_grain:
+        for grain, rows in frame.groupby('grain_type', observed=True):
+            summary[str(grain)] = partials(rows)
+    return summary
+
+
+def _merge_summaries(total, part):
+    merged = dict(total or {})
+    for scope, partials in part.items():
+        merged[scope] = merge_partials(merged.get(scope), partials)
+    return merged
+
+
+def compute_aggregates(stream=False, chunk_rows=250_000, by_grain=False):
+    """Movement and activity aggregates for the report
+
+    Returns {scope: (movements, activities)}, where scope None covers all
+    rows and, with by_grain, each grain type has its own entry.
+    """
+    summaries = []
+    for name, columns, partials in (('grain_movements', MOVEMENT_COLUMNS, movement_partials),
+                                    ('customer_activities', ACTIVITY_COLUMNS, activity_partials)):
+        if stream:
+            summary = None
+            for chunk in iter_dataset(name, columns, chunk_rows):
+                summary = _merge_summaries(summary, _summarize(chunk, partials, by_grain))
+        else:
+            # Dates arrive parsed; only the columns used below are read
+            summary = _summarize(load_dataset(name, columns), partials, by_grain)
+        summaries.append({scope: _finish(partials) for scope, partials in summary.items()})
+
+    movements, activities = summaries
+    return {scope: (movements.get(scope), activities.get(scope))
+            for scope in dict.fromkeys(list(movements) + list(activities))}
 
-print(f"Grain Movements: {len(grain_movements)} records")
-print(f"Customer Activities: {len(customer_activities)} records")
-print("\n" + "="*80 + "\n")
 
 # =============================================================================
 # VISUALIZATION 1: Grain IN/OUT Movement Analysis
 # =============================================================================
-print("Creating Visualization 1: Grain IN/OUT Movement Analysis")
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('Grain Movement Analysis - IN vs OUT Operations', fontsize=20, fontweight='bold', y=0.995)
-
-# 1.1 Total IN vs OUT by Operation
-ax1 = axes[0, 0]
-operation_summary = grain_movements.groupby('operation')['total_weight_kg'].sum() / 1000  # Convert to tons
-colors = ['#2ecc71', '#e74c3c']
-bars1 = ax1.bar(operation_summary.index, operation_summary.values, color=colors, alpha=0.8, edgecolor='black', linewidth=1.5)
-ax1.set_title('Total Grain Movement: IN vs OUT', fontsize=14, fontweight='bold', pad=15)
-ax1.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
-ax1.set_xlabel('Operation Type', fontsize=12, fontweight='bold')
-ax1.grid(axis='y', alpha=0.3)
-# Add value labels on bars
-for bar in bars1:
-    height = bar.get_height()
-    ax1.text(bar.get_x() + bar.get_width()/2., height,
-            f'{height:,.0f}',
-            ha='center', va='bottom', fontsize=11, fontweight='bold')
-
-# 1.2 Grain Type Distribution - IN vs OUT
-ax2 = axes[0, 1]
-grain_type_summary = grain_movements.groupby(['grain_type', 'operation'])['total_weight_kg'].sum().unstack(fill_value=0) / 1000
-grain_type_summary.plot(kind='bar', ax=ax2, color=['#2ecc71', '#e74c3c'], alpha=0.8, edgecolor='black', linewidth=1.5, width=0.7)
-ax2.set_title('Grain Movement by Type (IN vs OUT)', fontsize=14, fontweight='bold', pad=15)
-ax2.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
-ax2.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
-ax2.legend(['IN', 'OUT'], title='Operation', fontsize=10)
-ax2.grid(axis='y', alpha=0.3)
-ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
-
-# 1.3 Monthly Trend - IN vs OUT
-ax3 = axes[1, 0]
-grain_movements['month'] = grain_movements['transaction_date'].dt.to_period('M')
-monthly_trend = grain_movements.groupby(['month', 'operation'])['total_weight_kg'].sum().unstack(fill_value=0) / 1000
-monthly_trend.plot(kind='bar', ax=ax3, color=['#2ecc71', '#e74c3c'], alpha=0.8, edgecolor='black', linewidth=1.5, width=0.7)
-ax3.set_title('Monthly Grain Movement Trend', fontsize=14, fontweight='bold', pad=15)
-ax3.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
-ax3.set_xlabel('Month', fontsize=12, fontweight='bold')
-ax3.legend(['IN', 'OUT'], title='Operation', fontsize=10)
-ax3.grid(axis='y', alpha=0.3)
-ax3.set_xticklabels([str(x) for x in monthly_trend.index], rotation=45, ha='right')
-
-# 1.4 Number of Bags - IN vs OUT
-ax4 = axes[1, 1]
-bags_summary = grain_movements.groupby('operation')['number_of_bags'].sum()
-colors_bags = ['#3498db', '#f39c12']
-bars4 = ax4.bar(bags_summary.index, bags_summary.values, color=colors_bags, alpha=0.8, edgecolor='black', linewidth=1.5)
-ax4.set_title('Total Bags Moved: IN vs OUT', fontsize=14, fontweight='bold', pad=15)
-ax4.set_ylabel('Number of Bags', fontsize=12, fontweight='bold')
-ax4.set_xlabel('Operation Type', fontsize=12, fontweight='bold')
-ax4.grid(axis='y', alpha=0.3)
-# Add value labels on bars
-for bar in bars4:
-    height = bar.get_height()
-    ax4.text(bar.get_x() + bar.get_width()/2., height,
-            f'{int(height):,}',
-            ha='center', va='bottom', fontsize=11, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('grain_movement_analysis.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: grain_movement_analysis.png")
-plt.show()
-
-print("\n" + "="*80 + "\n")
+
+def plot_grain_movements(movements, path='grain_movement_analysis.png', dpi=300, scope=None):
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    title = 'Grain Movement Analysis - IN vs OUT Operations'
+    fig.suptitle(title if scope is None else f'{title} ({scope})', fontsize=20, fontweight='bold', y=0.995)
+
+    # 1.1 Total IN vs OUT by Operation
+    ax1 = axes[0, 0]
+    operation_summary = movements['weight_by_operation'] / 1000  # Convert to tons
+    colors = ['#2ecc71', '#e74c3c']
+    bars1 = ax1.bar(operation_summary.index, operation_summary.values, color=colors, alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax1.set_title('Total Grain Movement: IN vs OUT', fontsize=14, fontweight='bold', pad=15)
+    ax1.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
+    ax1.set_xlabel('Operation Type', fontsize=12, fontweight='bold')
+    ax1.grid(axis='y', alpha=0.3)
+    # Add value labels on bars
+    for bar in bars1:
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height,
+                f'{height:,.0f}',
+                ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+    # 1.2 Grain Type Distribution - IN vs OUT
+    ax2 = axes[0, 1]
+    grain_type_summary = movements['weight_by_grain'].unstack(fill_value=0) / 1000
+    grain_type_summary.plot(kind='bar', ax=ax2, color=['#2ecc71', '#e74c3c'], alpha=0.8, edgecolor='black', linewidth=1.5, width=0.7)
+    ax2.set_title('Grain Movement by Type (IN vs OUT)', fontsize=14, fontweight='bold', pad=15)
+    ax2.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
+    ax2.legend(['IN', 'OUT'], title='Operation', fontsize=10)
+    ax2.grid(axis='y', alpha=0.3)
+    ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
+
+    # 1.3 Monthly Trend - IN vs OUT
+    ax3 = axes[1, 0]
+    monthly_trend = movements['weight_by_month'].unstack(fill_value=0) / 1000
+    monthly_trend.plot(kind='bar', ax=ax3, color=['#2ecc71', '#e74c3c'], alpha=0.8, edgecolor='black', linewidth=1.5, width=0.7)
+    ax3.set_title('Monthly Grain Movement Trend', fontsize=14, fontweight='bold', pad=15)
+    ax3.set_ylabel('Total Weight (Tons)', fontsize=12, fontweight='bold')
+    ax3.set_xlabel('Month', fontsize=12, fontweight='bold')
+    ax3.legend(['IN', 'OUT'], title='Operation', fontsize=10)
+    ax3.grid(axis='y', alpha=0.3)
+    ax3.set_xticklabels([str(x) for x in monthly_trend.index], rotation=45, ha='right')
+
+    # 1.4 Number of Bags - IN vs OUT
+    ax4 = axes[1, 1]
+    bags_summary = movements['bags_by_operation']
+    colors_bags = ['#3498db', '#f39c12']
+    bars4 = ax4.bar(bags_summary.index, bags_summary.values, color=colors_bags, alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax4.set_title('Total Bags Moved: IN vs OUT', fontsize=14, fontweight='bold', pad=15)
+    ax4.set_ylabel('Number of Bags', fontsize=12, fontweight='bold')
+    ax4.set_xlabel('Operation Type', fontsize=12, fontweight='bold')
+    ax4.grid(axis='y', alpha=0.3)
+    # Add value labels on bars
+    for bar in bars4:
+        height = bar.get_height()
+        ax4.text(bar.get_x() + bar.get_width()/2., height,
+                f'{int(height):,}',
+                ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    return fig
+
 
 # =============================================================================
 # VISUALIZATION 2: Customer Activity & Sales Analysis
 # =============================================================================
-print("Creating Visualization 2: Customer Activity & Sales Analysis")
-
-fig2, axes2 = plt.subplots(2, 2, figsize=(16, 12))
-fig2.suptitle('Customer Activity & Sales Performance Analysis', fontsize=20, fontweight='bold', y=0.995)
-
-# 2.1 Customer Count by Activity Status
-ax1 = axes2[0, 0]
-activity_counts = customer_activities['activity_status'].value_counts()
-colors_activity = ['#9b59b6', '#3498db', '#e67e22']
-bars_activity = ax1.bar(activity_counts.index, activity_counts.values, color=colors_activity, alpha=0.8, edgecolor='black', linewidth=1.5)
-ax1.set_title('Customer Distribution by Activity Status', fontsize=14, fontweight='bold', pad=15)
-ax1.set_ylabel('Number of Customers', fontsize=12, fontweight='bold')
-ax1.set_xlabel('Activity Status', fontsize=12, fontweight='bold')
-ax1.grid(axis='y', alpha=0.3)
-# Add value labels
-for bar in bars_activity:
-    height = bar.get_height()
-    ax1.text(bar.get_x() + bar.get_width()/2., height,
-            f'{int(height)}',
-            ha='center', va='bottom', fontsize=11, fontweight='bold')
-
-# 2.2 Sales Analysis by Grain Type
-ax2 = axes2[0, 1]
-sold_customers = customer_activities[customer_activities['sold_status'] == 'yes']
-sales_by_grain = sold_customers.groupby('grain_type')['total_sale_amount'].sum() / 1000  # Convert to thousands
-bars_sales = ax2.bar(sales_by_grain.index, sales_by_grain.values, color='#27ae60', alpha=0.8, edgecolor='black', linewidth=1.5)
-ax2.set_title('Total Sales Revenue by Grain Type', fontsize=14, fontweight='bold', pad=15)
-ax2.set_ylabel('Revenue (₹ Thousands)', fontsize=12, fontweight='bold')
-ax2.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
-ax2.grid(axis='y', alpha=0.3)
-ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
-# Add value labels
-for bar in bars_sales:
-    height = bar.get_height()
-    if height > 0:
-        ax2.text(bar.get_x() + bar.get_width()/2., height,
-                f'₹{height:,.0f}K',
+
+def plot_customer_sales(activities, path='customer_sales_analysis.png', dpi=300, scope=None):
+    fig2, axes2 = plt.subplots(2, 2, figsize=(16, 12))
+    title = 'Customer Activity & Sales Performance Analysis'
+    fig2.suptitle(title if scope is None else f'{title} ({scope})', fontsize=20, fontweight='bold', y=0.995)
+
+    # 2.1 Customer Count by Activity Status
+    ax1 = axes2[0, 0]
+    activity_counts = activities['status_counts'].sort_values(ascending=False)
+    activity_counts = activity_counts[activity_counts > 0]
+    colors_activity = ['#9b59b6', '#3498db', '#e67e22']
+    bars_activity = ax1.bar(activity_counts.index, activity_counts.values, color=colors_activity, alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax1.set_title('Customer Distribution by Activity Status', fontsize=14, fontweight='bold', pad=15)
+    ax1.set_ylabel('Number of Customers', fontsize=12, fontweight='bold')
+    ax1.set_xlabel('Activity Status', fontsize=12, fontweight='bold')
+    ax1.grid(axis='y', alpha=0.3)
+    # Add value labels
+    for bar in bars_activity:
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height,
+                f'{int(height)}',
+                ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+    # 2.2 Sales Analysis by Grain Type
+    ax2 = axes2[0, 1]
+    sales_by_grain = activities['sales_by_grain'] / 1000  # Convert to thousands
+    bars_sales = ax2.bar(sales_by_grain.index, sales_by_grain.values, color='#27ae60', alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax2.set_title('Total Sales Revenue by Grain Type', fontsize=14, fontweight='bold', pad=15)
+    ax2.set_ylabel('Revenue (₹ Thousands)', fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
+    ax2.grid(axis='y', alpha=0.3)
+    ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
+    # Add value labels
+    for bar in bars_sales:
+        height = bar.get_height()
+        if height > 0:
+            ax2.text(bar.get_x() + bar.get_width()/2., height,
+                    f'₹{height:,.0f}K',
+                    ha='center', va='bottom', fontsize=10, fontweight='bold')
+
+    # 2.3 Average Sale Price per kg by Grain Type
+    ax3 = axes2[1, 0]
+    avg_prices = activities['price_sum_by_grain'] / activities['price_count_by_grain']
+    bars_price = ax3.bar(avg_prices.index, avg_prices.values, color='#e67e22', alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax3.set_title('Average Sale Price per Kg by Grain Type', fontsize=14, fontweight='bold', pad=15)
+    ax3.set_ylabel('Price (₹ per Kg)', fontsize=12, fontweight='bold')
+    ax3.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
+    ax3.grid(axis='y', alpha=0.3)
+    ax3.set_xticklabels(ax3.get_xticklabels(), rotation=45, ha='right')
+    # Add value labels
+    for bar in bars_price:
+        height = bar.get_height()
+        ax3.text(bar.get_x() + bar.get_width()/2., height,
+                f'₹{height:.1f}',
                 ha='center', va='bottom', fontsize=10, fontweight='bold')
 
-# 2.3 Average Sale Price per kg by Grain Type
-ax3 = axes2[1, 0]
-avg_prices = sold_customers[sold_customers['sale_price_per_kg'] > 0].groupby('grain_type')['sale_price_per_kg'].mean()
-bars_price = ax3.bar(avg_prices.index, avg_prices.values, color='#e67e22', alpha=0.8, edgecolor='black', linewidth=1.5)
-ax3.set_title('Average Sale Price per Kg by Grain Type', fontsize=14, fontweight='bold', pad=15)
-ax3.set_ylabel('Price (₹ per Kg)', fontsize=12, fontweight='bold')
-ax3.set_xlabel('Grain Type', fontsize=12, fontweight='bold')
-ax3.grid(axis='y', alpha=0.3)
-ax3.set_xticklabels(ax3.get_xticklabels(), rotation=45, ha='right')
-# Add value labels
-for bar in bars_price:
-    height = bar.get_height()
-    ax3.text(bar.get_x() + bar.get_width()/2., height,
-            f'₹{height:.1f}',
-            ha='center', va='bottom', fontsize=10, fontweight='bold')
-
-# 2.4 Storage vs Sales - Profit Analysis
-ax4 = axes2[1, 1]
-profit_data = customer_activities[customer_activities['profit_loss'] != 0].groupby('activity_status')['profit_loss'].sum() / 1000
-colors_profit = ['#c0392b' if x < 0 else '#27ae60' for x in profit_data.values]
-bars_profit = ax4.bar(profit_data.index, profit_data.values, color=colors_profit, alpha=0.8, edgecolor='black', linewidth=1.5)
-ax4.set_title('Net Profit/Loss by Activity Status', fontsize=14, fontweight='bold', pad=15)
-ax4.set_ylabel('Profit/Loss (₹ Thousands)', fontsize=12, fontweight='bold')
-ax4.set_xlabel('Activity Status', fontsize=12, fontweight='bold')
-ax4.axhline(y=0, color='black', linestyle='-', linewidth=0.8)
-ax4.grid(axis='y', alpha=0.3)
-# Add value labels
-for bar in bars_profit:
-    height = bar.get_height()
-    label = f'₹{abs(height):,.0f}K'
-    if height < 0:
-        label = f'-₹{abs(height):,.0f}K'
-    ax4.text(bar.get_x() + bar.get_width()/2., height,
-            label,
-            ha='center', va='bottom' if height > 0 else 'top', fontsize=10, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('customer_sales_analysis.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: customer_sales_analysis.png")
-plt.show()
-
-print("\n" + "="*80 + "\n")
+    # 2.4 Storage vs Sales - Profit Analysis
+    ax4 = axes2[1, 1]
+    profit_data = activities['profit_by_status'] / 1000
+    colors_profit = ['#c0392b' if x < 0 else '#27ae60' for x in profit_data.values]
+    bars_profit = ax4.bar(profit_data.index, profit_data.values, color=colors_profit, alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax4.set_title('Net Profit/Loss by Activity Status', fontsize=14, fontweight='bold', pad=15)
+    ax4.set_ylabel('Profit/Loss (₹ Thousands)', fontsize=12, fontweight='bold')
+    ax4.set_xlabel('Activity Status', fontsize=12, fontweight='bold')
+    ax4.axhline(y=0, color='black', linestyle='-', linewidth=0.8)
+    ax4.grid(axis='y', alpha=0.3)
+    # Add value labels
+    for bar in bars_profit:
+        height = bar.get_height()
+        label = f'₹{abs(height):,.0f}K'
+        if height < 0:
+            label = f'-₹{abs(height):,.0f}K'
+        ax4.text(bar.get_x() + bar.get_width()/2., height,
+                label,
+                ha='center', va='bottom' if height > 0 else 'top', fontsize=10, fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    return fig2
+
 
 # =============================================================================
 # Summary Statistics
 # =============================================================================
-print("SUMMARY STATISTICS")
-print("=" * 80)
-print("\n📊 GRAIN MOVEMENT SUMMARY:")
-print(f"  Total Grains IN:  {grain_movements[grain_movements['operation']=='IN']['total_weight_kg'].sum()/1000:,.2f} Tons")
-print(f"  Total Grains OUT: {grain_movements[grain_movements['operation']=='OUT']['total_weight_kg'].sum()/1000:,.2f} Tons")
-print(f"  Net Storage:      {(grain_movements[grain_movements['operation']=='IN']['total_weight_kg'].sum() - grain_movements[grain_movements['operation']=='OUT']['total_weight_kg'].sum())/1000:,.2f} Tons")
-
-print("\n👥 CUSTOMER ACTIVITY SUMMARY:")
-print(f"  Currently Storing: {len(customer_activities[customer_activities['activity_status']=='storing'])} customers")
-print(f"  Historical Storage: {len(customer_activities[customer_activities['activity_status']=='stored'])} customers")
-print(f"  Sold Grains: {len(customer_activities[customer_activities['activity_status']=='sold'])} customers")
-
-print("\n💰 SALES SUMMARY:")
-total_sales = sold_customers[sold_customers['total_sale_amount'] > 0]['total_sale_amount'].sum()
-total_rent = customer_activities['total_rent_paid'].sum()
-net_profit = customer_activities['profit_loss'].sum()
-print(f"  Total Sales Revenue: ₹{total_sales:,.2f}")
-print(f"  Total Rent Collected: ₹{total_rent:,.2f}")
-print(f"  Net Profit/Loss: ₹{net_profit:,.2f}")
-
-print("\n" + "="*80)
-print("✓ Visualization Complete!")
-print("Generated Files:")
-print("  - grain_movement_analysis.png")
-print("  - customer_sales_analysis.png")
+
+def print_summary(movements, activities):
+    weight = movements['weight_by_operation']
+    total_in = weight.get('IN', 0)
+    total_out = weight.get('OUT', 0)
+    status_counts = activities['status_counts']
+
+    print("SUMMARY STATISTICS")
+    print("=" * 80)
+    print("\n📊 GRAIN MOVEMENT SUMMARY:")
+    print(f"  Total Grains IN:  {total_in/1000:,.2f} Tons")
+    print(f"  Total Grains OUT: {total_out/1000:,.2f} Tons")
+    print(f"  Net Storage:      {(total_in - total_out)/1000:,.2f} Tons")
+
+    print("\n👥 CUSTOMER ACTIVITY SUMMARY:")
+    print(f"  Currently Storing: {status_counts.get('storing', 0)} customers")
+    print(f"  Historical Storage: {status_counts.get('stored', 0)} customers")
+    print(f"  Sold Grains: {status_counts.get('sold', 0)} customers")
+
+    print("\n💰 SALES SUMMARY:")
+    print(f"  Total Sales Revenue: ₹{activities['total_sales']:,.2f}")
+    print(f"  Total Rent Collected: ₹{activities['total_rent']:,.2f}")
+    print(f"  Net Profit/Loss: ₹{activities['net_profit']:,.2f}")
+
+
+# =============================================================================
+# Batch rendering
+# =============================================================================
+# Headless report runs render every figure in its own worker process on the
+# Agg backend; the aggregates are computed once and shipped to the workers.
+
+FIGURES = {
+    # output: (file stem, plot function, index into a report's aggregates)
+    'grain_movements': ('grain_movement_analysis', plot_grain_movements, 0),
+    'customer_sales': ('customer_sales_analysis', plot_customer_sales, 1),
+}
+
+
+def figure_jobs(reports, outputs, output_dir='.', dpi=300):
+    jobs = []
+    for scope, aggregates in reports.items():
+        for output in outputs:
+            stem, _, index = FIGURES[output]
+            if aggregates[index] is None:
+                continue
+            file_name = f'{stem}.png' if scope is None else f'{stem}_{scope.lower()}.png'
+            jobs.append((output, aggregates[index], scope, os.path.join(output_dir, file_name), dpi))
+    return jobs
+
+
+def _init_worker():
+    plt.switch_backend('Agg')
+
+
+def render_figure(job):
+    """Render one figure job; returns (path, seconds, worker pid)"""
+    output, aggregates, scope, path, dpi = job
+    start = time.perf_counter()
+    fig = FIGURES[output][1](aggregates, path, dpi, scope)
+    plt.close(fig)
+    return path, time.perf_counter() - start, os.getpid()
+
+
+def render_all(jobs, workers):
+    """Yield render_figure() results as figures finish"""
+    if workers <= 1:
+        _init_worker()
+        yield from map(render_figure, jobs)
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker) as pool:
+        for future in as_completed([pool.submit(render_figure, job) for job in jobs]):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the WMS analysis charts and summary')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the datasets in chunks (bounded memory, for very large exports)')
+    parser.add_argument('--chunk-rows', type=int, default=250_000, help='rows per chunk with --stream')
+    parser.add_argument('--batch', action='store_true',
+                        help='headless report: render figures in parallel, without plt.show()')
+    parser.add_argument('--outputs', nargs='+', choices=list(FIGURES), default=list(FIGURES),
+                        help='figures to render (with --batch)')
+    parser.add_argument('--per-grain', action='store_true',
+                        help='also render each figure per grain type (with --batch)')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution (with --batch)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='render processes (with --batch)')
+    parser.add_argument('--output-dir', default='.', help='where to write the figures (with --batch)')
+    args = parser.parse_args()
+
+    if args.stream:
+        print(f"Streaming datasets in chunks of {args.chunk_rows:,} rows...")
+    else:
+        print("Loading datasets...")
+    reports = compute_aggregates(args.stream, args.chunk_rows, by_grain=args.batch and args.per_grain)
+    movements, activities = reports[None]
+
+    print(f"Grain Movements: {movements['records']} records")
+    print(f"Customer Activities: {activities['records']} records")
+    print("\n" + "="*80 + "\n")
+
+    if args.batch:
+        plt.switch_backend('Agg')
+        os.makedirs(args.output_dir, exist_ok=True)
+        jobs = figure_jobs(reports, args.outputs, args.output_dir, args.dpi)
+        workers = max(1, min(args.workers, len(jobs)))
+        print(f"Rendering {len(jobs)} figures at {args.dpi} dpi with {workers} worker(s)")
+        start = time.perf_counter()
+        for path, seconds, pid in render_all(jobs, workers):
+            print(f"✓ Saved: {path} ({seconds:.2f}s, pid {pid})")
+        print(f"Rendered in {time.perf_counter() - start:.2f}s")
+        print("\n" + "="*80 + "\n")
+        print_summary(movements, activities)
+        return
+
+    print("Creating Visualization 1: Grain IN/OUT Movement Analysis")
+    plot_grain_movements(movements)
+    print("✓ Saved: grain_movement_analysis.png")
+    plt.show()
+
+    print("\n" + "="*80 + "\n")
+
+    print("Creating Visualization 2: Customer Activity & Sales Analysis")
+    plot_customer_sales(activities)
+    print("✓ Saved: customer_sales_analysis.png")
+    plt.show()
+
+    print("\n" + "="*80 + "\n")
+
+    print_summary(movements, activities)
+
+    print("\n" + "="*80)
+    print("✓ Visualization Complete!")
+    print("Generated Files:")
+    print("  - grain_movement_analysis.png")
+    print("  - customer_sales_analysis.png")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+WMS Analytics - Feature Assembly
+================================
+Turns prediction request payloads straight into contiguous float64 arrays
+for the models, without going through pandas.
+
+Column order per model is fixed by MODEL_FEATURES, which mirrors the
+feature lists of the three training notebooks.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+
+def finite_float(value):
+    """float(value) for a numeric feature; NaN and infinity are invalid"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'{value!r} is not a finite number')
+    return number
+
+
+# Feature column -> (payload key, default value, encoder name or None)
+FEATURE_FIELDS = {
+    'grain_type_encoded': ('grain_type', 'wheat', 'grain'),
+    'total_bags': ('total_bags', 0, None),
+    'total_weight_kg': ('total_weight_kg', 0, None),
+    'storage_duration_days': ('storage_duration_days', 0, None),
+    'monthly_rent_per_bag': ('monthly_rent_per_bag', 50, None),
+    'total_rent_paid': ('total_rent_paid', 0, None),
+    'activity_status_encoded': ('activity_status', 'storing', 'activity'),
+    'sold_status_encoded': ('sold_status', 'no', 'sold'),
+}
+
+# Feature columns per model, in the order used by the training notebooks
+MODEL_FEATURES = {
+    'price': [
+        'grain_type_encoded', 'total_bags', 'total_weight_kg',
+        'storage_duration_days', 'monthly_rent_per_bag', 'total_rent_paid',
+        'activity_status_encoded', 'sold_status_encoded'
+    ],
+    'profit': [
+        'grain_type_encoded', 'total_bags', 'total_weight_kg',
+        'storage_duration_days', 'monthly_rent_per_bag', 'total_rent_paid',
+        'activity_status_encoded'
+    ],
+    'duration': [
+        'grain_type_encoded', 'total_bags', 'total_weight_kg',
+        'monthly_rent_per_bag', 'activity_status_encoded'
+    ],
+}
+
+# Union of all model features, used by the batch endpoint
+ALL_FEATURES = list(FEATURE_FIELDS)
+
+# Errors that mark a payload as invalid rather than a server fault
+FEATURE_ERRORS = (TypeError, ValueError, AttributeError, KeyError)
+
+
+class InvalidFeatureError(ValueError):
+    """A payload that cannot be assembled into a feature row"""
+
+
+class FeatureAssembler:
+    """Fill float arrays from payload dicts in a fixed column order
+
+    `encoders` maps the encoder names in FEATURE_FIELDS to functions that
+    turn a raw category into its numeric code, such as the CategoryEncoders
+    of a feature_transform.FeatureTransform. Encoders with a `column` method
+    let matrix() encode a whole column at once.
+    """
+
+    def __init__(self, columns, encoders):
+        self.columns = list(columns)
+        self._fields = []
+        for column in self.columns:
+            key, default, encoder = FEATURE_FIELDS[column]
+            self._fields.append((key, default, encoders[encoder] if encoder else finite_float))
+        self._local = threading.local()
+
+    def _fill(self, payload, out):
+        get = payload.get
+        for j, (key, default, convert) in enumerate(self._fields):
+            try:
+                out[j] = convert(get(key, default))
+            except FEATURE_ERRORS as e:
+                raise type(e)(f'{key}: {e}') from e
+
+    def row(self, payload):
+        """Assemble one payload into this thread's preallocated (1, k) buffer
+
+        The buffer is reused by the next call on the same thread, so callers
+        must finish with it (or copy it) before assembling another row.
+        """
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = np.empty((1, len(self.columns)), dtype=np.float64)
+            self._local.buffer = buffer
+        self._fill(payload, buffer[0])
+        return buffer
+
+    def _columns(self, payloads, matrix):
+        for j, (key, default, convert) in enumerate(self._fields):
+            values = [payload.get(key, default) for payload in payloads]
+            if convert is finite_float:
+                column = np.asarray(values, dtype=np.float64)
+                # NumPy turns None and 'nan' into NaN where finite_float() raises
+                if not np.isfinite(column).all():
+                    raise ValueError('non-finite numeric value')
+                matrix[:, j] = column
+            elif hasattr(convert, 'column'):
+                matrix[:, j] = convert.column(values)
+            else:
+                matrix[:, j] = [convert(value) for value in values]
+
+    def matrix(self, payloads):
+        """Assemble many payloads into one (n, k) matrix
+
+        Returns (matrix, valid, errors): `valid` is a boolean mask of rows that
+        assembled cleanly and `errors` maps invalid row indexes to messages.
+        Invalid rows are left uninitialised in the matrix.
+
+        Columns are converted whole; only a batch with an invalid row is
+        assembled again row by row, to find the rows at fault.
+        """
+        n_rows = len(payloads)
+        matrix = np.empty((n_rows, len(self.columns)), dtype=np.float64)
+        valid = np.ones(n_rows, dtype=bool)
+        errors = {}
+        try:
+            self._columns(payloads, matrix)
+            return matrix, valid, errors
+        except FEATURE_ERRORS:
+            pass
+        for i, payload in enumerate(payloads):
+            try:
+                self._fill(payload, matrix[i])
+            except FEATURE_ERRORS as e:
+                valid[i] = False
+                errors[i] = str(e)
+        return matrix, valid, errors
+
+    def arrays(self, columns, n_rows):
+        """Assemble a batch that arrives column by column
+
+        `columns` maps payload keys to arrays of n_rows values. Numeric
+        columns are used as given, with NaN marking a missing value and
+        infinity an invalid one. Categorical columns are (categories, codes)
+        pairs, codes indexing into categories and -1 marking a missing value,
+        so that each distinct category is encoded once. Absent keys take their default.
+        Returns (matrix, valid, errors) like matrix().
+        """
+        matrix = np.empty((n_rows, len(self.columns)), dtype=np.float64)
+        valid = np.ones(n_rows, dtype=bool)
+        errors = {}
+        for j, (key, default, convert) in enumerate(self._fields):
+            values = columns.get(key)
+            if values is None:
+                matrix[:, j] = convert(default)
+                continue
+            if convert is finite_float:
+                column = np.asarray(values, dtype=np.float64)
+                invalid = ~np.isfinite(column)
+                messages = None
+            else:
+                categories, codes = values
+                lookup, messages = [], []
+                for category in categories:
+                    try:
+                        lookup.append(convert(category))
+                        messages.append(None)
+                    except FEATURE_ERRORS as e:
+                        lookup.append(np.nan)
+                        messages.append(str(e))
+                # Code -1 picks the trailing NaN of a missing value
+                lookup.append(np.nan)
+                messages.append(f'missing {key}')
+                codes = np.asarray(codes)
+                column = np.asarray(lookup, dtype=np.float64)[codes]
+                invalid = np.isnan(column)
+            matrix[:, j] = column
+            for i in np.flatnonzero(invalid & valid):
+                if messages is not None:
+                    errors[int(i)] = messages[codes[i]]
+                elif np.isnan(column[i]):
+                    errors[int(i)] = f'missing {key}'
+                else:
+                    errors[int(i)] = f'{key}: {column[i]} is not a finite number'
+            valid &= ~invalid
+        return matrix, valid, errors
+
+
+def column_indexes(columns, source=ALL_FEATURES):
+    """Positions of `columns` within `source`, for slicing a union matrix"""
+    return np.asarray([source.index(column) for column in columns], dtype=np.intp)
+
+
+def check_model_features(model, columns):
+    """Raise if a fitted model disagrees with the schema's column order"""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None and list(names) != list(columns):
+        raise ValueError(f'Model features {list(names)} do not match schema {list(columns)}')
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is not None and n_features != len(columns):
+        raise ValueError(f'Model expects {n_features} features, schema has {len(columns)}')
@@ -0,0 +1,134 @@
+"""
+WMS Analytics - Feature Transform
+=================================
+The category codes the models were trained with, shared by training and
+serving.
+
+The notebooks and train_models.py fit a LabelEncoder per categorical column,
+which numbers the categories alphabetically (Barley=0, Maize=1, Millet=2,
+...). train_models.py writes those categories to feature_transform.json next
+to the models, model_registry.py copies it into every published version, and
+ml_api_service.py encodes request payloads with it:
+
+    {"format": 1,
+     "categories": {"grain": ["Barley", "Maize", ...],
+                    "activity": ["sold", "stored", "storing"],
+                    "sold": ["no", "partial", "yes"]}}
+
+Matching ignores case and surrounding whitespace. A value that is not one of
+the trained categories raises UnknownCategoryError instead of being mapped
+to some default code.
+"""
+
+import json
+import os
+
+import numpy as np
+
+TRANSFORM_FILE = 'feature_transform.json'
+FORMAT_VERSION = 1
+
+
+class UnknownCategoryError(ValueError):
+    """A categorical value the models were not trained on"""
+
+
+def encoder_categories(encoders):
+    """{encoder name: categories in code order} from pickled encoders
+
+    Accepts a dict of fitted LabelEncoders, the bare grain LabelEncoder that
+    profit_classification.ipynb pickles, or the category arrays of a
+    compiled model.
+    """
+    if encoders is None:
+        return {}
+    if hasattr(encoders, 'classes_'):
+        encoders = {'grain': encoders}
+    return {name: [str(value) for value in getattr(encoder, 'classes_', encoder)]
+            for name, encoder in encoders.items()}
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+class CategoryEncoder:
+    """Category -> code lookups for one categorical column"""
+
+    def __init__(self, name, categories):
+        self.name = name
+        self.categories = list(categories)
+        self._codes = {_normalize(value): float(code) for code, value in enumerate(self.categories)}
+
+    def _unknown(self, values):
+        return UnknownCategoryError(
+            f"unknown {self.name} {', '.join(repr(str(v)) for v in values)} "
+            f"(expected one of: {', '.join(self.categories)})")
+
+    def __call__(self, value):
+        code = self._codes.get(_normalize(value))
+        if code is None:
+            raise self._unknown([value])
+        return code
+
+    def column(self, values):
+        """Codes for a whole column of values as a float64 array
+
+        Each distinct value is looked up once; the codes are then spread back
+        over the column with one array index.
+        """
+        distinct, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        codes = np.array([self._codes.get(_normalize(value), np.nan) for value in distinct])
+        unknown = np.isnan(codes)
+        if unknown.any():
+            raise self._unknown(distinct[unknown][:5])
+        return codes[inverse.reshape(-1)]
+
+
+class FeatureTransform:
+    """The categories of every categorical feature, compiled into lookups"""
+
+    def __init__(self, categories):
+        self.categories = {name: [str(value) for value in values] for name, values in categories.items()}
+        self._encoders = {name: CategoryEncoder(name, values) for name, values in self.categories.items()}
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureTransform) and self.categories == other.categories
+
+    def __hash__(self):
+        return hash(json.dumps(self.categories, sort_keys=True))
+
+    @classmethod
+    def from_encoders(cls, *encoder_sets):
+        """Merge one or more sets of pickled encoders, which must agree"""
+        categories = {}
+        for encoders in encoder_sets:
+            for name, values in encoder_categories(encoders).items():
+                if categories.setdefault(name, values) != values:
+                    raise ValueError(f'{name} encoders disagree: {categories[name]} vs {values}')
+        return cls(categories)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported feature transform format {data.get('format')}")
+        return cls(data['categories'])
+
+    def save(self, path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'format': FORMAT_VERSION, 'categories': self.categories}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def check(self, encoders):
+        """Raise if pickled encoders number any category differently"""
+        for name, values in encoder_categories(encoders).items():
+            if name in self.categories and self.categories[name] != values:
+                raise ValueError(f'{name} encoder {values} does not match the feature transform '
+                                 f'{self.categories[name]}')
+
+    def encoders(self):
+        """{encoder name: CategoryEncoder}, as FeatureAssembler expects"""
+        return dict(self._encoders)
@@ -0,0 +1,319 @@
+"""
+WMS Analytics - Incremental Retraining
+======================================
+Keeps the three models up to date as new allocations are appended to
+CUSTOMER_ACTIVITIES.csv, without retraining on the full history.
+
+Each run reads only the rows appended since the previous run (the byte
+offset reached is kept per target), labels and encodes them exactly as the
+first training run did, and holds 20% of them out. The remaining rows grow a
+Random Forest with warm_start: new trees are fitted on the new rows only and
+added to the existing ones, so a run costs time in proportion to the rows
+appended, not to the history.
+
+The grown forest is scored on the held-out rows (the original test split
+plus every delta's held-out share) and published to the model registry only
+if its test F1 is no worse than that of the model currently served. Decision
+Trees and Logistic Regression cannot be grown this way, so a target whose
+served model is not a Random Forest (which estimator wins depends on the
+data) is skipped; a full train_models.py run remains the way to re-select
+among all three. A published forest carries the served version's
+feature_transform.json, with only its own target's categories updated.
+
+State lives in .train_cache/incremental-<target>.pkl. The first run, or
+--rebuild after CUSTOMER_ACTIVITIES.csv has been rewritten rather than
+appended to, builds it from the whole export: rows are read in the order
+train_models.py reads them, so the split is the served model's and the
+forest to grow is its cached fit (or the served forest itself), never a
+refit whose training rows overlap the held-out ones.
+
+Run with:
+    python incremental_training.py
+    python incremental_training.py --targets profit --trees 20 --min-rows 500
+"""
+
+import argparse
+import copy
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+import model_registry
+import train_models as tm
+from feature_assembly import MODEL_FEATURES
+from feature_transform import TRANSFORM_FILE, FeatureTransform
+from wms_data import DATA_DIR, DATASETS, read_csv_appended
+
+CSV_PATH = os.path.join(DATA_DIR, DATASETS['customer_activities']['csv'])
+STATE_VERSION = 1
+FOREST = 'Random Forest'
+# Held-out rows kept for the regression check, most recent first to go
+MAX_HOLDOUT_ROWS = 100_000
+TAIL_BYTES = 4096
+
+
+def tail_hash(path, offset):
+    """Hash of the bytes just before offset, to tell an appended export from a rewritten one"""
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.sha1(f.read(min(offset, TAIL_BYTES))).hexdigest()
+
+
+# =============================================================================
+# State
+# =============================================================================
+
+def load_state(name):
+    state = tm.cache_get('incremental', name)
+    return state if state is not None and state.get('version') == STATE_VERSION else None
+
+
+def label_bins(name, activities):
+    """Fixed bin edges equivalent to the notebook's bins=3, open at both ends"""
+    spec = tm.TARGETS[name]
+    rows, y = spec['target'](activities)
+    if not isinstance(y.dtype, pd.CategoricalDtype):
+        return None
+    _, edges = pd.cut(rows[spec['source']], bins=3, retbins=True)
+    edges[0], edges[-1] = -np.inf, np.inf
+    return edges
+
+
+def build_state(name, activities, offset, forest_jobs, served=None):
+    """Initial state from the training run over the export read so far
+
+    `activities` must be in load_dataset() order, as read_csv_appended()
+    returns them, so that the split and the fit cache key are those of
+    train_models.py. The forest is train_models' cached fit, else the served
+    forest, and only fitted here when there is neither.
+    """
+    dataset, dataset_key, _ = tm.load_featurized(name, activities)
+    estimator = tm.ESTIMATORS[FOREST](forest_jobs)
+    cached = tm.cache_get('fit', tm._fit_key(dataset_key, FOREST, estimator, tm.TARGETS[name]['average']))
+    if cached is not None:
+        forest = cached[0]
+    elif isinstance(served, RandomForestClassifier):
+        forest = served
+    else:
+        forest = estimator.fit(dataset['X_train'], dataset['y_train'])
+        forest.set_params(n_jobs=None)
+    return {
+        'version': STATE_VERSION,
+        'offset': offset,
+        'tail_hash': tail_hash(CSV_PATH, offset),
+        'bins': label_bins(name, activities),
+        'encoders': dataset['encoders'],
+        'forest': forest,
+        'X_holdout': dataset['X_test'],
+        'y_holdout': pd.Series(np.asarray(dataset['y_test'])),
+        'rows_seen': dataset['records'],
+        'runs': [],
+    }
+
+
+# =============================================================================
+# Update
+# =============================================================================
+
+def encode_rows(name, activities, state):
+    """Features and labels for new rows, encoded like the first run
+
+    Rows with a category the encoders have not seen cannot be encoded and
+    are dropped; returns (X, y, dropped).
+    """
+    spec = tm.TARGETS[name]
+    rows, y = spec['target'](activities, bins=state['bins'])
+    rows = rows.copy()
+    known = np.ones(len(rows), dtype=bool)
+    for encoder_name in spec['encoders']:
+        column, _ = tm.ENCODED_COLUMNS[encoder_name]
+        known &= rows[column].astype(str).isin(state['encoders'][encoder_name].classes_).to_numpy()
+    rows, y = rows[known], y[known]
+    for encoder_name in spec['encoders']:
+        column, encoded = tm.ENCODED_COLUMNS[encoder_name]
+        rows[encoded] = state['encoders'][encoder_name].transform(rows[column].astype(str))
+    return rows[MODEL_FEATURES[name]], pd.Series(np.asarray(y)), int((~known).sum())
+
+
+def grow(forest, X, y, trees, forest_jobs):
+    """Copy of forest with `trees` more trees fitted on X, y"""
+    grown = copy.deepcopy(forest)
+    grown.set_params(warm_start=True, n_estimators=len(forest.estimators_) + trees, n_jobs=forest_jobs)
+    grown.fit(X, y)
+    grown.set_params(warm_start=False, n_jobs=None)
+    return grown
+
+
+def served_path(name, registry, model_dir):
+    """Path of the model file the service would load for name"""
+    version = model_registry.current_version(name, registry)
+    if version:
+        return os.path.join(model_registry.version_dir(name, version, registry), model_registry.MODEL_FILE)
+    return os.path.join(model_dir, tm.TARGETS[name]['model_file'])
+
+
+def served_model(name, registry, model_dir):
+    """The model the service would load for name, or None"""
+    path = served_path(name, registry, model_dir)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def holdout_scores(model, X, y, average):
+    y_pred = model.predict(X)
+    return f1_score(y, y_pred, average=average, zero_division=0), accuracy_score(y, y_pred)
+
+
+def publish_forest(name, forest, encoders, args):
+    """Publish forest with a copy of the served feature transform
+
+    The transform covers every model's categories, not just this target's,
+    so it starts from the one beside the served model.
+    """
+    served_transform = os.path.join(os.path.dirname(served_path(name, args.registry, args.model_dir)),
+                                    TRANSFORM_FILE)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, model_registry.MODEL_FILE)
+        encoder_path = os.path.join(tmp_dir, model_registry.ENCODER_FILE)
+        tm.write_pickle(model_path, forest)
+        tm.write_pickle(encoder_path, tm.saved_encoders(name, encoders))
+        if os.path.exists(served_transform):
+            FeatureTransform.load(served_transform).save(os.path.join(tmp_dir, TRANSFORM_FILE))
+        transform_path = tm.save_transform([encoders], tmp_dir)
+        return model_registry.publish(name, model_path, encoder_path, args.registry, transform_path=transform_path)
+
+
+def update(name, state, activities, end_offset, args):
+    """Grow the target's forest on new rows and publish it if it does not regress
+
+    Returns the new state, or None when the rows are left for a later run.
+    """
+    spec = tm.TARGETS[name]
+    start = time.perf_counter()
+    X, y, dropped = encode_rows(name, activities, state)
+    if dropped:
+        print(f"  {name}: {dropped:,} new rows have unknown categories and are skipped")
+    if len(X) < args.min_rows:
+        print(f"  {name}: {len(X):,} new rows, waiting for --min-rows {args.min_rows}")
+        return None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # New trees re-derive the classes from their own rows, so every class
+    # the forest predicts must be present in them
+    missing = set(state['forest'].classes_) - set(y_train)
+    if missing:
+        print(f"  {name}: new rows lack classes {sorted(missing)}, waiting for more rows")
+        return None
+
+    candidate = grow(state['forest'], X_train, y_train, args.trees, args.forest_jobs)
+    fit_seconds = time.perf_counter() - start
+
+    X_holdout = pd.concat([state['X_holdout'], X_test]).iloc[-MAX_HOLDOUT_ROWS:]
+    y_holdout = pd.concat([state['y_holdout'], y_test], ignore_index=True).iloc[-MAX_HOLDOUT_ROWS:]
+    f1, accuracy = holdout_scores(candidate, X_holdout, y_holdout, spec['average'])
+    previous_f1, _ = holdout_scores(state['forest'], X_holdout, y_holdout, spec['average'])
+    served = served_model(name, args.registry, args.model_dir)
+    served_f1 = (holdout_scores(served, X_holdout, y_holdout, spec['average'])[0]
+                 if served is not None else previous_f1)
+
+    run = {
+        'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows': len(X), 'dropped': dropped,
+        'trees': len(candidate.estimators_), 'holdout_rows': len(y_holdout),
+        'f1': float(f1), 'accuracy': float(accuracy), 'served_f1': float(served_f1),
+        'fit_seconds': round(fit_seconds, 3), 'published': None,
+    }
+    summary = (f"{name}: {len(X):,} new rows, {len(candidate.estimators_)} trees, held-out F1 "
+               f"{f1:.4f} (served {served_f1:.4f}, fit {fit_seconds:.1f}s)")
+    forest = state['forest']
+    if f1 < previous_f1 - args.tolerance:
+        print(f"✗ {summary} -> worse than the previous forest ({previous_f1:.4f}), discarded")
+    else:
+        forest = candidate
+        if f1 < served_f1 - args.tolerance:
+            print(f"✗ {summary} -> kept, not published")
+        elif args.dry_run:
+            print(f"✓ {summary} -> would publish (dry run)")
+        else:
+            run['published'] = publish_forest(name, candidate, state['encoders'], args)
+            print(f"✓ {summary} -> published {run['published']}")
+
+    return {
+        **state,
+        'offset': end_offset,
+        'tail_hash': tail_hash(CSV_PATH, end_offset),
+        'forest': forest,
+        'X_holdout': X_holdout,
+        'y_holdout': y_holdout,
+        'rows_seen': state['rows_seen'] + len(X),
+        'runs': state['runs'] + [run],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the WMS models with newly appended activity rows')
+    parser.add_argument('--targets', nargs='+', choices=list(tm.TARGETS), default=list(tm.TARGETS))
+    parser.add_argument('--trees', type=int, default=10, help='trees added per run (default: 10)')
+    parser.add_argument('--min-rows', type=int, default=100,
+                        help='new rows needed before a target is updated (default: 100)')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='held-out F1 drop still accepted (default: 0)')
+    parser.add_argument('--forest-jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--registry', default=model_registry.DEFAULT_REGISTRY)
+    parser.add_argument('--model-dir', default=tm.BASE_DIR,
+                        help='where the served *_BEST.pkl files are when the registry has none')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the state from the whole export')
+    parser.add_argument('--dry-run', action='store_true', help='do not publish or save state')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    full = None
+    deltas = {}
+    for name in args.targets:
+        served = served_model(name, args.registry, args.model_dir)
+        if served is not None and not isinstance(served, RandomForestClassifier):
+            print(f"✗ {name}: the served model is a {type(served).__name__}, not a Random Forest; "
+                  f"retrain it with train_models.py")
+            continue
+        state = None if args.rebuild else load_state(name)
+        if state is not None and (os.path.getsize(CSV_PATH) < state['offset']
+                                  or tail_hash(CSV_PATH, state['offset']) != state['tail_hash']):
+            print(f"✗ {name}: {CSV_PATH} was rewritten since the last run, use --rebuild")
+            continue
+
+        if state is None:
+            if full is None:
+                full = read_csv_appended('customer_activities', 0, CSV_PATH)
+            activities, offset = full
+            start = time.perf_counter()
+            state = build_state(name, activities, offset, args.forest_jobs, served)
+            print(f"✓ {name}: state built from {state['rows_seen']:,} records "
+                  f"({time.perf_counter() - start:.1f}s)")
+        else:
+            # Targets whose rows were held back start further back; read each offset once
+            if state['offset'] not in deltas:
+                deltas[state['offset']] = read_csv_appended('customer_activities', state['offset'], CSV_PATH)
+            activities, end_offset = deltas[state['offset']]
+            if activities.empty:
+                print(f"  {name}: no new rows")
+                continue
+            state = update(name, state, activities, end_offset, args)
+            if state is None:
+                continue
+
+        if not args.dry_run:
+            tm.cache_put('incremental', name, state)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,132 +1,504 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_cors import CORS
+import hmac
+import json
 import pickle
-import pandas as pd
 import numpy as np
 import os
+import threading
+import time
+import warnings
+from collections import namedtuple
+from contextlib import contextmanager
+
+from feature_assembly import (ALL_FEATURES, FEATURE_ERRORS, FEATURE_FIELDS, MODEL_FEATURES, FeatureAssembler,
+                              InvalidFeatureError, check_model_features, column_indexes)
+from feature_transform import TRANSFORM_FILE, FeatureTransform, UnknownCategoryError
+import arrow_batch
+import model_registry
+from arrow_batch import ARROW_MIMETYPE
+from model_registry import file_version
+from prediction_cache import MISSING, PredictionCache
+from prediction_table import PredictionTable, QuantizedModel, table_path
+from request_coalescer import MicroBatcher
+from sampling_profiler import ProfileInProgress, SamplingProfiler
+from service_metrics import ServiceMetrics
+from tree_engine import COMPILED_SUFFIX, MANIFEST_FILE, CompiledModel, is_current
+
+# Pickled sklearn models were fitted on DataFrames; features now arrive as
+# arrays in the same column order, which check_model_features() verifies
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
 app = Flask(__name__)
 CORS(app)
 
+# Request counts and latencies for GET /metrics. serve_ml.py sets
+# ML_METRICS_DIR so that any worker reports the totals of all of them.
+metrics = ServiceMetrics(os.environ.get('ML_METRICS_DIR') or None)
+
+# On-demand stack sampling of request threads (POST /admin/profile), shared
+# between the workers through the same directory
+profiler = SamplingProfiler(os.environ.get('ML_METRICS_DIR') or None)
+MAX_PROFILE_SECONDS = 60
+
+@contextmanager
+def stage(name):
+    """Time one stage of the current request: parse, assemble, infer or serialize"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Outside a Flask request (the ASGI gateway) there is nowhere to record it
+        if has_request_context():
+            stages = g.setdefault('stages', {})
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def serialized(payload):
+    """jsonify() timed as the serialize stage"""
+    with stage('serialize'):
+        return jsonify(payload)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    profiler.enter(request.endpoint)
+
+@app.teardown_request
+def end_request(exc):
+    profiler.leave()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    seconds = time.perf_counter() - g.get('request_start', time.perf_counter())
+    metrics.inc('ml_requests_total', endpoint=endpoint, status=str(response.status_code))
+    if response.status_code >= 400:
+        metrics.inc('ml_request_errors_total', endpoint=endpoint)
+    metrics.observe('ml_request_duration_seconds', seconds, endpoint=endpoint)
+    for name, stage_seconds in g.get('stages', {}).items():
+        metrics.observe('ml_stage_duration_seconds', stage_seconds, endpoint=endpoint, stage=name)
+    return response
+
 # Load trained models and encoders
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Model 1: Price Prediction
-try:
-    with open(os.path.join(MODEL_DIR, 'model1_price_prediction_BEST.pkl'), 'rb') as f:
-        price_model = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'model1_label_encoders.pkl'), 'rb') as f:
-        price_encoders = pickle.load(f)
-    print("✓ Price prediction model loaded")
-except Exception as e:
-    print(f"✗ Failed to load price model: {e}")
-    price_model = None
-    price_encoders = None
-
-# Model 2: Profit/Loss Classification
-try:
-    with open(os.path.join(MODEL_DIR, 'model2_profit_classification_BEST.pkl'), 'rb') as f:
-        profit_model = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'model2_label_encoders.pkl'), 'rb') as f:
-        profit_encoders = pickle.load(f)
-    print("✓ Profit classification model loaded")
-except Exception as e:
-    print(f"✗ Failed to load profit model: {e}")
-    profit_model = None
-    profit_encoders = None
-
-# Model 3: Storage Duration Prediction
-try:
-    with open(os.path.join(MODEL_DIR, 'model3_storage_duration_BEST.pkl'), 'rb') as f:
-        duration_model = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'model3_label_encoders.pkl'), 'rb') as f:
-        duration_encoders = pickle.load(f)
-    print("✓ Storage duration model loaded")
-except Exception as e:
-    print(f"✗ Failed to load duration model: {e}")
-    duration_model = None
-    duration_encoders = None
-
-# Grain type mapping
-GRAIN_TYPE_MAP = {
-    'wheat': 0,
-    'rice': 1,
-    'maize': 2,
-    'barley': 3,
-    'soybean': 4
-}
+# Versioned models published with model_registry.py take precedence over the
+# loose model*_BEST.pkl files next to this script
+MODEL_REGISTRY = model_registry.DEFAULT_REGISTRY
 
-ACTIVITY_STATUS_MAP = {
-    'active': 0,
-    'inactive': 1,
-    'completed': 2
+# name: (loose model file, loose encoder file, display name)
+MODEL_FILES = {
+    'price': ('model1_price_prediction_BEST.pkl', 'model1_label_encoders.pkl', 'Price prediction'),
+    'profit': ('model2_profit_classification_BEST.pkl', 'model2_label_encoders.pkl', 'Profit classification'),
+    'duration': ('model3_storage_duration_BEST.pkl', 'model3_label_encoders.pkl', 'Storage duration')
 }
 
-SOLD_STATUS_MAP = {
-    'sold': 0,
-    'not_sold': 1
+# A loaded model is replaced as a whole, so a request that picked one up
+# keeps a consistent model, encoders and version until it finishes.
+# `assembler` turns payloads into rows with the model's feature transform.
+LoadedModel = namedtuple('LoadedModel', ['model', 'encoders', 'transform', 'assembler', 'version', 'signature'])
+
+models = {name: None for name in MODEL_FILES}
+
+# Opt-in serving from the precomputed tables of prediction_table.py; a table
+# is only used when it matches the model and agrees with it often enough
+QUANTIZED = os.environ.get('ML_QUANTIZED', '0').lower() in ('1', 'true', 'yes')
+QUANTIZED_MIN_AGREEMENT = float(os.environ.get('ML_QUANTIZED_MIN_AGREEMENT', '0.99'))
+
+def artifact_paths(directory, model_file):
+    """Candidate artifacts for a model, most preferred first"""
+    stem = os.path.join(directory, model_file[:-len('.pkl')])
+    return [stem + COMPILED_SUFFIX, stem + '.npz', os.path.join(directory, model_file)]
+
+def locate_model(name):
+    """Where the model to serve lives: (directory, model file, encoder file, registry version)"""
+    version = model_registry.current_version(name, MODEL_REGISTRY)
+    if version is not None:
+        return (model_registry.version_dir(name, version, MODEL_REGISTRY),
+                model_registry.MODEL_FILE, model_registry.ENCODER_FILE, version)
+    model_file, encoder_file, _ = MODEL_FILES[name]
+    return MODEL_DIR, model_file, encoder_file, None
+
+def stat_signature(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+def model_signature(name):
+    """Cheap identity of the artifact that would be loaded, to detect changes"""
+    directory, model_file, _, version = locate_model(name)
+    if version is not None:
+        signature = ('registry', version)
+    else:
+        # Every artifact counts: a retrained pickle makes a compiled copy stale
+        signature = ()
+        for path in artifact_paths(directory, model_file):
+            stat_path = os.path.join(path, MANIFEST_FILE) if path.endswith(COMPILED_SUFFIX) else path
+            if os.path.exists(stat_path):
+                signature += stat_signature(stat_path)
+        signature = signature or None
+    # A rebuilt table is picked up like a changed model
+    manifest = os.path.join(table_path(directory, model_file), MANIFEST_FILE)
+    if QUANTIZED and signature is not None and os.path.exists(manifest):
+        signature += stat_signature(manifest)
+    return signature
+
+def load_transform(directory, encoders):
+    """The feature transform that encodes payloads for a model
+
+    Read from the feature_transform.json written by training beside the
+    model. Loose models without one fall back to the categories of all the
+    loose encoder pickles, since model2's holds only the grain encoder.
+    Either way the model's own encoders must agree with it.
+    """
+    path = os.path.join(directory, TRANSFORM_FILE)
+    if os.path.exists(path):
+        transform = FeatureTransform.load(path)
+    else:
+        encoder_sets = [encoders]
+        if directory == MODEL_DIR:
+            for _, encoder_file, _ in MODEL_FILES.values():
+                try:
+                    with open(os.path.join(MODEL_DIR, encoder_file), 'rb') as f:
+                        encoder_sets.append(pickle.load(f))
+                except FileNotFoundError:
+                    pass
+        transform = FeatureTransform.from_encoders(*encoder_sets)
+    transform.check(encoders)
+    return transform
+
+def load_model(directory, model_file, encoder_file, columns):
+    """Load a model, its encoders, its feature transform and its content hash
+
+    Prefers the compiled artifact written by tree_engine.py, which is
+    memory-mapped and evaluated with NumPy only; falls back to the pickled
+    sklearn model when there is none, or when it was compiled from another
+    pickle than the one beside it. A model published without encoders gets
+    its categories from the feature transform alone.
+    """
+    model_path = os.path.join(directory, model_file)
+    compiled_path = next((path for path in artifact_paths(directory, model_file)[:2] if os.path.exists(path)), None)
+    if compiled_path and not is_current(compiled_path, model_path):
+        print(f"✗ {os.path.basename(compiled_path)} was not compiled from {model_file}; serving the pickle "
+              f"(re-run tree_engine.py)")
+        compiled_path = None
+    if compiled_path:
+        model = CompiledModel.load(compiled_path)
+        encoders = model.encoders
+        content_hash = file_version(compiled_path)
+    else:
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        try:
+            with open(os.path.join(directory, encoder_file), 'rb') as f:
+                encoders = pickle.load(f)
+        except FileNotFoundError:
+            encoders = None
+        content_hash = file_version(model_path)
+    check_model_features(model, columns)
+    transform = load_transform(directory, encoders)
+    missing = {FEATURE_FIELDS[column][2] for column in columns} - {None} - set(transform.categories)
+    if missing:
+        raise ValueError(f"No categories for {', '.join(sorted(missing))}; publish the model "
+                         f"with its {TRANSFORM_FILE}")
+    return model, encoders, transform, content_hash
+
+def quantized(name, model, directory, model_file, version, transform):
+    """The model behind its prediction table, or the model itself when there is no usable table"""
+    path = table_path(directory, model_file)
+    if not os.path.isdir(path):
+        print(f"  {name}: no prediction table; serving the exact model")
+        return model
+    try:
+        table = PredictionTable.load(path)
+        table.check(version, MODEL_FEATURES[name], transform)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"✗ {name} prediction table not used: {e}")
+        return model
+    if table.label_agreement() < QUANTIZED_MIN_AGREEMENT:
+        print(f"✗ {name} prediction table not used: {table.summary()}, "
+              f"below ML_QUANTIZED_MIN_AGREEMENT={QUANTIZED_MIN_AGREEMENT:g}")
+        return model
+    print(f"✓ {name} prediction table loaded ({table.summary()})")
+    return QuantizedModel(model, table)
+
+# Memoized model outputs; ML_CACHE_MAX_MB=0 disables the cache
+CACHE_MAX_MB = float(os.environ.get('ML_CACHE_MAX_MB', '32'))
+CACHE_TTL_SECONDS = float(os.environ.get('ML_CACHE_TTL_SECONDS', '300'))
+prediction_cache = PredictionCache(CACHE_MAX_MB * 1024 * 1024, CACHE_TTL_SECONDS) if CACHE_MAX_MB > 0 else None
+
+_reload_lock = threading.Lock()
+
+def load_models(force=False):
+    """Load every model whose artifact changed and swap it in
+
+    New models are fully loaded before they replace the old ones, and a
+    model that fails to load leaves its predecessor serving. Returns a
+    status per model.
+    """
+    status = {}
+    with _reload_lock:
+        for name, (_, _, label) in MODEL_FILES.items():
+            current = models[name]
+            signature = model_signature(name)
+            if not force and current is not None and current.signature == signature:
+                status[name] = {'status': 'unchanged', 'version': current.version}
+                continue
+            try:
+                directory, model_file, encoder_file, registry_version = locate_model(name)
+                model, encoders, transform, content_hash = load_model(
+                    directory, model_file, encoder_file, MODEL_FEATURES[name])
+                version = registry_version or content_hash
+                if QUANTIZED:
+                    model = quantized(name, model, directory, model_file, version, transform)
+                assembler = FeatureAssembler(MODEL_FEATURES[name], transform.encoders())
+                models[name] = LoadedModel(model, encoders, transform, assembler, version, signature)
+                status[name] = {'status': 'loaded', 'version': models[name].version}
+                print(f"✓ {label} model loaded (version {models[name].version})")
+            except Exception as e:
+                status[name] = {'status': 'failed', 'error': str(e),
+                                'version': current.version if current else None}
+                print(f"✗ Failed to load {name} model: {e}")
+
+        # Entries are keyed by version, so this only frees memory held for old models
+        if prediction_cache is not None and any(s['status'] == 'loaded' for s in status.values()):
+            prediction_cache.clear()
+    return status
+
+def model_versions(loaded=None):
+    """{model: version} of `loaded` (a snapshot of models), or of the current models"""
+    return {name: model.version if model else None for name, model in (loaded or models).items()}
+
+load_models(force=True)
+
+# Each worker process polls the registry pointers (and the loose model files)
+# and reloads in the background; ML_RELOAD_INTERVAL_SECONDS=0 disables this
+RELOAD_INTERVAL_SECONDS = float(os.environ.get('ML_RELOAD_INTERVAL_SECONDS', '5'))
+_watcher = {'pid': None}
+_watcher_lock = threading.Lock()
+
+def watch_models():
+    while True:
+        time.sleep(RELOAD_INTERVAL_SECONDS)
+        try:
+            load_models()
+        except Exception as e:
+            print(f"✗ Model reload check failed: {e}")
+
+@app.before_request
+def ensure_model_watcher():
+    # Threads do not survive fork(), so start one in every worker process
+    if RELOAD_INTERVAL_SECONDS <= 0 or _watcher['pid'] == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher['pid'] != os.getpid():
+            threading.Thread(target=watch_models, name='model-watcher', daemon=True).start()
+            _watcher['pid'] = os.getpid()
+
+# The batch endpoint assembles the union of its models' features once per
+# feature transform (normally one for all three) and slices per model
+_batch_assemblers = {}
+
+def batch_assembler(transform, names):
+    """(assembler, {model: column indexes}) for models sharing a transform"""
+    key = (transform, tuple(names))
+    if key not in _batch_assemblers:
+        columns = [column for column in ALL_FEATURES if any(column in MODEL_FEATURES[n] for n in names)]
+        _batch_assemblers[key] = (FeatureAssembler(columns, transform.encoders()),
+                                  {name: column_indexes(MODEL_FEATURES[name], columns) for name in names})
+    return _batch_assemblers[key]
+
+def assemble_groups(loaded, n_rows, assemble):
+    """Feature matrices for a batch: ({model: (matrix, column indexes)}, valid, errors)
+
+    `assemble(assembler)` returns (matrix, valid, errors) for one batch
+    assembler. A row that fails to assemble for any model is invalid for
+    all of them.
+    """
+    groups = {}
+    for name, model in loaded.items():
+        if model:
+            groups.setdefault(model.transform, []).append(name)
+    valid = np.ones(n_rows, dtype=bool)
+    errors, matrices = {}, {}
+    for transform, names in groups.items():
+        assembler, indexes = batch_assembler(transform, names)
+        matrix, group_valid, group_errors = assemble(assembler)
+        valid &= group_valid
+        for i, message in group_errors.items():
+            errors.setdefault(i, message)
+        for name in names:
+            matrices[name] = (matrix, indexes[name])
+    return matrices, valid, errors
+
+def assemble_batch(loaded, payloads):
+    """assemble_groups() for a list of payloads; entries that are not dicts are invalid rows"""
+    objects = [payload if isinstance(payload, dict) else {} for payload in payloads]
+    matrices, valid, errors = assemble_groups(loaded, len(objects), lambda assembler: assembler.matrix(objects))
+    for i, payload in enumerate(payloads):
+        if not isinstance(payload, dict):
+            valid[i] = False
+            errors[i] = f'expected a JSON object, got {type(payload).__name__}'
+    return matrices, valid, errors
+
+def customer_id(payload):
+    return payload.get('customerId') if isinstance(payload, dict) else None
+
+def assemble_columns(loaded, columns, n_rows):
+    """assemble_groups() for a batch given column by column (see FeatureAssembler.arrays)"""
+    return assemble_groups(loaded, n_rows, lambda assembler: assembler.arrays(columns, n_rows))
+
+def predict_price_matrix(model, X):
+    """Run the price model over a feature matrix"""
+    return model.predict(X).tolist()
+
+def predict_profit_matrix(model, X):
+    """Run the profit model over a feature matrix
+
+    Returns (label, probabilities) pairs; probabilities is None when the
+    model does not support predict_proba.
+    """
+    labels = model.predict(X).tolist()
+    try:
+        probabilities = model.predict_proba(X).tolist()
+    except Exception:
+        probabilities = [None] * len(labels)
+    return list(zip(labels, probabilities))
+
+def predict_duration_matrix(model, X):
+    """Run the duration model over a feature matrix"""
+    return model.predict(X).tolist()
+
+PREDICT_MATRIX = {
+    'price': predict_price_matrix,
+    'profit': predict_profit_matrix,
+    'duration': predict_duration_matrix
 }
 
-def encode_grain_type(grain_type):
-    """Encode grain type to numeric value"""
-    grain_lower = grain_type.lower()
-    return GRAIN_TYPE_MAP.get(grain_lower, 0)  # Default to wheat
+def predict_rows(name):
+    """Coalescer batch function over (LoadedModel, row) items
+
+    Each row runs through the model whose encoders assembled it, even if a
+    reload swapped models while it was queued; a batch that spans a reload
+    makes one call per model version. Results are tagged with the version.
+    """
+    def run(items):
+        groups = {}
+        for i, (loaded, _) in enumerate(items):
+            groups.setdefault(loaded.version, (loaded, []))[1].append(i)
+        results = [None] * len(items)
+        for version, (loaded, indexes) in groups.items():
+            outputs = PREDICT_MATRIX[name](loaded.model, np.concatenate([items[i][1] for i in indexes]))
+            for i, output in zip(indexes, outputs):
+                results[i] = (version, output)
+        return results
+    return run
+
+# Opt-in micro-batching of concurrent single-prediction requests
+COALESCE_ENABLED = os.environ.get('ML_COALESCE', '0').lower() in ('1', 'true', 'yes')
+COALESCE_MAX_WAIT_MS = float(os.environ.get('ML_COALESCE_MAX_WAIT_MS', '5'))
+COALESCE_MAX_BATCH = int(os.environ.get('ML_COALESCE_MAX_BATCH', '64'))
 
-def encode_activity_status(status):
-    """Encode activity status to numeric value"""
-    status_lower = status.lower()
-    return ACTIVITY_STATUS_MAP.get(status_lower, 0)  # Default to active
+coalescers = {}
+if COALESCE_ENABLED:
+    coalescers = {
+        name: MicroBatcher(predict_rows(name), max_wait_ms=COALESCE_MAX_WAIT_MS, max_batch_size=COALESCE_MAX_BATCH, name=name)
+        for name in PREDICT_MATRIX
+    }
 
-def encode_sold_status(status):
-    """Encode sold status to numeric value"""
-    status_lower = status.lower()
-    return SOLD_STATUS_MAP.get(status_lower, 1)  # Default to not_sold
+def predict_single(name, loaded, data):
+    """Assemble one payload and predict it
+
+    Served from the prediction cache when possible, otherwise through the
+    coalescer when it is enabled. Returns (model version, result). Raises
+    UnknownCategoryError or InvalidFeatureError for a payload that cannot
+    be assembled.
+    """
+    with stage('assemble'):
+        if not isinstance(data, dict):
+            raise InvalidFeatureError('expected a JSON object')
+        try:
+            row = loaded.assembler.row(data)
+        except UnknownCategoryError:
+            raise
+        except FEATURE_ERRORS as e:
+            raise InvalidFeatureError(str(e)) from e
+
+    key = None
+    if prediction_cache is not None:
+        key = prediction_cache.make_key(name, loaded.version, row)
+        cached = prediction_cache.get(key)
+        if cached is not MISSING:
+            return loaded.version, cached
+
+    with stage('infer'):
+        if name in coalescers:
+            version, result = coalescers[name].submit((loaded, row))
+        else:
+            version, result = loaded.version, PREDICT_MATRIX[name](loaded.model, row)[0]
+
+    if key is not None:
+        prediction_cache.put(key, result)
+    return version, result
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    response = {
         'status': 'healthy',
         'models_loaded': {
-            'price_prediction': price_model is not None,
-            'profit_classification': profit_model is not None,
-            'duration_prediction': duration_model is not None
-        }
-    })
+            'price_prediction': models['price'] is not None,
+            'profit_classification': models['profit'] is not None,
+            'duration_prediction': models['duration'] is not None
+        },
+        'model_versions': model_versions()
+    }
+    if coalescers:
+        response['coalescing'] = {name: batcher.stats() for name, batcher in coalescers.items()}
+    if prediction_cache is not None:
+        response['cache'] = prediction_cache.stats()
+    if QUANTIZED:
+        response['quantized'] = {name: model.model.stats() if isinstance(model.model, QuantizedModel) else None
+                                 for name, model in models.items() if model is not None}
+    return jsonify(response)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request counts, latency, stage and batch-size histograms and RSS, for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/predict/price', methods=['POST'])
 def predict_price():
     """Predict grain sale price"""
     try:
-        if not price_model:
+        loaded = models['price']
+        if not loaded:
             return jsonify({'error': 'Price prediction model not loaded'}), 503
 
-        data = request.json
-        
-        # Prepare features
-        features = pd.DataFrame([{
-            'grain_type_encoded': encode_grain_type(data.get('grain_type', 'wheat')),
-            'total_bags': float(data.get('total_bags', 0)),
-            'total_weight_kg': float(data.get('total_weight_kg', 0)),
-            'storage_duration_days': float(data.get('storage_duration_days', 0)),
-            'monthly_rent_per_bag': float(data.get('monthly_rent_per_bag', 50)),
-            'total_rent_paid': float(data.get('total_rent_paid', 0)),
-            'activity_status_encoded': encode_activity_status(data.get('activity_status', 'active')),
-            'sold_status_encoded': encode_sold_status(data.get('sold_status', 'not_sold'))
-        }])
+        with stage('parse'):
+            data = request.get_json(silent=True)
         
-        # Make prediction
-        predicted_price = price_model.predict(features)[0]
+        # Prepare features and make prediction
+        version, predicted_price = predict_single('price', loaded, data)
+        if predicts_labels(loaded.model):
+            # A price band such as 'High Price'
+            return serialized({
+                'predicted_price': str(predicted_price),
+                'unit': 'price band',
+                'model_version': version
+            })
         
         # Calculate confidence based on model's R² score (simplified)
         confidence = 'high' if predicted_price > 0 else 'medium'
         
-        return jsonify({
+        return serialized({
             'predicted_price': float(predicted_price),
             'confidence': confidence,
-            'unit': 'INR per kg'
+            'unit': 'INR per kg',
+            'model_version': version
         })
     
+    except (UnknownCategoryError, InvalidFeatureError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -134,38 +506,32 @@ def predict_price():
 def predict_profit():
     """Predict profit/loss classification"""
     try:
-        if not profit_model:
+        loaded = models['profit']
+        if not loaded:
             return jsonify({'error': 'Profit classification model not loaded'}), 503
 
-        data = request.json
+        with stage('parse'):
+            data = request.get_json(silent=True)
         
-        # Prepare features
-        features = pd.DataFrame([{
-            'grain_type_encoded': encode_grain_type(data.get('grain_type', 'wheat')),
-            'total_bags': float(data.get('total_bags', 0)),
-            'total_weight_kg': float(data.get('total_weight_kg', 0)),
-            'storage_duration_days': float(data.get('storage_duration_days', 0)),
-            'monthly_rent_per_bag': float(data.get('monthly_rent_per_bag', 50)),
-            'total_rent_paid': float(data.get('total_rent_paid', 0)),
-            'activity_status_encoded': encode_activity_status(data.get('activity_status', 'active'))
-        }])
-        
-        # Make prediction
-        is_profitable = bool(profit_model.predict(features)[0])
+        # Prepare features and make prediction
+        version, (label, probabilities) = predict_single('profit', loaded, data)
+        is_profitable = bool(label)
         
         # Get probability if model supports it
-        try:
-            probabilities = profit_model.predict_proba(features)[0]
+        if probabilities is not None:
             probability = float(probabilities[1] if is_profitable else probabilities[0])
-        except:
+        else:
             probability = 0.75  # Default probability
         
-        return jsonify({
+        return serialized({
             'is_profitable': is_profitable,
             'probability': probability,
-            'recommendation': 'Good position - continue storage' if is_profitable else 'Consider selling soon to minimize losses'
+            'recommendation': 'Good position - continue storage' if is_profitable else 'Consider selling soon to minimize losses',
+            'model_version': version
         })
     
+    except (UnknownCategoryError, InvalidFeatureError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -173,96 +539,322 @@ def predict_profit():
 def predict_duration():
     """Predict storage duration"""
     try:
-        if not duration_model:
+        loaded = models['duration']
+        if not loaded:
             return jsonify({'error': 'Duration prediction model not loaded'}), 503
 
-        data = request.json
-        
-        # Prepare features
-        features = pd.DataFrame([{
-            'grain_type_encoded': encode_grain_type(data.get('grain_type', 'wheat')),
-            'total_bags': float(data.get('total_bags', 0)),
-            'total_weight_kg': float(data.get('total_weight_kg', 0)),
-            'monthly_rent_per_bag': float(data.get('monthly_rent_per_bag', 50)),
-            'activity_status_encoded': encode_activity_status(data.get('activity_status', 'active'))
-        }])
+        with stage('parse'):
+            data = request.get_json(silent=True)
         
-        # Make prediction
-        predicted_duration = float(duration_model.predict(features)[0])
+        # Prepare features and make prediction
+        version, predicted_duration = predict_single('duration', loaded, data)
+        if predicts_labels(loaded.model):
+            # A duration band such as 'Long-term'
+            return serialized({
+                'predicted_duration': str(predicted_duration),
+                'unit': 'duration band',
+                'model_version': version
+            })
+        predicted_duration = float(predicted_duration)
         
-        return jsonify({
+        return serialized({
             'predicted_duration': predicted_duration,
             'unit': 'days',
-            'estimated_months': round(predicted_duration / 30, 1)
+            'estimated_months': round(predicted_duration / 30, 1),
+            'model_version': version
         })
     
+    except (UnknownCategoryError, InvalidFeatureError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def predicts_labels(model):
+    """True for a classifier whose classes are labels rather than numbers
+
+    The notebooks' price and duration models classify into bands ('High
+    Price', 'Long-term', ...), so their outputs are strings.
+    """
+    classes = getattr(model, 'classes_', None)
+    return classes is not None and np.asarray(classes).dtype.kind not in 'biuf'
+
+def output_array(model, n_rows):
+    """An empty batch output: float64 NaN, or None for a label model"""
+    if predicts_labels(model):
+        return np.full(n_rows, None, dtype=object)
+    return np.full(n_rows, np.nan)
+
+def batch_outputs(loaded, matrices, valid):
+    """Predictions for a batch as arrays over all its rows
+
+    One array per output of the loaded models: 'price', 'profitable' (1 or
+    0), 'probability' and 'duration'. 'price' and 'duration' hold the class
+    labels (str) of a label model, and floats otherwise. NaN, or None for
+    labels, marks no prediction: an invalid row or a model that failed on
+    the batch. Each model is called once, on the valid rows.
+    """
+    n_rows = len(valid)
+    valid_idx = np.flatnonzero(valid)
+    features = {name: matrix[np.ix_(valid_idx, indexes)] for name, (matrix, indexes) in matrices.items()}
+    outputs = {}
+    for key, name in (('price', 'price'), ('profitable', 'profit'), ('probability', 'profit'),
+                      ('duration', 'duration')):
+        if loaded[name]:
+            outputs[key] = output_array(loaded[name].model, n_rows) if key in ('price', 'duration') \
+                else np.full(n_rows, np.nan)
+    if not len(valid_idx):
+        return outputs
+
+    # Price prediction
+    if loaded['price']:
+        try:
+            with stage('infer'):
+                prices = predict_price_matrix(loaded['price'].model, features['price'])
+            outputs['price'][valid_idx] = prices
+        except Exception:
+            pass
+
+    # Profit prediction
+    if loaded['profit']:
+        try:
+            with stage('infer'):
+                profits = predict_profit_matrix(loaded['profit'].model, features['profit'])
+            labels, probabilities = zip(*profits)
+            profitable = np.fromiter((bool(label) for label in labels), dtype=bool, count=len(labels))
+            outputs['profitable'][valid_idx] = profitable
+            if probabilities[0] is not None:
+                probabilities = np.asarray(probabilities, dtype=np.float64)
+                outputs['probability'][valid_idx] = np.where(profitable, probabilities[:, 1], probabilities[:, 0])
+        except Exception:
+            pass
+
+    # Duration prediction
+    if loaded['duration']:
+        try:
+            with stage('infer'):
+                durations = predict_duration_matrix(loaded['duration'].model, features['duration'])
+            outputs['duration'][valid_idx] = durations
+        except Exception:
+            pass
+
+    return outputs
+
+def result_dicts(customer_ids, outputs, errors):
+    """Per-customer result objects of the JSON batch response"""
+    keys = [key for key in ('price', 'profitable', 'duration') if key in outputs]
+    columns = {key: values.tolist() for key, values in outputs.items()}
+    results = []
+    for i, customer_id in enumerate(customer_ids):
+        result = {'customerId': customer_id, 'predictions': {}}
+        predictions = result['predictions']
+        if i in errors:
+            result['error'] = f'Invalid features: {errors[i]}'
+            for key in keys:
+                predictions[key] = None
+        else:
+            for key, values in columns.items():
+                value = values[i]
+                if value != value:  # NaN: no prediction
+                    if key != 'probability':
+                        predictions[key] = None
+                else:
+                    predictions[key] = bool(value) if key == 'profitable' else value
+        results.append(result)
+    return results
+
+def batch_results(loaded, customers_data):
+    """Per-customer results for a list of payloads, as in /api/predict/batch"""
+    with stage('assemble'):
+        matrices, valid, errors = assemble_batch(loaded, customers_data)
+    outputs = batch_outputs(loaded, matrices, valid)
+    return result_dicts([customer_id(customer) for customer in customers_data], outputs, errors)
+
 @app.route('/api/predict/batch', methods=['POST'])
 def predict_batch():
-    """Batch prediction for multiple customers"""
+    """Batch prediction for multiple customers
+
+    Accepts and returns JSON, or Apache Arrow IPC streams (see
+    arrow_batch.py) depending on the Content-Type and Accept headers.
+    """
     try:
-        data = request.json
-        customers_data = data.get('customers', [])
-        
-        results = []
-        for customer in customers_data:
-            result = {
-                'customerId': customer.get('customerId'),
-                'predictions': {}
-            }
-            
-            # Price prediction
-            if price_model:
-                try:
-                    features = pd.DataFrame([{
-                        'grain_type_encoded': encode_grain_type(customer.get('grain_type', 'wheat')),
-                        'total_bags': float(customer.get('total_bags', 0)),
-                        'total_weight_kg': float(customer.get('total_weight_kg', 0)),
-                        'storage_duration_days': float(customer.get('storage_duration_days', 0)),
-                        'monthly_rent_per_bag': float(customer.get('monthly_rent_per_bag', 50)),
-                        'total_rent_paid': float(customer.get('total_rent_paid', 0)),
-                        'activity_status_encoded': encode_activity_status(customer.get('activity_status', 'active')),
-                        'sold_status_encoded': encode_sold_status(customer.get('sold_status', 'not_sold'))
-                    }])
-                    result['predictions']['price'] = float(price_model.predict(features)[0])
-                except:
-                    result['predictions']['price'] = None
-            
-            # Profit prediction
-            if profit_model:
-                try:
-                    features = pd.DataFrame([{
-                        'grain_type_encoded': encode_grain_type(customer.get('grain_type', 'wheat')),
-                        'total_bags': float(customer.get('total_bags', 0)),
-                        'total_weight_kg': float(customer.get('total_weight_kg', 0)),
-                        'storage_duration_days': float(customer.get('storage_duration_days', 0)),
-                        'monthly_rent_per_bag': float(customer.get('monthly_rent_per_bag', 50)),
-                        'total_rent_paid': float(customer.get('total_rent_paid', 0)),
-                        'activity_status_encoded': encode_activity_status(customer.get('activity_status', 'active'))
-                    }])
-                    result['predictions']['profitable'] = bool(profit_model.predict(features)[0])
-                except:
-                    result['predictions']['profitable'] = None
-            
-            results.append(result)
-        
-        return jsonify({'results': results})
-    
+        arrow_in = request.mimetype == ARROW_MIMETYPE
+        arrow_out = request.accept_mimetypes.best_match(['application/json', ARROW_MIMETYPE]) == ARROW_MIMETYPE
+        if (arrow_in or arrow_out) and arrow_batch.pa is None:
+            return jsonify({'error': 'Arrow batches need pyarrow on the server'}), 415 if arrow_in else 406
+
+        # One snapshot for the whole batch, so a reload cannot split it
+        loaded = dict(models)
+        if arrow_in:
+            try:
+                with stage('parse'):
+                    table = arrow_batch.read_table(request.get_data(cache=False))
+                    columns = arrow_batch.feature_columns(table)
+            except (arrow_batch.pa.ArrowException, ValueError) as e:
+                return jsonify({'error': f'Invalid Arrow batch: {e}'}), 400
+            n_rows = table.num_rows
+            customer_ids = arrow_batch.customer_ids(table)
+            with stage('assemble'):
+                matrices, valid, errors = assemble_columns(loaded, columns, n_rows)
+        else:
+            with stage('parse'):
+                data = request.get_json(silent=True)
+            customers_data = data.get('customers', []) if isinstance(data, dict) else None
+            if not isinstance(customers_data, list):
+                return jsonify({'error': 'Expected a JSON object with a "customers" list'}), 400
+            n_rows = len(customers_data)
+            customer_ids = [customer_id(customer) for customer in customers_data]
+            with stage('assemble'):
+                matrices, valid, errors = assemble_batch(loaded, customers_data)
+        metrics.observe('ml_batch_size', n_rows)
+
+        outputs = batch_outputs(loaded, matrices, valid)
+        if arrow_out:
+            with stage('serialize'):
+                body = arrow_batch.write_results(customer_ids, outputs, errors, n_rows)
+            return Response(body, mimetype=ARROW_MIMETYPE,
+                            headers={'X-Model-Versions': json.dumps(model_versions(loaded))})
+
+        if arrow_in:
+            customer_ids = customer_ids.to_pylist() if customer_ids is not None else [None] * n_rows
+        results = result_dicts(customer_ids, outputs, errors)
+        return serialized({'results': results, 'model_versions': model_versions(loaded)})
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Streaming batch predictions: one JSON payload per request line in, one
+# result per line out, in the same order, computed STREAM_CHUNK_ROWS rows at
+# a time so results flow back while the rest of the request is still being
+# sent. Lines that are not JSON objects get an error result of their own.
+STREAM_CHUNK_ROWS = int(os.environ.get('ML_STREAM_CHUNK_ROWS', '256'))
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def ndjson_results(loaded, lines):
+    """NDJSON result lines (bytes) for a chunk of NDJSON request lines"""
+    payloads, results = [], []
+    for line in lines:
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as e:
+            results.append({'customerId': None, 'predictions': {}, 'error': f'Invalid JSON: {e}'})
+            continue
+        payloads.append(payload)
+        results.append(None)
+    computed = iter(batch_results(loaded, payloads)) if payloads else iter(())
+    results = [result if result is not None else next(computed) for result in results]
+    return ''.join(json.dumps(result, separators=(',', ':')) + '\n' for result in results).encode()
+
+def ndjson_chunks(loaded, stream):
+    """Group the non-blank lines of a byte stream into chunks of STREAM_CHUNK_ROWS"""
+    lines = []
+    for line in stream:
+        if line.strip():
+            lines.append(line)
+        if len(lines) >= STREAM_CHUNK_ROWS:
+            yield ndjson_results(loaded, lines)
+            lines = []
+    if lines:
+        yield ndjson_results(loaded, lines)
+
+@app.route('/api/predict/stream', methods=['POST'])
+def predict_stream():
+    """Batch prediction over newline-delimited JSON, streamed back per chunk
+
+    Request metrics cover the time to the start of the response.
+    """
+    loaded = dict(models)
+    return Response(stream_with_context(ndjson_chunks(loaded, request.stream)), mimetype=NDJSON_MIMETYPE,
+                    headers={'X-Model-Versions': json.dumps(model_versions(loaded))})
+
+# Admin endpoints need the X-Admin-Token header and are disabled when
+# ML_ADMIN_TOKEN is unset: behind the gateway or a proxy every caller looks
+# local, so the remote address proves nothing
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN')
+
+def admin_denied():
+    """Error response for a refused admin call, or None when it may proceed"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled; set ML_ADMIN_TOKEN to enable them'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload changed models without restarting
+
+    An optional {"model": ..., "version": ...} body first points the
+    registry at that version (e.g. to roll back). Requests keep being served
+    by the old models until the new ones are loaded. Under serve_ml.py this
+    reloads the worker that received the call; the others pick the change
+    up from the registry within ML_RELOAD_INTERVAL_SECONDS.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('model'):
+            if data['model'] not in MODEL_FILES or not data.get('version'):
+                return jsonify({'error': 'Expected a model name and a version'}), 400
+            model_registry.activate(data['model'], data['version'], MODEL_REGISTRY)
+        status = load_models(force=bool(data.get('force')))
+        return jsonify({'models': status, 'model_versions': model_versions()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/profile', methods=['POST'])
+def admin_profile():
+    """Sample request stacks on every worker and return them merged
+
+    Body: {"seconds": 10, "interval_ms": 10}. The response is a collapsed
+    stack file (one `endpoint;frame;...;frame count` line per stack) for
+    flamegraph.pl or speedscope; the X-Profile-Workers and
+    X-Profile-Samples headers say how much it covers.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval = float(data.get('interval_ms', 10)) / 1000
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({'error': f'Expected 0 < seconds <= {MAX_PROFILE_SECONDS} and 1 <= interval_ms <= 1000'}), 400
+    try:
+        collapsed, workers, samples = profiler.profile(seconds, interval)
+    except ProfileInProgress as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(collapsed, mimetype='text/plain',
+                    headers={'X-Profile-Workers': str(workers), 'X-Profile-Samples': str(samples)})
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("  WMS ML Prediction Service Starting...")
     print("="*60)
     print(f"\n  Models Directory: {MODEL_DIR}")
-    print(f"  Price Model: {'✓ Loaded' if price_model else '✗ Not loaded'}")
-    print(f"  Profit Model: {'✓ Loaded' if profit_model else '✗ Not loaded'}")
-    print(f"  Duration Model: {'✓ Loaded' if duration_model else '✗ Not loaded'}")
+    print(f"  Model Registry: {MODEL_REGISTRY}")
+    print(f"  Price Model: {'✓ Loaded' if models['price'] else '✗ Not loaded'}")
+    print(f"  Profit Model: {'✓ Loaded' if models['profit'] else '✗ Not loaded'}")
+    print(f"  Duration Model: {'✓ Loaded' if models['duration'] else '✗ Not loaded'}")
+    compiled = all(isinstance(getattr(m.model, 'exact', m.model), CompiledModel) for m in models.values() if m is not None)
+    print(f"  Inference Engine: {'compiled NumPy' if compiled else 'scikit-learn'}")
+    if QUANTIZED:
+        tables = [name for name, m in models.items() if m is not None and isinstance(m.model, QuantizedModel)]
+        print(f"  Prediction Tables: {', '.join(tables) or 'none in use'}")
+    if RELOAD_INTERVAL_SECONDS > 0:
+        print(f"  Hot Reload: checking every {RELOAD_INTERVAL_SECONDS:g}s")
+    if coalescers:
+        print(f"  Request Coalescing: on (max wait {COALESCE_MAX_WAIT_MS} ms, max batch {COALESCE_MAX_BATCH})")
     print("\n" + "="*60)
     print("  Server running on http://localhost:8050")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=8050, debug=True)
+    # Development server only; use serve_ml.py in production
+    app.run(host='0.0.0.0', port=8050, debug=os.environ.get('ML_DEBUG', '0') == '1')
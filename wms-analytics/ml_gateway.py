@@ -0,0 +1,185 @@
+"""
+WMS Analytics - Async Prediction Gateway
+========================================
+ASGI front end for ml_api_service.py, for clients that keep a connection
+open and send many predictions over it, such as the Node backend's
+keep-alive agent or bulk jobs streaming NDJSON.
+
+POST /api/predict/stream is served natively: request lines are read as they
+arrive and scored STREAM_CHUNK_ROWS at a time on a thread pool, and each
+chunk's results are written back while the next chunk is being received.
+Every other route goes to the Flask app unchanged, also on the thread pool,
+so the event loop is always free to accept connections and read requests
+while the models run. Keep-alive and pipelined requests are handled by the
+ASGI server.
+
+Run with (needs uvicorn):
+    python serve_ml.py --gateway --workers 4
+    uvicorn ml_gateway:app --port 8050 --timeout-keep-alive 75
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ml_api_service import (NDJSON_MIMETYPE, STREAM_CHUNK_ROWS, app as flask_app, metrics, model_versions,
+                            models, ndjson_results, profiler)
+
+STREAM_PATH = '/api/predict/stream'
+STREAM_ENDPOINT = 'predict_stream'
+
+# Model inference and Flask requests run here; threads start on first use,
+# so creating the pool before gunicorn forks its workers is safe
+executor = ThreadPoolExecutor(int(os.environ.get('ML_THREADS', '4')), thread_name_prefix='gateway')
+
+
+# =============================================================================
+# Streaming predictions
+# =============================================================================
+
+def score_chunk(loaded, lines):
+    profiler.enter(STREAM_ENDPOINT)
+    try:
+        return ndjson_results(loaded, lines)
+    finally:
+        profiler.leave()
+
+
+async def stream_predictions(scope, receive, send):
+    """NDJSON in, NDJSON out; one chunk is scored while the next is read"""
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # One snapshot for the whole stream, so a reload cannot split it
+    loaded = dict(models)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', NDJSON_MIMETYPE.encode()),
+        (b'x-model-versions', json.dumps(model_versions(loaded)).encode()),
+    ]})
+
+    pending = None
+    buffer, lines = b'', []
+    more_body = True
+    status = '200'
+    try:
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                # Nothing more will be read; the response is still closed below
+                status, pending = '499', None
+                break
+            buffer += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            *complete, buffer = buffer.split(b'\n')
+            if not more_body:
+                complete.append(buffer)
+            lines.extend(line for line in complete if line.strip())
+            while len(lines) >= STREAM_CHUNK_ROWS or (lines and not more_body):
+                chunk, lines = lines[:STREAM_CHUNK_ROWS], lines[STREAM_CHUNK_ROWS:]
+                if pending is not None:
+                    await send({'type': 'http.response.body', 'body': await pending, 'more_body': True})
+                pending = loop.run_in_executor(executor, score_chunk, loaded, chunk)
+        if pending is not None:
+            await send({'type': 'http.response.body', 'body': await pending, 'more_body': True})
+    except Exception as e:
+        # The status line is already out; report the failure in the stream
+        await send({'type': 'http.response.body', 'more_body': True,
+                    'body': json.dumps({'error': str(e)}).encode() + b'\n'})
+        status = '500'
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    metrics.inc('ml_requests_total', endpoint=STREAM_ENDPOINT, status=status)
+    if status == '500':
+        metrics.inc('ml_request_errors_total', endpoint=STREAM_ENDPOINT)
+    metrics.observe('ml_request_duration_seconds', time.perf_counter() - start, endpoint=STREAM_ENDPOINT)
+
+
+# =============================================================================
+# Everything else: the Flask app
+# =============================================================================
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI request whose body has been read in full
+
+    The length comes from the body, not the headers: a chunked request has
+    no Content-Length, and Werkzeug reads no body without one.
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin1').upper().replace('-', '_'), value.decode('latin1')
+        if name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            continue  # the body is already de-chunked
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def call_flask(environ):
+    """Run one request through the Flask app; returns (status, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'], response['headers'] = status, headers
+
+    iterable = flask_app(environ, start_response)
+    try:
+        body = b''.join(iterable)
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    return response['status'], response['headers'], body
+
+
+async def forward_to_flask(scope, receive, send):
+    body = bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    loop = asyncio.get_running_loop()
+    status, headers, content = await loop.run_in_executor(executor, call_flask, wsgi_environ(scope, bytes(body)))
+    await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': content, 'more_body': False})
+
+
+async def app(scope, receive, send):
+    """The ASGI application"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            await send({'type': message['type'] + '.complete'})
+            if message['type'] == 'lifespan.shutdown':
+                return
+    if scope['type'] != 'http':
+        return
+    if scope['path'] == STREAM_PATH and scope['method'] == 'POST':
+        await stream_predictions(scope, receive, send)
+    else:
+        await forward_to_flask(scope, receive, send)
@@ -0,0 +1,186 @@
+"""
+WMS Analytics - Model Registry
+==============================
+Versioned storage for the models served by ml_api_service.py.
+
+Layout:
+    model_registry/
+        profit/
+            CURRENT                      <- version currently served
+            20261017T101500-3f2a9c1d/
+                model.pkl
+                encoders.pkl
+                feature_transform.json   <- category codes for request payloads
+                model.compiled/          <- written when the model compiles
+            20261018T091200-8be01f4a/
+                ...
+
+Every version directory is written under a temporary name and renamed into
+place, and CURRENT is replaced with os.replace(), so a reader never sees a
+half-published version or a half-written pointer. The service polls the
+pointers and swaps in a new version without restarting.
+
+Publish a retrained model and make it current:
+    python model_registry.py publish profit model2_profit_classification_BEST.pkl --encoders model2_label_encoders.pkl
+
+Roll back, or list what is available:
+    python model_registry.py activate profit 20261017T101500-3f2a9c1d
+    python model_registry.py list
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import time
+
+from feature_transform import TRANSFORM_FILE
+
+POINTER_FILE = 'CURRENT'
+MODEL_FILE = 'model.pkl'
+ENCODER_FILE = 'encoders.pkl'
+
+DEFAULT_REGISTRY = os.environ.get(
+    'ML_MODEL_REGISTRY',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_registry')
+)
+
+
+def file_version(path):
+    """Short content hash identifying a model artifact file or directory"""
+    digest = hashlib.sha1()
+    paths = [path]
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    for file_path in paths:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def current_version(name, registry=DEFAULT_REGISTRY):
+    """Version the pointer for `name` refers to, or None"""
+    try:
+        with open(os.path.join(registry, name, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(name, version, registry=DEFAULT_REGISTRY):
+    return os.path.join(registry, name, version)
+
+
+def list_versions(name, registry=DEFAULT_REGISTRY):
+    """Published versions of `name`, oldest first"""
+    model_dir = os.path.join(registry, name)
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        entry for entry in os.listdir(model_dir)
+        if not entry.endswith('.tmp') and os.path.isdir(os.path.join(model_dir, entry))
+    )
+
+
+def activate(name, version, registry=DEFAULT_REGISTRY):
+    """Atomically point `name` at an already published version
+
+    Only names listed by list_versions() are accepted, so a version can never
+    point outside the model's registry directory.
+    """
+    if version not in list_versions(name, registry):
+        raise ValueError(f'{name}: version {version!r} is not published')
+    pointer = os.path.join(registry, name, POINTER_FILE)
+    tmp_pointer = f'{pointer}.{os.getpid()}.tmp'
+    with open(tmp_pointer, 'w') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+
+
+def publish(name, model_path, encoder_path=None, registry=DEFAULT_REGISTRY, version=None, make_current=True,
+            transform_path=None):
+    """Copy a trained model into a new registry version and return the version
+
+    The feature transform defaults to the feature_transform.json training
+    wrote beside the model, when there is one. The model is also compiled
+    for the NumPy engine when possible, so the service can memory-map it.
+    """
+    if version is None:
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{file_version(model_path)[:8]}"
+    final_dir = version_dir(name, version, registry)
+    if os.path.exists(final_dir):
+        raise ValueError(f'{name}: version {version} already exists')
+
+    tmp_dir = final_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shutil.copy2(model_path, os.path.join(tmp_dir, MODEL_FILE))
+    if encoder_path:
+        shutil.copy2(encoder_path, os.path.join(tmp_dir, ENCODER_FILE))
+    if transform_path is None:
+        transform_path = os.path.join(os.path.dirname(os.path.abspath(model_path)), TRANSFORM_FILE)
+        transform_path = transform_path if os.path.exists(transform_path) else None
+    if transform_path:
+        shutil.copy2(transform_path, os.path.join(tmp_dir, TRANSFORM_FILE))
+
+    try:
+        import pickle
+
+        from tree_engine import COMPILED_SUFFIX, save_compiled
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        encoders = None
+        if encoder_path:
+            with open(encoder_path, 'rb') as f:
+                encoders = pickle.load(f)
+        save_compiled(model, os.path.join(tmp_dir, 'model' + COMPILED_SUFFIX), encoders,
+                      source_path=os.path.join(tmp_dir, MODEL_FILE))
+    except (ImportError, ValueError) as e:
+        print(f"  {name}: not compiled ({e}); the pickle will be served")
+
+    os.rename(tmp_dir, final_dir)
+    if make_current:
+        activate(name, version, registry)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage versioned WMS models')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish_cmd = commands.add_parser('publish', help='add a trained model as a new version')
+    publish_cmd.add_argument('name', choices=['price', 'profit', 'duration'])
+    publish_cmd.add_argument('model')
+    publish_cmd.add_argument('--encoders')
+    publish_cmd.add_argument('--transform', help=f'default: the {TRANSFORM_FILE} beside the model, if any')
+    publish_cmd.add_argument('--version')
+    publish_cmd.add_argument('--no-activate', action='store_true', help='publish without making it current')
+
+    activate_cmd = commands.add_parser('activate', help='make a published version current')
+    activate_cmd.add_argument('name', choices=['price', 'profit', 'duration'])
+    activate_cmd.add_argument('version')
+
+    commands.add_parser('list', help='show published versions')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        version = publish(args.name, args.model, args.encoders, args.registry,
+                          args.version, make_current=not args.no_activate, transform_path=args.transform)
+        print(f"✓ Published {args.name} {version}{'' if args.no_activate else ' (current)'}")
+    elif args.command == 'activate':
+        activate(args.name, args.version, args.registry)
+        print(f"✓ {args.name} -> {args.version}")
+    else:
+        for name in ('price', 'profit', 'duration'):
+            current = current_version(name, args.registry)
+            print(f"{name}:")
+            for version in list_versions(name, args.registry):
+                print(f"  {'*' if version == current else ' '} {version}")
+
+
+if __name__ == '__main__':
+    main()
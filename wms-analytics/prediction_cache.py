@@ -0,0 +1,121 @@
+"""
+WMS Analytics - Prediction Cache
+================================
+In-process memoization of model outputs for ml_api_service.py.
+
+Entries are keyed on a hash of the model name, the model version and the
+canonicalized, encoded feature vector, so a reloaded model never serves
+results computed by its predecessor. The cache is bounded both by an
+approximate memory budget (least recently used entries are evicted first)
+and by a time-to-live.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-entry bookkeeping cost: OrderedDict node, entry tuple and key bytes
+ENTRY_OVERHEAD_BYTES = 200
+
+MISSING = object()
+
+
+def estimate_size(value):
+    """Approximate memory held by a cached value"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a byte budget and per-entry TTL"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl_seconds=300.0):
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl_seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(model_name, model_version, features):
+        """Hash a model identity and its encoded feature vector"""
+        # Adding 0.0 folds -0.0 into 0.0 so equal inputs hash equally
+        canonical = np.ascontiguousarray(features, dtype=np.float64) + 0.0
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{model_name}\x00{model_version}\x00'.encode())
+        digest.update(canonical.tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        """Return the cached value, or MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at, size = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries to fit"""
+        size = ENTRY_OVERHEAD_BYTES + len(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after models are reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        """Counters and occupancy for /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,411 @@
+"""
+WMS Analytics - Quantized Prediction Table
+==========================================
+Model outputs precomputed over a grid of the request feature space, so that
+ml_api_service.py can answer with an array lookup instead of running the
+model.
+
+Most request features take few values. Grain type, activity status and sold
+status are categories, and monthly_rent_per_bag comes from the rent price
+list, so each of their values gets a slot of its own. Bags, weight, storage
+duration and rent paid are cut into quantile bins of the training data, and
+every bin is predicted at the median of the training rows that fall in it.
+The predicted class of every grid cell (and both class probabilities, for
+the binary profit model) is stored in one dense array. A request row is
+located with one searchsorted per feature and a dot product with the
+strides.
+
+Rows outside the grid, with a value beyond the binned range or a rent that
+is not on the price list, fall back to the exact model. Within the grid,
+binning makes the table an approximation: the build compares it with the
+exact model on the training rows and on random points of the grid, and
+stores the result (label agreement and largest probability error) with the
+table. The service prints it on load, shows it in /health, and leaves a
+table unused while its label agreement is below ML_QUANTIZED_MIN_AGREEMENT.
+Deep trees split on dozens of thresholds per numeric feature, so expect to
+trade table size against agreement with --max-cells.
+
+Build tables for the models the service currently loads with:
+    python prediction_table.py
+    python prediction_table.py --models profit --max-cells 4000000
+
+This writes a `<model>.table/` directory next to every model artifact
+(inside the version directory for registry models), memory-mapped by the
+service like the compiled models. The service only uses tables with
+ML_QUANTIZED=1, and only one built from the model version it serves.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from feature_assembly import FEATURE_FIELDS, MODEL_FEATURES
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+TABLE_SUFFIX = '.table'
+
+# Cells per model table; a binary table costs 17 bytes per cell
+DEFAULT_MAX_CELLS = 2_000_000
+
+# Numeric features whose values come from a list rather than a range:
+# only listed values are in the grid
+LIST_FEATURES = {'monthly_rent_per_bag'}
+
+EVAL_CHUNK_ROWS = 65_536
+RANDOM_POINTS = 100_000
+
+
+def table_path(directory, model_file):
+    """Where the table of a model artifact lives"""
+    return os.path.join(directory, model_file[:-len('.pkl')] + TABLE_SUFFIX)
+
+
+# =============================================================================
+# Serving
+# =============================================================================
+
+class PredictionTable:
+    """A dense grid of predicted labels (and probabilities) for one model
+
+    Axis j of the grid covers feature j with slots [lower, upper]; a value
+    is in slot i when lower[i] <= value <= upper[i], the largest such i
+    winning on a shared bin edge. Categories and listed values are slots
+    with lower == upper.
+    """
+
+    def __init__(self, arrays, manifest):
+        self.columns = manifest['columns']
+        self.model_version = manifest['model_version']
+        self.categories = manifest['categories']
+        self.report = manifest['report']
+        self.lower = [arrays[f'lower_{j}'] for j in range(len(self.columns))]
+        self.upper = [arrays[f'upper_{j}'] for j in range(len(self.columns))]
+        self.labels = arrays['labels']
+        self.proba = arrays.get('proba')
+        self.shape = tuple(len(lower) for lower in self.lower)
+        self.strides = np.asarray([int(np.prod(self.shape[j + 1:])) for j in range(len(self.shape))],
+                                  dtype=np.intp)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported table format {manifest.get('format_version')}")
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None,
+                                allow_pickle=False)
+                  for name in manifest['arrays']}
+        return cls(arrays, manifest)
+
+    def check(self, model_version, columns, transform):
+        """Raise unless the table was built for this model version and encoding"""
+        if self.model_version != model_version:
+            raise ValueError(f'built for model version {self.model_version}, not {model_version}')
+        if self.columns != list(columns):
+            raise ValueError(f'built for features {self.columns}, not {list(columns)}')
+        for name, values in self.categories.items():
+            if transform.categories.get(name) != values:
+                raise ValueError(f'built for {name} categories {values}, not {transform.categories.get(name)}')
+
+    def locate(self, X):
+        """(cell index per row, mask of rows inside the grid)"""
+        n_rows = X.shape[0]
+        cells = np.zeros(n_rows, dtype=np.intp)
+        inside = np.ones(n_rows, dtype=bool)
+        for j, (lower, upper) in enumerate(zip(self.lower, self.upper)):
+            values = X[:, j]
+            slots = np.searchsorted(lower, values, side='right') - 1
+            inside &= slots >= 0
+            np.maximum(slots, 0, out=slots)
+            inside &= values <= upper[slots]
+            cells += slots * self.strides[j]
+        return cells, inside
+
+    def label_agreement(self):
+        """The lower label agreement of the two comparison sets"""
+        return min(sample.get('label_agreement', 0.0) for sample in self.report.values())
+
+    def summary(self):
+        """One line for the service log"""
+        line = f"{int(np.prod(self.shape)):,} cells, label agreement {self.label_agreement():.2%}"
+        errors = [sample['max_probability_error'] for sample in self.report.values()
+                  if 'max_probability_error' in sample]
+        if errors:
+            line += f", max probability error {max(errors):.3f}"
+        return line
+
+
+class QuantizedModel:
+    """A model that answers from its prediction table where it can
+
+    Rows inside the grid are looked up; the rest of a batch goes to the
+    exact model in one call. Behaves like the model for the service.
+    """
+
+    def __init__(self, model, table):
+        self.exact = model
+        self.table = table
+        self.classes_ = np.asarray(model.classes_)
+        self.n_features_in_ = len(table.columns)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _locate(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        cells, inside = self.table.locate(X)
+        hits = int(inside.sum())
+        with self._lock:
+            self.hits += hits
+            self.fallbacks += len(inside) - hits
+        return X, cells[inside], inside
+
+    def predict(self, X):
+        X, cells, inside = self._locate(X)
+        labels = np.empty(len(inside), dtype=self.classes_.dtype)
+        labels[inside] = self.classes_.take(self.table.labels[cells])
+        if not inside.all():
+            labels[~inside] = self.exact.predict(X[~inside])
+        return labels
+
+    def predict_proba(self, X):
+        if self.table.proba is None:
+            return self.exact.predict_proba(X)
+        X, cells, inside = self._locate(X)
+        proba = np.empty((len(inside), self.table.proba.shape[1]), dtype=np.float64)
+        proba[inside] = self.table.proba[cells]
+        if not inside.all():
+            proba[~inside] = self.exact.predict_proba(X[~inside])
+        return proba
+
+    def stats(self):
+        """Lookup counters and the build-time error report, for /health"""
+        with self._lock:
+            lookups = self.hits + self.fallbacks
+            stats = {
+                'cells': int(np.prod(self.table.shape)),
+                'hits': self.hits,
+                'fallbacks': self.fallbacks,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+        stats['error'] = self.table.report
+        return stats
+
+
+# =============================================================================
+# Building (offline)
+# =============================================================================
+
+def allocate_bins(fixed_cells, distinct, max_cells):
+    """Bins per binned feature, grown evenly while the grid fits in max_cells
+
+    `distinct` maps each binned feature to its number of distinct values,
+    which caps its bins.
+    """
+    bins = {column: 1 for column in distinct}
+    while True:
+        growable = [column for column in bins if bins[column] < distinct[column]]
+        if not growable:
+            return bins
+        column = min(growable, key=bins.get)
+        cells = fixed_cells * int(np.prod(list(bins.values()))) // bins[column] * (bins[column] + 1)
+        if cells > max_cells:
+            return bins
+        bins[column] += 1
+
+
+def quantile_axis(values, n_bins):
+    """(lower, upper, representative) of quantile bins over `values`"""
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)))
+    if len(edges) == 1:
+        return edges, edges, edges
+    lower, upper = edges[:-1], edges[1:]
+    slots = np.minimum(np.searchsorted(lower, values, side='right') - 1, len(lower) - 1)
+    points = np.array([np.median(values[slots == i]) if (slots == i).any() else (lower[i] + upper[i]) / 2
+                       for i in range(len(lower))])
+    return lower, upper, points
+
+
+def grid_axes(columns, transform, data, max_cells):
+    """(lower, upper, representative) per feature column, and the category lists used"""
+    axes, categories, binned = {}, {}, {}
+    for column in columns:
+        key, _, encoder = FEATURE_FIELDS[column]
+        if encoder:
+            categories[encoder] = transform.categories[encoder]
+            codes = np.arange(len(categories[encoder]), dtype=np.float64)
+            axes[column] = (codes, codes, codes)
+        elif key in LIST_FEATURES:
+            listed = np.unique(data[key])
+            axes[column] = (listed, listed, listed)
+        else:
+            binned[column] = data[key]
+    fixed_cells = int(np.prod([len(axis[0]) for axis in axes.values()]))
+    if fixed_cells > max_cells:
+        raise ValueError(f'{fixed_cells:,} cells for the categories and listed values alone; '
+                         f'raise --max-cells')
+    bins = allocate_bins(fixed_cells, {column: len(np.unique(values)) for column, values in binned.items()},
+                         max_cells)
+    for column, values in binned.items():
+        axes[column] = quantile_axis(values, bins[column])
+    return [axes[column] for column in columns], categories
+
+
+def predict_labels(model, X, binary):
+    """(class indexes, probabilities or None) of the exact model"""
+    classes = np.asarray(model.classes_)
+    labels = np.searchsorted(classes, model.predict(X))
+    return labels, model.predict_proba(X) if binary else None
+
+
+def agreement(table, model, X, binary):
+    """How table lookups compare with the exact model on the in-grid rows of X"""
+    cells, inside = table.locate(X)
+    X, cells = X[inside], cells[inside]
+    result = {'rows': int(len(inside)), 'in_grid': float(inside.mean()) if len(inside) else 0.0}
+    if not len(X):
+        return result
+    labels, proba = predict_labels(model, X, binary)
+    result['label_agreement'] = float((table.labels[cells] == labels).mean())
+    if binary:
+        result['max_probability_error'] = float(np.abs(table.proba[cells] - proba).max())
+    return result
+
+
+def random_grid_points(axes, n_points, rng):
+    """Points spread over the grid: a random slot per feature, then a random value in it"""
+    columns = []
+    for lower, upper, _ in axes:
+        slots = rng.integers(0, len(lower), n_points)
+        columns.append(rng.uniform(lower[slots], upper[slots]))
+    return np.column_stack(columns)
+
+
+def build_table(model, columns, transform, data, model_version, max_cells=DEFAULT_MAX_CELLS, seed=42):
+    """Evaluate `model` over the grid and measure the table against it
+
+    `data` maps payload keys to arrays of training values (categories
+    already encoded), which place the bins and serve as the first
+    comparison set.
+    """
+    axes, categories = grid_axes(columns, transform, data, max_cells)
+    shape = tuple(len(lower) for lower, _, _ in axes)
+    n_cells = int(np.prod(shape))
+    binary = len(model.classes_) == 2 and hasattr(model, 'predict_proba')
+
+    labels = np.empty(n_cells, dtype=np.uint8 if len(model.classes_) <= 256 else np.int32)
+    proba = np.empty((n_cells, 2), dtype=np.float64) if binary else None
+    for start in range(0, n_cells, EVAL_CHUNK_ROWS):
+        slots = np.unravel_index(np.arange(start, min(start + EVAL_CHUNK_ROWS, n_cells)), shape)
+        X = np.column_stack([points[index] for (_, _, points), index in zip(axes, slots)])
+        chunk_labels, chunk_proba = predict_labels(model, X, binary)
+        labels[start:start + len(X)] = chunk_labels
+        if binary:
+            proba[start:start + len(X)] = chunk_proba
+
+    arrays = {'labels': labels}
+    if binary:
+        arrays['proba'] = proba
+    for j, (lower, upper, _) in enumerate(axes):
+        arrays[f'lower_{j}'] = np.asarray(lower, dtype=np.float64)
+        arrays[f'upper_{j}'] = np.asarray(upper, dtype=np.float64)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'columns': list(columns),
+        'model_version': model_version,
+        'categories': categories,
+        'arrays': sorted(arrays),
+        'report': {},
+    }
+    table = PredictionTable(arrays, manifest)
+
+    training = np.column_stack([data[FEATURE_FIELDS[column][0]] for column in columns])
+    random_points = random_grid_points(axes, RANDOM_POINTS, np.random.default_rng(seed))
+    table.report.update({
+        'training_rows': agreement(table, model, training, binary),
+        'random_points': agreement(table, model, random_points, binary),
+    })
+    return table, arrays, manifest
+
+
+def save_table(arrays, manifest, path):
+    """Write a table directory next to its final location and swap it in"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def training_values(transform):
+    """{payload key: array} of the training data, categories encoded"""
+    from wms_data import load_dataset
+
+    keys = [key for key, _, _ in FEATURE_FIELDS.values()]
+    activities = load_dataset('customer_activities', columns=keys).dropna(subset=keys)
+    data = {}
+    for key, _, encoder in FEATURE_FIELDS.values():
+        if encoder:
+            data[key] = transform.encoders()[encoder].column(activities[key].astype(str))
+        else:
+            data[key] = activities[key].to_numpy(dtype=np.float64)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute prediction tables for the served models')
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_FEATURES), default=list(MODEL_FEATURES))
+    parser.add_argument('--max-cells', type=int, default=DEFAULT_MAX_CELLS,
+                        help='grid cells per model (default: %(default)s)')
+    args = parser.parse_args()
+
+    import ml_api_service as service
+
+    print("=" * 80)
+    print("PREDICTION TABLES")
+    print("=" * 80)
+    data_by_transform = {}
+    for name in args.models:
+        loaded = service.models[name]
+        if loaded is None:
+            print(f"✗ {name}: model not loaded")
+            continue
+        if loaded.transform not in data_by_transform:
+            data_by_transform[loaded.transform] = training_values(loaded.transform)
+        model = getattr(loaded.model, 'exact', loaded.model)
+        try:
+            table, arrays, manifest = build_table(model, MODEL_FEATURES[name], loaded.transform,
+                                                  data_by_transform[loaded.transform], loaded.version,
+                                                  args.max_cells)
+        except ValueError as e:
+            print(f"✗ {name}: {e}")
+            continue
+        directory, model_file, _, _ = service.locate_model(name)
+        path = table_path(directory, model_file)
+        save_table(arrays, manifest, path)
+
+        print(f"✓ {name} (version {loaded.version}) -> {path}")
+        print(f"  grid {' x '.join(str(n) for n in table.shape)} over {', '.join(table.columns)}")
+        for sample, report in table.report.items():
+            line = f"  {sample.replace('_', ' ')}: {report['rows']:,}, {report['in_grid']:.1%} in grid"
+            if 'label_agreement' in report:
+                line += f", label agreement {report['label_agreement']:.2%}"
+            if 'max_probability_error' in report:
+                line += f", max probability error {report['max_probability_error']:.3f}"
+            print(line)
+    print("=" * 80)
+    print("Serve them with ML_QUANTIZED=1")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+WMS Analytics - Report Fan-out
+==============================
+Renders the data_visualization.py report (both figures plus the summary
+statistics) for every customer and every grain type:
+
+    reports/
+        customers/723/grain_movement_analysis.png
+                      customer_sales_analysis.png
+                      summary.txt
+        grains/wheat/...
+
+The datasets are loaded once and split with one groupby per partition key;
+the partitions are then rendered by a pool of worker processes. Each report
+is written to a temporary directory and renamed into place when complete, so
+an interrupted run can simply be started again: finished reports are
+skipped and half-written ones are discarded.
+
+Run with:
+    python report_fanout.py --workers 4
+    python report_fanout.py --by grain --dpi 200 --output-dir reports/
+"""
+
+import argparse
+import contextlib
+import glob
+import multiprocessing
+import os
+import shutil
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import matplotlib.pyplot as plt
+
+import data_visualization as dv
+from wms_data import load_dataset
+
+PARTITIONS = {
+    # partition: (output subdirectory, column)
+    'customer': ('customers', 'customer_id'),
+    'grain': ('grains', 'grain_type'),
+}
+SUMMARY_FILE = 'summary.txt'
+TMP_SUFFIX = '.tmp'
+
+
+def report_dir(output_dir, partition, key):
+    subdir, _ = PARTITIONS[partition]
+    return os.path.join(output_dir, subdir, str(key).lower())
+
+
+def split(frame, column):
+    """{key: rows} for every value of column, from a single groupby"""
+    return {key: rows for key, rows in frame.groupby(column, observed=True, sort=True)}
+
+
+def render_report(partition, key, movement_rows, activity_rows, final_dir, dpi):
+    """Write one partition's figures and summary; returns seconds taken"""
+    start = time.perf_counter()
+    movements = dv._finish(dv.movement_partials(movement_rows))
+    activities = dv._finish(dv.activity_partials(activity_rows))
+    scope = f'Customer {key}' if partition == 'customer' else str(key)
+
+    tmp_dir = f'{final_dir}{TMP_SUFFIX}-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    # A partition without rows in one dataset only gets the other figure
+    if movements['records']:
+        plt.close(dv.plot_grain_movements(
+            movements, os.path.join(tmp_dir, 'grain_movement_analysis.png'), dpi, scope))
+    if activities['records']:
+        plt.close(dv.plot_customer_sales(
+            activities, os.path.join(tmp_dir, 'customer_sales_analysis.png'), dpi, scope))
+    with open(os.path.join(tmp_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        with contextlib.redirect_stdout(f):
+            print(f"{scope}: {movements['records']} grain movements, "
+                  f"{activities['records']} customer activities\n")
+            dv.print_summary(movements, activities)
+
+    os.rename(tmp_dir, final_dir)
+    return time.perf_counter() - start
+
+
+def _init_worker():
+    dv._init_worker()
+    # Thousands of small charts: the set_ticklabels notice would repeat for each
+    warnings.filterwarnings('ignore', message='set_ticklabels')
+
+
+def _discard_partial_reports(output_dir):
+    for subdir, _ in PARTITIONS.values():
+        for path in glob.glob(os.path.join(output_dir, subdir, f'*{TMP_SUFFIX}-*')):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def pending_reports(movements, activities, partitions, output_dir, force=False):
+    """Reports still to render, as (partition, key, movement rows, activity
+    rows, final dir) jobs, and the number of finished reports skipped"""
+    jobs, skipped = [], 0
+    for partition in partitions:
+        subdir, column = PARTITIONS[partition]
+        movement_parts = split(movements, column)
+        activity_parts = split(activities, column)
+        os.makedirs(os.path.join(output_dir, subdir), exist_ok=True)
+        for key in sorted(set(movement_parts) | set(activity_parts)):
+            final_dir = report_dir(output_dir, partition, key)
+            if os.path.isdir(final_dir):
+                if not force:
+                    skipped += 1
+                    continue
+                shutil.rmtree(final_dir)
+            jobs.append((partition, key,
+                         movement_parts.get(key, movements.iloc[:0]),
+                         activity_parts.get(key, activities.iloc[:0]),
+                         final_dir))
+    return jobs, skipped
+
+
+def _collect(finished, done, total, start):
+    for future in finished:
+        future.result()
+        done += 1
+        if done % 100 == 0 or done == total:
+            print(f"  {done:,}/{total:,} reports ({time.perf_counter() - start:.1f}s)")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render per-customer and per-grain WMS reports')
+    parser.add_argument('--by', nargs='+', choices=list(PARTITIONS), default=list(PARTITIONS),
+                        help='partitions to report on (default: all)')
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help='re-render reports that already exist')
+    args = parser.parse_args()
+
+    print("Loading datasets...")
+    movements = load_dataset('grain_movements', dv.MOVEMENT_COLUMNS + ['customer_id'])
+    activities = load_dataset('customer_activities', dv.ACTIVITY_COLUMNS + ['customer_id'])
+    print(f"Grain Movements: {len(movements)} records")
+    print(f"Customer Activities: {len(activities)} records")
+
+    _discard_partial_reports(args.output_dir)
+    jobs, skipped = pending_reports(movements, activities, args.by, args.output_dir, args.force)
+    if skipped:
+        print(f"Skipping {skipped:,} reports that already exist (use --force to re-render)")
+    if not jobs:
+        print("✓ Nothing to do")
+        return
+
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Rendering {len(jobs):,} reports into {args.output_dir} with {workers} worker(s)")
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker) as pool:
+        # Keep a bounded number of partitions queued for the workers rather
+        # than pickling every partition's rows up front
+        in_flight = set()
+        for job in jobs:
+            if len(in_flight) >= workers * 4:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                done = _collect(finished, done, len(jobs), start)
+            in_flight.add(pool.submit(render_report, *job, args.dpi))
+        done = _collect(wait(in_flight).done, done, len(jobs), start)
+
+    print(f"✓ {done:,} reports written in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
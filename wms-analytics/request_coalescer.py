@@ -0,0 +1,135 @@
+"""
+WMS Analytics - Request Coalescer
+=================================
+Micro-batching layer for the single-prediction endpoints of
+ml_api_service.py.
+
+Concurrent requests queue their feature rows for a few milliseconds and are
+run through the model as one batch; each caller then receives its own row of
+the result.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class MicroBatcher:
+    """Queue single rows and run them through `batch_fn` in small batches
+
+    `batch_fn` takes a list of rows and must return a list of results of the
+    same length and order.
+    """
+
+    def __init__(self, batch_fn, max_wait_ms=5.0, max_batch_size=64, name='batcher'):
+        self.batch_fn = batch_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    def submit(self, row, timeout=None):
+        """Queue one row and block until its result is ready"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future.result(timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so restart the worker in child processes
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name=f'{self.name}-coalescer', daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Pick up anything else that is already waiting without extending the deadline
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._record(len(batch), [started - item[2] for item in batch])
+
+            try:
+                results = self.batch_fn([item[0] for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f'{self.name}: batch function returned {len(results)} results for {len(batch)} rows')
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _record(self, size, waits):
+        bucket = len(BATCH_SIZE_BUCKETS)
+        for i, upper in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= upper:
+                bucket = i
+                break
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += size
+            self._batch_size_counts[bucket] += 1
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+
+    def stats(self):
+        """Batch-size histogram and queue-wait summary"""
+        with self._stats_lock:
+            histogram = {f'le_{upper}': count for upper, count in zip(BATCH_SIZE_BUCKETS, self._batch_size_counts)}
+            histogram['gt_' + str(BATCH_SIZE_BUCKETS[-1])] = self._batch_size_counts[-1]
+            return {
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_batch_size': self.max_batch_size,
+                'batches': self._batches,
+                'requests': self._requests,
+                'mean_batch_size': self._requests / self._batches if self._batches else 0.0,
+                'batch_size_histogram': histogram,
+                'queue_wait_ms': {
+                    'mean': self._queue_wait_total * 1000.0 / self._requests if self._requests else 0.0,
+                    'max': self._queue_wait_max * 1000.0
+                }
+            }
@@ -0,0 +1,195 @@
+"""
+WMS Analytics - Sampling Profiler
+=================================
+On-demand stack sampling for ml_api_service.py, to see where a running
+service spends its time without restarting it under a profiler.
+
+While a profile runs, each worker samples the stack of every thread that is
+serving a request, every few milliseconds. Each stack is rooted at
+the endpoint being served and written in the collapsed-stack format that
+flamegraph.pl, inferno and speedscope read:
+
+    predict_batch;flask/app.py:wsgi_app;...;sklearn/ensemble/_forest.py:predict_proba 42
+
+Frames are labelled with their file relative to site-packages (or to this
+directory), so pandas, scikit-learn, Flask and service code are told apart
+at a glance. Threads that are not serving a request are not sampled, and
+nothing runs at all between profiles apart from tagging each request
+thread with its endpoint.
+
+Under serve_ml.py the profile request is passed to every worker through
+ML_METRICS_DIR: each worker samples itself over the same window and the
+worker that received the call merges the results.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+CONTROL_FILE = 'profile-request.json'
+RESULT_PREFIX = 'profile-'
+POLL_INTERVAL_SECONDS = 0.5
+# Extra wait for the other workers to notice a request and write their samples
+MERGE_GRACE_SECONDS = POLL_INTERVAL_SECONDS + 1.5
+
+
+class ProfileInProgress(RuntimeError):
+    """Another profile is still running"""
+
+
+def _short_path(path, base_dir):
+    marker = 'site-packages' + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    if path.startswith(base_dir + os.sep):
+        return os.path.relpath(path, base_dir)
+    return os.path.basename(path)
+
+
+class SamplingProfiler:
+    """Samples request-serving threads of this process, and coordinates
+    profiles across worker processes sharing `directory`"""
+
+    def __init__(self, directory=None, base_dir=None):
+        self.directory = directory
+        self.base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+        self._endpoints = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._watcher_pid = None
+        self._last_request_id = None
+
+    # -------------------------------------------------------------------------
+    # Request tagging
+
+    def enter(self, endpoint):
+        """Mark the calling thread as serving `endpoint`"""
+        self._endpoints[threading.get_ident()] = endpoint or 'unmatched'
+        self._ensure_watcher()
+
+    def leave(self):
+        self._endpoints.pop(threading.get_ident(), None)
+
+    # -------------------------------------------------------------------------
+    # Sampling
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{_short_path(code.co_filename, self.base_dir)}:{code.co_name}".replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def sample(self, seconds, interval):
+        """Collapsed stacks of this process's request threads -> sample count"""
+        stacks = Counter()
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for thread_id, endpoint in list(self._endpoints.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_thread:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(endpoint)
+                stacks[';'.join(reversed(labels))] += 1
+            del frames
+            time.sleep(interval)
+        return stacks
+
+    # -------------------------------------------------------------------------
+    # Coordination between workers
+
+    def _result_path(self, request_id, pid):
+        return os.path.join(self.directory, f'{RESULT_PREFIX}{request_id}-{pid}.json')
+
+    def _write_result(self, request_id, stacks):
+        path = self._result_path(request_id, os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(stacks), f)
+        os.replace(tmp_path, path)
+
+    def _read_control(self):
+        try:
+            with open(os.path.join(self.directory, CONTROL_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _watch(self):
+        while True:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            control = self._read_control()
+            if (control is None or control['id'] == self._last_request_id
+                    or control['pid'] == os.getpid()):
+                continue
+            self._last_request_id = control['id']
+            remaining = control['deadline'] - time.time()
+            if remaining <= 0:
+                continue
+            try:
+                self._write_result(control['id'], self.sample(remaining, control['interval']))
+            except OSError as e:
+                print(f"✗ Writing profile samples failed: {e}")
+
+    def _ensure_watcher(self):
+        # Threads do not survive fork(), so start one in every worker process
+        if not self.directory or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                control = self._read_control()
+                self._last_request_id = control['id'] if control else None
+                threading.Thread(target=self._watch, name='profile-watcher', daemon=True).start()
+                self._watcher_pid = os.getpid()
+
+    def profile(self, seconds, interval=0.01):
+        """Sample every worker for `seconds`; returns (collapsed stacks, workers, samples)"""
+        with self._lock:
+            control = self._read_control() if self.directory else None
+            if self._running or (control and control['deadline'] + MERGE_GRACE_SECONDS > time.time()):
+                raise ProfileInProgress('A profile is already running')
+            self._running = True
+        try:
+            request_id = uuid.uuid4().hex[:12]
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, CONTROL_FILE)
+                with open(f'{path}.tmp', 'w') as f:
+                    json.dump({'id': request_id, 'pid': os.getpid(), 'deadline': time.time() + seconds,
+                               'interval': interval}, f)
+                os.replace(f'{path}.tmp', path)
+
+            stacks = self.sample(seconds, interval)
+            workers = 1
+            if self.directory:
+                time.sleep(MERGE_GRACE_SECONDS)
+                for entry in os.listdir(self.directory):
+                    if not (entry.startswith(f'{RESULT_PREFIX}{request_id}-') and entry.endswith('.json')):
+                        continue
+                    path = os.path.join(self.directory, entry)
+                    try:
+                        with open(path) as f:
+                            stacks.update(json.load(f))
+                        workers += 1
+                    except (OSError, ValueError) as e:
+                        print(f"✗ Reading profile samples failed: {e}")
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+        finally:
+            self._running = False
+
+        collapsed = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        return collapsed, workers, sum(stacks.values())
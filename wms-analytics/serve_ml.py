@@ -0,0 +1,171 @@
+"""
+WMS Analytics - Production ML Server
+====================================
+Serves ml_api_service.py with a pre-fork multi-process server instead of
+the Flask development server.
+
+The models are loaded once in the master process before the workers are
+forked, so every worker shares the same model memory copy-on-write. Each
+worker handles several requests at a time with a thread pool.
+
+Run with:
+    python serve_ml.py --workers 4 --threads 8 --bind 0.0.0.0:8050
+
+Workers, threads and bind address can also be set with ML_WORKERS,
+ML_THREADS and ML_BIND. On Windows, where fork() is unavailable, the
+service runs in a single multi-threaded waitress process instead.
+
+With --gateway (or ML_GATEWAY=1) the workers run the asyncio gateway in
+ml_gateway.py under uvicorn instead: connections are kept alive for longer,
+many of them are served per worker, and POST /api/predict/stream streams
+results back while the request is still arriving. --threads then sizes each
+worker's inference thread pool:
+    python serve_ml.py --gateway --workers 4 --threads 4
+"""
+
+import argparse
+import atexit
+import gc
+import os
+import shutil
+import sys
+import tempfile
+
+
+def default_workers():
+    return int(os.environ.get('ML_WORKERS', os.cpu_count() or 1))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the WMS ML prediction API')
+    parser.add_argument('--bind', default=os.environ.get('ML_BIND', '0.0.0.0:8050'),
+                        help='host:port to listen on (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('ML_THREADS', '4')),
+                        help='concurrent requests per worker (default: %(default)s)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('ML_TIMEOUT', '30')),
+                        help='worker timeout in seconds (default: %(default)s)')
+    parser.add_argument('--gateway', action='store_true',
+                        default=os.environ.get('ML_GATEWAY', '0').lower() in ('1', 'true', 'yes'),
+                        help='serve the asyncio gateway (ml_gateway.py) with uvicorn workers')
+    return parser.parse_args(argv)
+
+
+# Idle keep-alive connections are held open this long, so a client's pooled
+# connections are not closed between bursts of requests
+GATEWAY_KEEPALIVE_SECONDS = 75
+
+
+def uvicorn_worker_class():
+    try:
+        import uvicorn_worker  # noqa: F401
+        return 'uvicorn_worker.UvicornWorker'
+    except ImportError:
+        import uvicorn.workers  # noqa: F401
+        return 'uvicorn.workers.UvicornWorker'
+
+
+def load_application(gateway):
+    if gateway:
+        # The gateway sizes its inference thread pool from ML_THREADS
+        import ml_gateway
+        return ml_gateway.app
+    import ml_api_service
+    return ml_api_service.app
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    # Workers share their request metrics and profiles through files here,
+    # so GET /metrics and POST /admin/profile on any worker cover them all
+    if not os.environ.get('ML_METRICS_DIR'):
+        metrics_dir = tempfile.mkdtemp(prefix='wms-ml-metrics-')
+        os.environ['ML_METRICS_DIR'] = metrics_dir
+        master_pid = os.getpid()
+        # Forked workers inherit atexit handlers; only the master cleans up
+        atexit.register(lambda: os.getpid() == master_pid and shutil.rmtree(metrics_dir, True))
+
+    class MLApplication(BaseApplication):
+        """Gunicorn application that imports the service in the master"""
+
+        def __init__(self, options):
+            self.options = options
+            # Importing here loads the models before any worker is forked
+            self.application = load_application(args.gateway)
+            # Keep the loaded objects out of the cyclic GC so collections in
+            # the workers do not touch (and un-share) their pages
+            gc.freeze()
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'keepalive': 5,
+        'preload_app': True,
+        'accesslog': None,
+    }
+    if args.gateway:
+        options.update(worker_class=uvicorn_worker_class(), keepalive=GATEWAY_KEEPALIVE_SECONDS)
+        print(f"  Serving the async gateway with gunicorn: {args.workers} uvicorn workers "
+              f"x {args.threads} inference threads on {args.bind}")
+    else:
+        print(f"  Serving with gunicorn: {args.workers} workers x {args.threads} threads on {args.bind}")
+    MLApplication(options).run()
+
+
+def run_waitress(args):
+    from waitress import serve
+
+    import ml_api_service
+
+    host, _, port = args.bind.rpartition(':')
+    threads = args.workers * args.threads
+    print(f"  Serving with waitress: 1 process x {threads} threads on {args.bind}")
+    serve(ml_api_service.app, host=host or '0.0.0.0', port=int(port), threads=threads)
+
+
+def run_uvicorn(args):
+    import uvicorn
+
+    host, _, port = args.bind.rpartition(':')
+    print(f"  Serving the async gateway with uvicorn: 1 process x {args.threads} inference threads on {args.bind}")
+    uvicorn.run(load_application(True), host=host or '0.0.0.0', port=int(port),
+                timeout_keep_alive=GATEWAY_KEEPALIVE_SECONDS, log_level='warning')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.gateway:
+        os.environ['ML_THREADS'] = str(args.threads)
+
+    print("\n" + "="*60)
+    print("  WMS ML Prediction Service (production)")
+    print("="*60)
+
+    try:
+        if hasattr(os, 'fork'):
+            run_gunicorn(args)
+        elif args.gateway:
+            run_uvicorn(args)
+        else:
+            run_waitress(args)
+    except ImportError as e:
+        print(f"✗ {e}. Install the serving dependencies with: pip install -r requirements.txt")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+WMS Analytics - Service Metrics
+===============================
+Request counters and latency histograms for ml_api_service.py, rendered in
+the Prometheus text exposition format for GET /metrics.
+
+Every worker process counts its own requests. When ML_METRICS_DIR is set
+(serve_ml.py sets it for its gunicorn workers), each worker also writes a
+snapshot of its counts there about once a second, and /metrics on any worker
+reports the sum over all workers, so a scrape sees the whole service no
+matter which worker answers it. Snapshots of workers that have exited are
+kept, so counters never go backwards.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds. The backend
+# gives up on the service after 5 s.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BATCH_SIZE_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'ml_requests_total': ('counter', 'Requests handled, by endpoint and HTTP status', None),
+    'ml_request_errors_total': ('counter', 'Requests answered with a 4xx or 5xx status, by endpoint', None),
+    'ml_request_duration_seconds': ('histogram', 'Request latency, by endpoint', LATENCY_BUCKETS),
+    'ml_stage_duration_seconds': (
+        'histogram', 'Time per request in each stage (parse, assemble, infer, serialize), by endpoint',
+        LATENCY_BUCKETS),
+    'ml_batch_size': ('histogram', 'Customers per /api/predict/batch request', BATCH_SIZE_BUCKETS),
+    'process_resident_memory_bytes': ('gauge', 'Resident set size of each worker process', None),
+}
+
+SNAPSHOT_PREFIX = 'metrics-'
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+def resident_memory_bytes():
+    """RSS of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class ServiceMetrics:
+    """Thread-safe counters and histograms for one worker process"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+        self._flusher_pid = None
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+        self._ensure_flusher()
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = self._key(name, labels)
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+            self._dirty = True
+        self._ensure_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'rss': resident_memory_bytes(),
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(counts), total, count]
+                               for (name, labels), (counts, total, count) in self._histograms.items()],
+            }
+
+    # -------------------------------------------------------------------------
+    # Sharing between worker processes
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'{SNAPSHOT_PREFIX}{pid}.json')
+
+    def flush(self):
+        """Write this worker's snapshot for the other workers to read"""
+        if not self.directory:
+            return
+        with self._lock:
+            self._dirty = False
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"✗ Writing metrics snapshot failed: {e}")
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork(), so start one in every worker process
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+                self._flusher_pid = os.getpid()
+
+    def _snapshots(self):
+        """This worker's live snapshot plus the latest one of every other worker"""
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        own = os.path.basename(self._snapshot_path(os.getpid()))
+        for entry in os.listdir(self.directory):
+            if entry == own or not entry.startswith(SNAPSHOT_PREFIX) or not entry.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _pid_alive(snapshot['pid']):
+                snapshot['rss'] = None
+            snapshots.append(snapshot)
+        return snapshots
+
+    # -------------------------------------------------------------------------
+    # Exposition
+
+    def render(self):
+        """All workers' metrics in the Prometheus text format"""
+        counters, histograms, gauges = {}, {}, {}
+        for snapshot in self._snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+            if snapshot['rss'] is not None:
+                gauges[('process_resident_memory_bytes', (('pid', str(snapshot['pid'])),))] = snapshot['rss']
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets + ['+Inf'], counts):
+                        cumulative += bucket_count
+                        le = bound if bound == '+Inf' else _format_value(bound)
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {count}')
+            else:
+                values = counters if kind == 'counter' else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -51,6 +51,6 @@ echo.
 echo Press Ctrl+C to stop the service
 echo.
 
-python ml_api_service.py
+python serve_ml.py
 
 pause
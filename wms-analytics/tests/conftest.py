@@ -0,0 +1,150 @@
+"""
+Shared fixtures for the wms-analytics tests
+===========================================
+Small Decision Trees fitted on synthetic rows stand in for the trained
+models, so no model files or notebooks are needed. ml_api_service is
+imported with the prediction cache and hot reload off, an empty model
+registry, no Parquet store and a scratch training cache.
+
+Run with:
+    cd wms-analytics
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+ANALYTICS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ANALYTICS_DIR)
+
+_scratch = tempfile.mkdtemp(prefix='wms-tests-')
+os.environ.update({
+    'ML_MODEL_REGISTRY': os.path.join(_scratch, 'model_registry'),
+    'WMS_DATA_STORE': os.path.join(_scratch, 'data_store'),
+    'WMS_TRAIN_CACHE': os.path.join(_scratch, 'train_cache'),
+    'ML_CACHE_MAX_MB': '0',
+    'ML_RELOAD_INTERVAL_SECONDS': '0',
+    'ML_COALESCE': '0',
+    'ML_QUANTIZED': '0',
+    'MPLBACKEND': 'Agg',
+})
+for _name in ('ML_ADMIN_TOKEN', 'ML_METRICS_DIR'):
+    os.environ.pop(_name, None)
+
+from sklearn.tree import DecisionTreeClassifier  # noqa: E402
+
+from feature_assembly import ALL_FEATURES, MODEL_FEATURES, FeatureAssembler, column_indexes  # noqa: E402
+from feature_transform import FeatureTransform  # noqa: E402
+
+# Sorted, as LabelEncoder numbers them; the payload defaults are included
+CATEGORIES = {
+    'grain': ['maize', 'rice', 'wheat'],
+    'activity': ['sold', 'stored', 'storing'],
+    'sold': ['no', 'partial', 'yes'],
+}
+
+
+def synthetic_payloads(n_rows, seed=0):
+    """Request payloads with the value ranges of CUSTOMER_ACTIVITIES"""
+    rng = np.random.default_rng(seed)
+    bags = rng.integers(10, 500, n_rows)
+    rent = rng.choice([30, 40, 50, 60], n_rows)
+    return [{
+        'customerId': i,
+        'grain_type': str(rng.choice(CATEGORIES['grain'])),
+        'total_bags': int(bags[i]),
+        'total_weight_kg': int(bags[i] * 50),
+        'storage_duration_days': int(rng.integers(1, 365)),
+        'monthly_rent_per_bag': int(rent[i]),
+        'total_rent_paid': float(rng.uniform(0, 20_000)),
+        'activity_status': str(rng.choice(CATEGORIES['activity'])),
+        'sold_status': str(rng.choice(CATEGORIES['sold'])),
+    } for i in range(n_rows)]
+
+
+def synthetic_labels(name, X):
+    """Labels for an ALL_FEATURES matrix: price and duration bands, profit 0/1"""
+    column = {c: X[:, j] for j, c in enumerate(ALL_FEATURES)}
+    if name == 'price':
+        return np.select([column['total_weight_kg'] > 15_000, column['total_weight_kg'] > 6_000],
+                         ['High Price', 'Medium Price'], 'Low Price')
+    if name == 'profit':
+        return (column['total_weight_kg'] * 0.5 > column['total_rent_paid']).astype(int)
+    return np.select([column['total_bags'] > 300, column['total_bags'] > 120],
+                     ['Long-term', 'Medium-term'], 'Short-term')
+
+
+@pytest.fixture(scope='session')
+def transform():
+    return FeatureTransform(CATEGORIES)
+
+
+@pytest.fixture(scope='session')
+def training(transform):
+    """(payloads, ALL_FEATURES matrix) the synthetic models are fitted on"""
+    payloads = synthetic_payloads(2000)
+    X, valid, _ = FeatureAssembler(ALL_FEATURES, transform.encoders()).matrix(payloads)
+    assert valid.all()
+    return payloads, X
+
+
+@pytest.fixture(scope='session')
+def fitted_models(training):
+    """{model name: DecisionTreeClassifier} over the model's own feature columns"""
+    _, X = training
+    fitted = {}
+    for name, columns in MODEL_FEATURES.items():
+        features = X[:, column_indexes(columns, ALL_FEATURES)]
+        fitted[name] = DecisionTreeClassifier(max_depth=6, random_state=42).fit(
+            features, synthetic_labels(name, X))
+    return fitted
+
+
+@pytest.fixture(scope='session')
+def service():
+    import ml_api_service
+    return ml_api_service
+
+
+@pytest.fixture
+def make_loaded(service, transform):
+    """Build a LoadedModel as load_models() would"""
+    def make(name, model, version='v1'):
+        encoders = transform.encoders()
+        return service.LoadedModel(model, encoders, transform, FeatureAssembler(MODEL_FEATURES[name], encoders),
+                                   version, ('test', version))
+    return make
+
+
+@pytest.fixture
+def serving(service, fitted_models, make_loaded, monkeypatch):
+    """The service with the synthetic models installed; restored afterwards"""
+    for name, model in fitted_models.items():
+        monkeypatch.setitem(service.models, name, make_loaded(name, model))
+    monkeypatch.setattr(service, 'coalescers', {})
+    return service
+
+
+@pytest.fixture
+def client(serving):
+    serving.app.config['TESTING'] = True
+    return serving.app.test_client()
+
+
+@pytest.fixture
+def payloads():
+    return synthetic_payloads(40, seed=1)
+
+
+@pytest.fixture
+def encode(transform):
+    """Feature matrix of payloads for the given columns"""
+    def encode(payloads, columns):
+        X, valid, _ = FeatureAssembler(columns, transform.encoders()).matrix(payloads)
+        assert valid.all()
+        return X
+    return encode
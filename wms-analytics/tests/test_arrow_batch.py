@@ -0,0 +1,78 @@
+"""Arrow IPC batches give the same predictions as JSON batches"""
+
+import json
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+import arrow_batch  # noqa: E402
+from arrow_batch import ARROW_MIMETYPE  # noqa: E402
+
+
+@pytest.fixture
+def batch_payloads(payloads):
+    """The shared payloads plus an unknown grain type and a missing bag count"""
+    rows = [dict(payload) for payload in payloads]
+    rows[3]['grain_type'] = 'quinoa'
+    rows[7]['total_bags'] = None
+    return rows
+
+
+def arrow_body(rows):
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pylist(rows)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def json_results(client, rows):
+    response = client.post('/api/predict/batch', json={'customers': rows})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_arrow_round_trip_matches_json(client, batch_payloads):
+    response = client.post('/api/predict/batch', data=arrow_body(batch_payloads),
+                           content_type=ARROW_MIMETYPE, headers={'Accept': ARROW_MIMETYPE})
+
+    assert response.status_code == 200
+    assert response.mimetype == ARROW_MIMETYPE
+    assert json.loads(response.headers['X-Model-Versions']) == {'price': 'v1', 'profit': 'v1', 'duration': 'v1'}
+    table = arrow_batch.read_table(response.data)
+    assert table.schema.field('price').type == pa.string()
+    assert table.schema.field('duration').type == pa.string()
+    assert table.schema.field('profitable').type == pa.bool_()
+
+    rows = table.to_pylist()
+    for row, expected in zip(rows, json_results(client, batch_payloads)):
+        assert row['customerId'] == expected['customerId']
+        assert (row['error'] is None) == ('error' not in expected)
+        predictions = expected['predictions']
+        assert row['price'] == predictions['price']
+        assert row['duration'] == predictions['duration']
+        assert row['profitable'] == predictions['profitable']
+        assert row['probability'] == predictions.get('probability')
+    assert [i for i, row in enumerate(rows) if row['error'] is not None] == [3, 7]
+    assert rows[3]['price'] is None and rows[0]['price'] in ('High Price', 'Medium Price', 'Low Price')
+
+
+def test_arrow_request_with_json_response(client, payloads):
+    response = client.post('/api/predict/batch', data=arrow_body(payloads), content_type=ARROW_MIMETYPE)
+    assert response.status_code == 200
+    assert response.get_json()['results'] == json_results(client, payloads)
+
+
+def test_json_request_with_arrow_response(client, payloads):
+    response = client.post('/api/predict/batch', json={'customers': payloads}, headers={'Accept': ARROW_MIMETYPE})
+    assert response.status_code == 200
+    table = arrow_batch.read_table(response.data)
+    assert table.column('customerId').to_pylist() == [payload['customerId'] for payload in payloads]
+    assert table.column('price').to_pylist() == [r['predictions']['price'] for r in json_results(client, payloads)]
+
+
+def test_invalid_arrow_body_is_rejected(client):
+    response = client.post('/api/predict/batch', data=b'not arrow', content_type=ARROW_MIMETYPE)
+    assert response.status_code == 400
+    assert 'Invalid Arrow batch' in response.get_json()['error']
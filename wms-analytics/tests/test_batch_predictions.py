@@ -0,0 +1,73 @@
+"""The vectorized batch endpoint: order, per-row errors and malformed bodies"""
+
+import numpy as np
+import pytest
+
+from feature_assembly import MODEL_FEATURES
+
+
+def predictions(client, customers):
+    response = client.post('/api/predict/batch', json={'customers': customers})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_results_follow_request_order(client, fitted_models, payloads, encode):
+    body = predictions(client, payloads)
+
+    results = body['results']
+    assert [result['customerId'] for result in results] == [payload['customerId'] for payload in payloads]
+    assert body['model_versions'] == {'price': 'v1', 'profit': 'v1', 'duration': 'v1'}
+    for name, key in (('price', 'price'), ('duration', 'duration')):
+        expected = fitted_models[name].predict(encode(payloads, MODEL_FEATURES[name])).tolist()
+        assert [result['predictions'][key] for result in results] == expected
+    profit = fitted_models['profit']
+    X = encode(payloads, MODEL_FEATURES['profit'])
+    assert [result['predictions']['profitable'] for result in results] == [bool(v) for v in profit.predict(X)]
+    proba = profit.predict_proba(X)
+    expected = np.where(profit.predict(X) == 1, proba[:, 1], proba[:, 0])
+    np.testing.assert_allclose([result['predictions']['probability'] for result in results], expected)
+
+
+def test_invalid_rows_do_not_affect_the_others(client, payloads):
+    clean = predictions(client, payloads)['results']
+    customers = [dict(payload) for payload in payloads]
+    customers[2]['grain_type'] = 'quinoa'
+    customers[4]['total_bags'] = 'many'
+    customers[6] = 17
+    customers[8] = None
+
+    results = predictions(client, customers)['results']
+
+    assert [i for i, result in enumerate(results) if 'error' in result] == [2, 4, 6, 8]
+    assert 'quinoa' in results[2]['error']
+    assert 'JSON object' in results[6]['error']
+    assert results[6]['customerId'] is None
+    assert results[2]['predictions'] == {'price': None, 'profitable': None, 'duration': None}
+    for i, (result, expected) in enumerate(zip(results, clean)):
+        if i not in (2, 4, 6, 8):
+            assert result == expected
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'customers': {'customerId': 1}}, {'customers': 'all'}, 'text'])
+def test_malformed_batches_are_rejected(client, body):
+    response = client.post('/api/predict/batch', json=body)
+    assert response.status_code == 400
+    assert 'customers' in response.get_json()['error']
+
+
+def test_body_that_is_not_json_is_rejected(client):
+    response = client.post('/api/predict/batch', data='{', content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_empty_batch(client):
+    assert predictions(client, [])['results'] == []
+
+
+def test_single_endpoints_return_band_labels(client, payloads):
+    price = client.post('/api/predict/price', json=payloads[0]).get_json()
+    duration = client.post('/api/predict/duration', json=payloads[0]).get_json()
+    assert price['predicted_price'] in ('High Price', 'Medium Price', 'Low Price')
+    assert price['unit'] == 'price band'
+    assert duration['predicted_duration'] in ('Long-term', 'Medium-term', 'Short-term')
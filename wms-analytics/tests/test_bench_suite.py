@@ -0,0 +1,57 @@
+"""Benchmark suite: reproducible synthetic data and the --compare report"""
+
+import filecmp
+import os
+import sys
+
+import pytest
+
+import wms_data
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import bench_suite  # noqa: E402
+
+
+@pytest.mark.parametrize('value, rows, label', [('10k', 10_000, '10k'), ('1M', 1_000_000, '1M'),
+                                                ('2.5k', 2_500, '2500'), ('750', 750, '750')])
+def test_sizes(value, rows, label):
+    assert bench_suite.parse_rows(value) == rows
+    assert bench_suite.size_label(rows) == label
+
+
+@pytest.mark.parametrize('name', list(wms_data.DATASETS))
+def test_synthetic_exports_are_reproducible(name, tmp_path, monkeypatch):
+    monkeypatch.setattr(bench_suite, 'GENERATE_CHUNK_ROWS', 400)
+    paths = [str(tmp_path / f'{run}.csv') for run in ('a', 'b', 'other-seed')]
+    for path, seed in zip(paths, (7, 7, 8)):
+        bench_suite.generate(name, 1000, path, seed)
+
+    assert filecmp.cmp(paths[0], paths[1], shallow=False)
+    assert not filecmp.cmp(paths[0], paths[2], shallow=False)
+    synthetic = wms_data.read_csv(name, path=paths[0])
+    real = wms_data.read_csv(name)
+    assert len(synthetic) == 1000
+    assert list(synthetic.columns) == list(real.columns)
+    assert (synthetic.dtypes == real.dtypes).all()
+    if name == 'grain_movements':
+        assert synthetic['transaction_id'].tolist() == list(range(1, 1001))
+
+
+def report(commit, results):
+    return {'meta': {'commit': commit}, 'results': results}
+
+
+def test_compare_prints_ratios_against_the_baseline(capsys):
+    old = report('aaaa', {'10k': {'data': {'convert': {'seconds': 2.0}}},
+                          'service': {'price': {'p50_ms': 4.0, 'seconds': 9.0}, 'dropped': {'seconds': 1.0}}})
+    new = report('bbbb', {'10k': {'data': {'convert': {'seconds': 1.0}}},
+                          'service': {'price': {'p50_ms': 6.0, 'seconds': 1.0}, 'added': {'seconds': 3.0}}})
+
+    bench_suite.print_results(new, old)
+
+    lines = {line.split()[0]: line.split() for line in capsys.readouterr().out.splitlines() if line[:1].isalnum()}
+    assert lines['10k.data.convert'][-1] == '0.50x'
+    # Latency cases compare their median, not the wall time
+    assert lines['service.price'][1:] == ['6.0000', 'p50', 'ms', '1.50x']
+    assert lines['service.added'][-1] == 's'
+    assert 'service.dropped' not in lines
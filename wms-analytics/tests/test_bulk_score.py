@@ -0,0 +1,73 @@
+"""Bulk scoring end to end: row alignment, invalid rows and output types"""
+
+import sys
+
+import pandas as pd
+import pytest
+
+import bulk_score
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['bulk_score.py', *args, '--workers', '1'])
+    bulk_score.main()
+
+
+@pytest.fixture
+def export(tmp_path, payloads):
+    """A CSV export of the payloads with two rows the service would reject"""
+    frame = pd.DataFrame(payloads)
+    frame.loc[3, 'grain_type'] = 'quinoa'
+    frame['total_bags'] = frame['total_bags'].astype(object)
+    frame.loc[5, 'total_bags'] = 'many'
+    path = tmp_path / 'export.csv'
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def test_scored_rows_line_up_with_the_input(serving, client, export, payloads, tmp_path, monkeypatch):
+    output = str(tmp_path / 'scored.csv')
+
+    run(monkeypatch, export, '--output', output, '--chunk-rows', '7')
+
+    scored = pd.read_csv(output)
+    assert scored['customerId'].tolist() == [payload['customerId'] for payload in payloads]
+    invalid = scored['prediction_error'].notna()
+    assert invalid[invalid].index.tolist() == [3, 5]
+    assert 'quinoa' in scored.loc[3, 'prediction_error']
+    assert scored.loc[invalid, ['predicted_price', 'predicted_profitable', 'predicted_duration']].isna().all().all()
+
+    results = client.post('/api/predict/batch', json={'customers': payloads}).get_json()['results']
+    for i, result in enumerate(results):
+        if i not in (3, 5):
+            assert scored.loc[i, 'predicted_price'] == result['predictions']['price']
+            assert scored.loc[i, 'predicted_profitable'] == result['predictions']['profitable']
+            assert scored.loc[i, 'profit_probability'] == pytest.approx(result['predictions']['probability'])
+            assert scored.loc[i, 'predicted_duration'] == result['predictions']['duration']
+
+
+def test_parquet_output_column_types(serving, export, tmp_path, monkeypatch):
+    output = str(tmp_path / 'scored.parquet')
+
+    run(monkeypatch, export, '--output', output)
+
+    scored = pd.read_parquet(output)
+    assert scored['predicted_profitable'].dtype == 'boolean'
+    assert scored['profit_probability'].dtype == 'float64'
+    for column in ('predicted_price', 'predicted_duration', 'prediction_error'):
+        assert scored[column].dtype == 'string'
+    assert scored['predicted_profitable'].isna().tolist() == [i in (3, 5) for i in range(len(scored))]
+
+
+def test_input_without_rows_writes_nothing(serving, export, tmp_path, monkeypatch, capsys):
+    empty = tmp_path / 'empty.csv'
+    with open(export) as f:
+        empty.write_text(f.readline())
+    output = tmp_path / 'scored.csv'
+
+    with pytest.raises(SystemExit) as exit_info:
+        run(monkeypatch, str(empty), '--output', str(output))
+
+    assert exit_info.value.code == 1
+    assert 'No rows' in capsys.readouterr().out
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['empty.csv', 'export.csv']
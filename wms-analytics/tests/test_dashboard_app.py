@@ -0,0 +1,59 @@
+"""Dashboard: pages render, and figures are built once per period"""
+
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('streamlit')
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import wms_rollups  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dashboard_app.py')
+
+
+@pytest.fixture(scope='module')
+def dashboard():
+    import dashboard_app
+    return dashboard_app
+
+
+@pytest.mark.parametrize('filter_type', ['All Time', 'Financial Year', 'Specific Month', 'Custom Date Range'])
+def test_both_pages_render(filter_type):
+    app = AppTest.from_file(APP, default_timeout=60).run()
+    app.sidebar.selectbox[0].set_value(filter_type).run()
+    for page in app.sidebar.radio[0].options:
+        app.sidebar.radio[0].set_value(page).run()
+        assert not app.exception
+        assert app.get('plotly_chart')
+
+
+@pytest.mark.parametrize('view, name', [('grain_movement_view', 'movements_daily'),
+                                        ('customer_activity_view', 'activities_daily')])
+def test_views_are_reused_per_period(dashboard, view, name):
+    view = getattr(dashboard, view)
+    version = wms_rollups.rollups_version()
+
+    whole = view(None, None, version)
+    spring = view(pd.Timestamp('2024-03-01'), pd.Timestamp('2024-05-31'), version)
+
+    assert view(None, None, version) is whole
+    assert view(pd.Timestamp('2024-03-01'), pd.Timestamp('2024-05-31'), version) is spring
+    assert spring is not whole
+    rollup = wms_rollups.load_rollup(name, '2024-03-01', '2024-05-31')
+    if name == 'movements_daily':
+        # Tonnes brought in
+        assert spring[1]['total_in'] == pytest.approx(
+            rollup.loc[rollup['operation'] == 'IN', 'total_weight_kg'].sum() / 1000)
+    else:
+        assert spring[1]['total_sales'] == pytest.approx(rollup['total_sale_amount'].sum())
+
+@pytest.mark.parametrize('years, label', [(2, 'Monthly'), (6, 'Quarterly'), (30, 'Yearly')])
+def test_trend_bars_are_bounded(dashboard, years, label):
+    dates = pd.Series(pd.date_range('2000-01-01', periods=years * 12, freq='MS'))
+
+    periods, period_label = dashboard.trend_period(dates)
+
+    assert period_label == label
+    assert periods.nunique() <= dashboard.MAX_TREND_BARS
@@ -0,0 +1,77 @@
+"""Streamed report aggregates match the in-memory ones; batch rendering"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+import data_visualization as dv
+
+
+@pytest.fixture(scope='module')
+def in_memory():
+    return dv.compute_aggregates(by_grain=True)
+
+
+@pytest.mark.parametrize('chunk_rows', [997, 4096])
+def test_streamed_aggregates_match_in_memory(in_memory, chunk_rows):
+    streamed = dv.compute_aggregates(stream=True, chunk_rows=chunk_rows, by_grain=True)
+
+    assert list(streamed) == list(in_memory)
+    for scope, expected in in_memory.items():
+        for partials, expected_partials in zip(streamed[scope], expected):
+            assert partials.keys() == expected_partials.keys()
+            for key, value in expected_partials.items():
+                if isinstance(value, pd.Series):
+                    pd.testing.assert_series_equal(partials[key], value, check_names=False, obj=f'{scope}/{key}')
+                else:
+                    assert partials[key] == pytest.approx(value), f'{scope}/{key}'
+
+
+def test_merge_partials_is_independent_of_chunking():
+    activities = dv.load_dataset('customer_activities', dv.ACTIVITY_COLUMNS)
+    whole = dv._finish(dv.activity_partials(activities))
+    halves = dv._finish(dv.merge_partials(dv.activity_partials(activities.iloc[:1000]),
+                                          dv.activity_partials(activities.iloc[1000:])))
+    assert whole['records'] == halves['records'] == len(activities)
+    pd.testing.assert_series_equal(halves['status_counts'], whole['status_counts'])
+    pd.testing.assert_series_equal(halves['profit_by_status'], whole['profit_by_status'])
+
+
+def test_batch_jobs_cover_every_figure_and_grain(in_memory, tmp_path):
+    jobs = dv.figure_jobs(in_memory, list(dv.FIGURES), str(tmp_path), dpi=40)
+
+    paths = sorted(os.path.basename(job[3]) for job in jobs)
+    grains = [scope.lower() for scope in in_memory if scope is not None]
+    expected = [f'{stem}.png' for stem, _, _ in dv.FIGURES.values()]
+    expected += [f'{stem}_{grain}.png' for stem, _, _ in dv.FIGURES.values() for grain in grains]
+    assert grains and paths == sorted(expected)
+
+
+def test_parallel_render_matches_serial(in_memory, tmp_path):
+    reports = {None: in_memory[None]}
+    serial = dv.figure_jobs(reports, list(dv.FIGURES), str(tmp_path / 'serial'), dpi=40)
+    parallel = dv.figure_jobs(reports, list(dv.FIGURES), str(tmp_path / 'parallel'), dpi=40)
+    for directory in ('serial', 'parallel'):
+        (tmp_path / directory).mkdir()
+
+    list(dv.render_all(serial, 1))
+    pids = {pid for _, _, pid in dv.render_all(parallel, 2)}
+
+    assert os.getpid() not in pids
+    for serial_job, parallel_job in zip(serial, parallel):
+        with open(serial_job[3], 'rb') as a, open(parallel_job[3], 'rb') as b:
+            assert a.read() == b.read()
+
+
+def test_batch_mode_never_shows_figures(tmp_path, monkeypatch):
+    def show():
+        raise AssertionError('plt.show() called in batch mode')
+    monkeypatch.setattr(dv.plt, 'show', show)
+    monkeypatch.setattr(sys, 'argv', ['data_visualization.py', '--batch', '--outputs', 'customer_sales',
+                                      '--dpi', '40', '--workers', '1', '--output-dir', str(tmp_path)])
+
+    dv.main()
+
+    assert os.listdir(tmp_path) == ['customer_sales_analysis.png']
@@ -0,0 +1,95 @@
+"""Category codes, payload defaults and invalid features on the single endpoints"""
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from feature_assembly import ALL_FEATURES, FEATURE_FIELDS, FeatureAssembler, InvalidFeatureError
+from feature_transform import TRANSFORM_FILE, CategoryEncoder, FeatureTransform, UnknownCategoryError
+
+
+def test_encoder_codes_follow_category_order():
+    encoder = CategoryEncoder('grain', ['Maize', 'Rice', 'Wheat'])
+
+    assert [encoder(value) for value in ('Maize', ' rice ', 'WHEAT')] == [0.0, 1.0, 2.0]
+    np.testing.assert_array_equal(encoder.column(['wheat', 'Maize', 'wheat', 'Rice']), [2, 0, 2, 1])
+    with pytest.raises(UnknownCategoryError, match="'quinoa'"):
+        encoder('quinoa')
+    with pytest.raises(UnknownCategoryError, match="'quinoa'"):
+        encoder.column(['rice', 'quinoa'])
+
+
+def test_transform_round_trip_matches_label_encoders(tmp_path):
+    fitted = {name: LabelEncoder().fit(values)
+              for name, values in {'grain': ['Wheat', 'Maize', 'Rice', 'Maize'],
+                                   'activity': ['storing', 'sold', 'stored']}.items()}
+    transform = FeatureTransform.from_encoders(fitted)
+    path = str(tmp_path / TRANSFORM_FILE)
+    transform.save(path)
+
+    loaded = FeatureTransform.load(path)
+
+    assert loaded == transform
+    transform.check(fitted)
+    for name, encoder in fitted.items():
+        codes = [loaded.encoders()[name](value) for value in encoder.classes_]
+        assert codes == encoder.transform(encoder.classes_).tolist()
+    with pytest.raises(ValueError, match='disagree'):
+        FeatureTransform.from_encoders(fitted, {'grain': LabelEncoder().fit(['Barley', 'Maize'])})
+
+
+def test_missing_fields_take_their_defaults(transform):
+    assembler = FeatureAssembler(ALL_FEATURES, transform.encoders())
+    encoders = transform.encoders()
+    expected = [encoders[encoder](default) if encoder else default
+                for _, default, encoder in FEATURE_FIELDS.values()]
+
+    np.testing.assert_array_equal(assembler.row({})[0], expected)
+    X, valid, _ = assembler.matrix([{}, {'total_bags': 7}])
+    assert valid.all()
+    np.testing.assert_array_equal(X[0], expected)
+    assert X[1, ALL_FEATURES.index('total_bags')] == 7
+
+
+@pytest.mark.parametrize('value', ['nan', float('inf'), '-Infinity', None, 'many', [1]])
+def test_numeric_values_must_be_finite(transform, value):
+    assembler = FeatureAssembler(ALL_FEATURES, transform.encoders())
+    with pytest.raises((TypeError, ValueError), match='total_bags'):
+        assembler.row({'total_bags': value})
+
+    _, valid, errors = assembler.matrix([{'total_bags': 3}, {'total_bags': value}])
+    assert valid.tolist() == [True, False]
+    assert 'total_bags' in errors[1]
+
+
+def test_column_batches_reject_infinity(transform):
+    assembler = FeatureAssembler(ALL_FEATURES, transform.encoders())
+    _, valid, errors = assembler.arrays({'total_bags': np.array([1.0, np.inf, np.nan])}, 3)
+
+    assert valid.tolist() == [True, False, False]
+    assert 'not a finite number' in errors[1] and errors[2] == 'missing total_bags'
+
+
+@pytest.mark.parametrize('name', ['price', 'profit', 'duration'])
+@pytest.mark.parametrize('change, message', [
+    ({'grain_type': 'quinoa'}, 'unknown grain'),
+    ({'total_bags': 'many'}, 'total_bags'),
+    ({'total_weight_kg': None}, 'total_weight_kg'),
+    ({'monthly_rent_per_bag': 'nan'}, 'not a finite number'),
+])
+def test_single_endpoints_reject_invalid_features(client, payloads, name, change, message):
+    response = client.post(f'/api/predict/{name}', json={**payloads[0], **change})
+
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'text', None])
+def test_single_endpoints_reject_bodies_that_are_not_objects(client, body):
+    response = client.post('/api/predict/profit', json=body)
+    assert response.status_code == 400
+
+
+def test_single_endpoint_error_type(service, serving, payloads):
+    with pytest.raises(InvalidFeatureError):
+        service.predict_single('price', serving.models['price'], {**payloads[0], 'total_bags': 'x'})
@@ -0,0 +1,49 @@
+"""Incremental retraining starts from the served fit and its own held-out rows"""
+
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import incremental_training as it
+import train_models as tm
+import wms_data
+
+
+@pytest.fixture
+def small_forest(monkeypatch, tmp_path):
+    """A fast forest estimator and an empty training cache"""
+    monkeypatch.setattr(tm, 'CACHE_DIR', str(tmp_path / 'train_cache'))
+    monkeypatch.setitem(tm.ESTIMATORS, it.FOREST, lambda forest_jobs: RandomForestClassifier(
+        n_estimators=5, random_state=42, max_depth=4, n_jobs=forest_jobs))
+
+
+def served_fit(name):
+    """Fit and cache the forest as train_models.train() does; returns (dataset, model)"""
+    activities = wms_data.load_dataset('customer_activities', store_dir='/nonexistent')
+    dataset, dataset_key, _ = tm.load_featurized(name, activities)
+    _, _, model, metrics, _ = tm.fit_one(name, it.FOREST, dataset, 1)
+    model.served_fit_ = True  # tells the cached fit apart from an identical refit
+    key = tm._fit_key(dataset_key, it.FOREST, tm.ESTIMATORS[it.FOREST](1), tm.TARGETS[name]['average'])
+    tm.cache_put('fit', key, (model, metrics))
+    return dataset, model
+
+
+def test_state_grows_the_cached_served_fit(small_forest):
+    dataset, model = served_fit('profit')
+    activities, offset = wms_data.read_csv_appended('customer_activities', 0, it.CSV_PATH)
+
+    state = it.build_state('profit', activities, offset, 1)
+
+    assert getattr(state['forest'], 'served_fit_', False)
+    assert (state['forest'].predict(dataset['X_test']) == model.predict(dataset['X_test'])).all()
+    # The held-out rows are the served model's test split, none of its training rows
+    assert state['X_holdout'].index.intersection(dataset['X_train'].index).empty
+    assert state['X_holdout'].equals(dataset['X_test'])
+
+
+def test_state_falls_back_to_the_served_forest(small_forest):
+    activities, offset = wms_data.read_csv_appended('customer_activities', 0, it.CSV_PATH)
+    served = tm.ESTIMATORS[it.FOREST](1).fit([[0] * 7, [1] * 7], [0, 1])
+
+    state = it.build_state('profit', activities, offset, 1, served)
+
+    assert state['forest'] is served
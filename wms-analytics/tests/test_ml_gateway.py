@@ -0,0 +1,89 @@
+"""ASGI gateway and NDJSON streaming: the same results as the batch endpoint"""
+
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def gateway(serving):
+    import ml_gateway
+    return ml_gateway
+
+
+def call(app, path, chunks, headers=(), disconnect_after=None):
+    """Run one POST through an ASGI app; returns (start message, body messages)"""
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'root_path': '', 'query_string': b'',
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('10.0.0.1', 5000),
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    incoming = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    if disconnect_after is not None:
+        incoming = incoming[:disconnect_after] + [{'type': 'http.disconnect'}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0], sent[1:]
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)] or [b'']
+
+
+def batch_results(client, payloads):
+    return client.post('/api/predict/batch', json={'customers': payloads}).get_json()['results']
+
+
+def test_chunked_request_reaches_flask(gateway, client, payloads):
+    body = json.dumps({'customers': payloads}).encode()
+
+    start, messages = call(gateway.app, '/api/predict/batch', split(body, 500),
+                           headers=[('content-type', 'application/json'), ('transfer-encoding', 'chunked')])
+
+    assert start['status'] == 200
+    assert messages[-1]['more_body'] is False
+    assert json.loads(b''.join(m['body'] for m in messages))['results'] == batch_results(client, payloads)
+
+
+def test_gateway_stream_matches_batch(gateway, client, payloads, monkeypatch):
+    monkeypatch.setattr(gateway, 'STREAM_CHUNK_ROWS', 7)
+    lines = [json.dumps(payload) for payload in payloads]
+    lines.insert(5, 'not json')
+    body = ('\n'.join(lines) + '\n').encode()
+
+    start, messages = call(gateway.app, '/api/predict/stream', split(body, 333))
+
+    assert start['status'] == 200
+    assert dict(start['headers'])[b'x-model-versions']
+    assert messages[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+    results = [json.loads(line) for line in b''.join(m['body'] for m in messages).splitlines()]
+    assert 'Invalid JSON' in results.pop(5)['error']
+    assert results == batch_results(client, payloads)
+
+
+def test_gateway_stream_closes_the_response_on_disconnect(gateway, payloads):
+    body = ''.join(json.dumps(payload) + '\n' for payload in payloads).encode()
+
+    start, messages = call(gateway.app, '/api/predict/stream', split(body, 200), disconnect_after=2)
+
+    assert start['status'] == 200
+    assert messages[-1]['more_body'] is False
+
+
+def test_flask_stream_endpoint_matches_batch(serving, client, payloads, monkeypatch):
+    monkeypatch.setattr(serving, 'STREAM_CHUNK_ROWS', 4)
+    body = '\n'.join(json.dumps(payload) for payload in payloads) + '\n\n[1, 2]\n'
+
+    response = client.post('/api/predict/stream', data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.data.splitlines()]
+    assert 'Invalid JSON' in results.pop()['error']
+    assert results == batch_results(client, payloads)
@@ -0,0 +1,136 @@
+"""Model registry: publish, activate, roll back, and the admin endpoints"""
+
+import os
+import pickle
+
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+import model_registry
+from feature_transform import TRANSFORM_FILE
+from tree_engine import CompiledModel
+
+TOKEN = 'test-admin-token'
+
+
+@pytest.fixture
+def registry(tmp_path, fitted_models, transform):
+    """A registry with two published profit versions, the second current"""
+    trained = tmp_path / 'trained'
+    trained.mkdir()
+    model_path = str(trained / 'model.pkl')
+    encoder_path = str(trained / 'encoders.pkl')
+    with open(model_path, 'wb') as f:
+        pickle.dump(fitted_models['profit'], f)
+    with open(encoder_path, 'wb') as f:
+        pickle.dump({name: LabelEncoder().fit(values) for name, values in transform.categories.items()}, f)
+    transform.save(str(trained / TRANSFORM_FILE))
+
+    path = str(tmp_path / 'model_registry')
+    for version in ('20260101T000000-aaaaaaaa', '20260201T000000-bbbbbbbb'):
+        model_registry.publish('profit', model_path, encoder_path, path, version)
+    return path
+
+
+def test_publish_activates_the_new_version(registry):
+    assert model_registry.list_versions('profit', registry) == ['20260101T000000-aaaaaaaa',
+                                                               '20260201T000000-bbbbbbbb']
+    assert model_registry.current_version('profit', registry) == '20260201T000000-bbbbbbbb'
+    assert os.path.exists(os.path.join(model_registry.version_dir('profit', '20260201T000000-bbbbbbbb', registry),
+                                       TRANSFORM_FILE))
+
+
+def test_activate_rolls_back(registry):
+    model_registry.activate('profit', '20260101T000000-aaaaaaaa', registry)
+    assert model_registry.current_version('profit', registry) == '20260101T000000-aaaaaaaa'
+
+
+@pytest.mark.parametrize('version', ['20260301T000000-cccccccc', '..', '../../profit', '../price',
+                                     '20260101T000000-aaaaaaaa/..', '', 'CURRENT'])
+def test_activate_rejects_unpublished_versions(registry, version):
+    # profit/../price exists, so a directory check alone would accept it
+    os.makedirs(os.path.join(registry, 'price'), exist_ok=True)
+    with pytest.raises(ValueError):
+        model_registry.activate('profit', version, registry)
+    assert model_registry.current_version('profit', registry) == '20260201T000000-bbbbbbbb'
+
+
+def publish_without_encoders(model, directory, compiled=True, monkeypatch=None):
+    """Publish a profit model with no encoders.pkl; returns its version directory"""
+    model_path = os.path.join(directory, 'model.pkl')
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    if not compiled:
+        import tree_engine
+
+        def fail(*args, **kwargs):
+            raise ValueError('cannot compile')
+        monkeypatch.setattr(tree_engine, 'save_compiled', fail)
+    registry = os.path.join(directory, 'model_registry')
+    version = model_registry.publish('profit', model_path, None, registry)
+    version_dir = model_registry.version_dir('profit', version, registry)
+    assert not os.path.exists(os.path.join(version_dir, model_registry.ENCODER_FILE))
+    return version_dir
+
+
+def load(service, directory):
+    return service.load_model(directory, model_registry.MODEL_FILE, model_registry.ENCODER_FILE,
+                              service.MODEL_FEATURES['profit'])
+
+
+@pytest.mark.parametrize('compiled', [True, False])
+def test_version_without_encoders_serves_from_its_transform(service, fitted_models, transform, tmp_path,
+                                                            monkeypatch, compiled):
+    transform.save(str(tmp_path / TRANSFORM_FILE))
+    directory = publish_without_encoders(fitted_models['profit'], str(tmp_path), compiled, monkeypatch)
+
+    model, encoders, loaded_transform, _ = load(service, directory)
+
+    assert loaded_transform == transform
+    assert isinstance(model, CompiledModel) == compiled
+    if not compiled:
+        assert encoders is None
+
+
+def test_version_without_encoders_or_transform_is_refused(service, fitted_models, tmp_path, monkeypatch):
+    directory = publish_without_encoders(fitted_models['profit'], str(tmp_path), False, monkeypatch)
+    with pytest.raises(ValueError, match='No categories'):
+        load(service, directory)
+
+
+def test_admin_is_disabled_without_a_token(serving, client, monkeypatch):
+    monkeypatch.setattr(serving, 'ADMIN_TOKEN', None)
+    response = client.post('/admin/reload', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+    assert response.status_code == 403
+    assert 'ML_ADMIN_TOKEN' in response.get_json()['error']
+    assert client.post('/admin/profile', json={'seconds': 1}).status_code == 403
+
+
+def test_admin_needs_the_right_token(serving, client, monkeypatch):
+    monkeypatch.setattr(serving, 'ADMIN_TOKEN', TOKEN)
+    assert client.post('/admin/reload').status_code == 403
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+
+def test_admin_reload_rolls_back_and_serves_the_version(serving, client, registry, monkeypatch):
+    monkeypatch.setattr(serving, 'ADMIN_TOKEN', TOKEN)
+    monkeypatch.setattr(serving, 'MODEL_REGISTRY', registry)
+
+    response = client.post('/admin/reload', headers={'X-Admin-Token': TOKEN},
+                           json={'model': 'profit', 'version': '20260101T000000-aaaaaaaa'})
+
+    assert response.status_code == 200
+    assert response.get_json()['model_versions']['profit'] == '20260101T000000-aaaaaaaa'
+    assert model_registry.current_version('profit', registry) == '20260101T000000-aaaaaaaa'
+    assert serving.models['profit'].version == '20260101T000000-aaaaaaaa'
+
+
+def test_admin_reload_rejects_a_path_as_version(serving, client, registry, monkeypatch):
+    monkeypatch.setattr(serving, 'ADMIN_TOKEN', TOKEN)
+    monkeypatch.setattr(serving, 'MODEL_REGISTRY', registry)
+
+    response = client.post('/admin/reload', headers={'X-Admin-Token': TOKEN},
+                           json={'model': 'profit', 'version': '../../trained'})
+
+    assert response.status_code == 400
+    assert model_registry.current_version('profit', registry) == '20260201T000000-bbbbbbbb'
@@ -0,0 +1,101 @@
+"""Prediction cache: keys, TTL, LRU eviction within the byte budget"""
+
+import numpy as np
+import pytest
+
+import prediction_cache
+from prediction_cache import ENTRY_OVERHEAD_BYTES, MISSING, PredictionCache, estimate_size
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual time.monotonic for the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def key(i):
+    return PredictionCache.make_key('price', 'v1', np.array([[float(i), 1.0]]))
+
+
+def entry_size(k, value):
+    return ENTRY_OVERHEAD_BYTES + len(k) + estimate_size(value)
+
+
+def test_keys_depend_on_model_version_and_features():
+    features = np.array([[0.0, 2.5]])
+    assert PredictionCache.make_key('price', 'v1', features) == PredictionCache.make_key('price', 'v1', [[-0.0, 2.5]])
+    assert PredictionCache.make_key('price', 'v1', features) != PredictionCache.make_key('price', 'v2', features)
+    assert PredictionCache.make_key('price', 'v1', features) != PredictionCache.make_key('profit', 'v1', features)
+    assert PredictionCache.make_key('price', 'v1', features) != PredictionCache.make_key('price', 'v1', [[0.0, 2.0]])
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=10)
+    cache.put(key(1), 'High Price')
+    clock[0] += 9.9
+    assert cache.get(key(1)) == 'High Price'
+    clock[0] += 0.1
+    assert cache.get(key(1)) is MISSING
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+    assert stats['entries'] == 0 and stats['bytes'] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    value = 'Medium Price'
+    cache = PredictionCache(max_bytes=3 * entry_size(key(0), value), ttl_seconds=60)
+    for i in range(3):
+        cache.put(key(i), value)
+    assert cache.get(key(0)) == value  # 1 is now the least recently used
+
+    cache.put(key(3), value)
+
+    assert cache.get(key(1)) is MISSING
+    assert all(cache.get(key(i)) == value for i in (0, 2, 3))
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] <= stats['max_bytes']
+
+
+def test_replacing_an_entry_keeps_the_byte_count(clock):
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=60)
+    cache.put(key(1), (1, [0.2, 0.8]))
+    size = cache.stats()['bytes']
+    cache.put(key(1), (1, [0.3, 0.7]))
+    assert cache.stats()['bytes'] == size
+    assert cache.get(key(1)) == (1, [0.3, 0.7])
+
+
+def test_oversized_values_are_not_cached():
+    cache = PredictionCache(max_bytes=1024, ttl_seconds=60)
+    cache.put(key(1), np.zeros(1024))
+    assert cache.get(key(1)) is MISSING
+    assert cache.stats()['entries'] == 0
+
+
+def test_clear_drops_everything():
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=60)
+    for i in range(5):
+        cache.put(key(i), i)
+    cache.clear()
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['invalidations']) == (0, 0, 1)
+    assert cache.get(key(0)) is MISSING
+
+
+def test_service_caches_per_model_version(serving, client, make_loaded, fitted_models, payloads, monkeypatch):
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=60)
+    monkeypatch.setattr(serving, 'prediction_cache', cache)
+
+    first = client.post('/api/predict/duration', json=payloads[0]).get_json()
+    again = client.post('/api/predict/duration', json=payloads[0]).get_json()
+    assert first == again
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    monkeypatch.setitem(serving.models, 'duration', make_loaded('duration', fitted_models['duration'], 'v2'))
+    reloaded = client.post('/api/predict/duration', json=payloads[0]).get_json()
+    assert reloaded['model_version'] == 'v2'
+    assert (cache.hits, cache.misses) == (1, 2)
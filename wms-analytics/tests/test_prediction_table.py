@@ -0,0 +1,93 @@
+"""Quantized prediction tables: lookups, fallback to the exact model, and the service gate"""
+
+import numpy as np
+import pytest
+
+from feature_assembly import ALL_FEATURES, FEATURE_FIELDS, MODEL_FEATURES, column_indexes
+from prediction_table import PredictionTable, QuantizedModel, build_table, save_table, table_path
+
+
+@pytest.fixture(scope='module')
+def data(training):
+    """{payload key: training values} as build_table expects"""
+    _, X = training
+    return {FEATURE_FIELDS[column][0]: X[:, j] for j, column in enumerate(ALL_FEATURES)}
+
+
+@pytest.fixture(scope='module')
+def tables(fitted_models, transform, data):
+    """{model name: (table, arrays, manifest)} over a small grid"""
+    return {name: build_table(fitted_models[name], MODEL_FEATURES[name], transform, data, 'v1', max_cells=20_000)
+            for name in ('profit', 'duration')}
+
+
+def features(name, training):
+    _, X = training
+    return X[:, column_indexes(MODEL_FEATURES[name], ALL_FEATURES)]
+
+
+@pytest.mark.parametrize('name', ['profit', 'duration'])
+def test_rows_inside_the_grid_are_looked_up(name, tables, fitted_models, training):
+    table = tables[name][0]
+    quantized = QuantizedModel(fitted_models[name], table)
+    X = features(name, training)[:200]
+    cells, inside = table.locate(X)
+    assert inside.all()
+
+    assert quantized.predict(X).tolist() == quantized.classes_[table.labels[cells]].tolist()
+    assert quantized.stats()['hits'] == len(X) and quantized.stats()['fallbacks'] == 0
+    report = table.report['training_rows']
+    assert report['in_grid'] == 1.0 and 0 < report['label_agreement'] <= 1
+
+
+def test_rows_outside_the_grid_use_the_exact_model(tables, fitted_models, training):
+    table = tables['profit'][0]
+    exact = fitted_models['profit']
+    quantized = QuantizedModel(exact, table)
+    X = features('profit', training)[:10].copy()
+    bags = MODEL_FEATURES['profit'].index('total_bags')
+    rent = MODEL_FEATURES['profit'].index('monthly_rent_per_bag')
+    X[0, bags] = 10_000  # beyond the binned range
+    X[1, rent] = 45  # not on the rent list
+    X[2, bags] = -1
+
+    predicted = quantized.predict(X)
+    proba = quantized.predict_proba(X)
+
+    assert predicted[:3].tolist() == exact.predict(X[:3]).tolist()
+    np.testing.assert_array_equal(proba[:3], exact.predict_proba(X[:3]))
+    cells, _ = table.locate(X[3:])
+    np.testing.assert_array_equal(proba[3:], table.proba[cells])
+    assert quantized.stats()['fallbacks'] == 6  # 3 rows, predicted and predict_proba
+
+
+def test_saved_table_loads_and_checks_its_model(tables, transform, tmp_path):
+    _, arrays, manifest = tables['duration']
+    path = table_path(str(tmp_path), 'model.pkl')
+    save_table(arrays, manifest, path)
+
+    table = PredictionTable.load(path)
+    table.check('v1', MODEL_FEATURES['duration'], transform)
+    np.testing.assert_array_equal(table.labels, arrays['labels'])
+    with pytest.raises(ValueError, match='model version'):
+        table.check('v2', MODEL_FEATURES['duration'], transform)
+    with pytest.raises(ValueError, match='features'):
+        table.check('v1', MODEL_FEATURES['profit'], transform)
+
+
+def test_service_uses_a_table_only_above_the_agreement_floor(service, tables, fitted_models, transform, tmp_path,
+                                                             monkeypatch):
+    model = fitted_models['duration']
+    directory = str(tmp_path)
+    assert service.quantized('duration', model, directory, 'model.pkl', 'v1', transform) is model
+
+    table, arrays, manifest = tables['duration']
+    save_table(arrays, manifest, table_path(directory, 'model.pkl'))
+    monkeypatch.setattr(service, 'QUANTIZED_MIN_AGREEMENT', 0.0)
+    served = service.quantized('duration', model, directory, 'model.pkl', 'v1', transform)
+    assert isinstance(served, QuantizedModel)
+    # A table built for another version is never used
+    assert service.quantized('duration', model, directory, 'model.pkl', 'v2', transform) is model
+
+    monkeypatch.setattr(service, 'QUANTIZED_MIN_AGREEMENT', table.label_agreement() + 1e-9)
+    assert service.quantized('duration', model, directory, 'model.pkl', 'v1', transform) is model
@@ -0,0 +1,63 @@
+"""Report fan-out: one report per partition, resumable after an interruption"""
+
+import os
+import sys
+
+import pytest
+
+import report_fanout
+
+
+def run(monkeypatch, output_dir, *args):
+    monkeypatch.setattr(sys, 'argv', ['report_fanout.py', '--by', 'grain', '--dpi', '20', '--workers', '1',
+                                      '--output-dir', output_dir, *args])
+    report_fanout.main()
+
+
+def reports(output_dir):
+    grains_dir = os.path.join(output_dir, 'grains')
+    return {name: sorted(os.listdir(os.path.join(grains_dir, name))) for name in os.listdir(grains_dir)}
+
+
+def test_rerun_renders_only_missing_reports(tmp_path, monkeypatch, capsys):
+    output_dir = str(tmp_path / 'reports')
+    run(monkeypatch, output_dir)
+    written = reports(output_dir)
+    grains = sorted(written)
+    assert len(grains) > 1
+    assert all(files == ['customer_sales_analysis.png', 'grain_movement_analysis.png', 'summary.txt']
+               for files in written.values())
+    capsys.readouterr()
+
+    run(monkeypatch, output_dir)
+    assert 'Nothing to do' in capsys.readouterr().out
+
+    # An interrupted run: one report missing and a half-written one left behind
+    missing = os.path.join(output_dir, 'grains', grains[0])
+    finished = os.path.join(output_dir, 'grains', grains[1], report_fanout.SUMMARY_FILE)
+    mtime = os.stat(finished).st_mtime_ns
+    os.rename(missing, f'{missing}{report_fanout.TMP_SUFFIX}-12345')
+    run(monkeypatch, output_dir)
+
+    out = capsys.readouterr().out
+    assert f'Skipping {len(grains) - 1} reports' in out and 'Rendering 1 reports' in out
+    assert reports(output_dir) == written
+    assert os.stat(finished).st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize('force', [False, True])
+def test_pending_reports_split_by_partition(tmp_path, force):
+    movements = report_fanout.load_dataset('grain_movements', ['grain_type', 'customer_id', 'operation'])
+    activities = report_fanout.load_dataset('customer_activities', ['grain_type', 'customer_id'])
+    first = movements['customer_id'].iloc[0]
+    os.makedirs(report_fanout.report_dir(str(tmp_path), 'customer', first))
+
+    jobs, skipped = report_fanout.pending_reports(movements, activities, ['customer'], str(tmp_path), force)
+
+    customers = set(movements['customer_id']) | set(activities['customer_id'])
+    assert len(jobs) + skipped == len(customers)
+    assert skipped == (0 if force else 1)
+    expected_rows = len(movements) if force else (movements['customer_id'] != first).sum()
+    assert sum(len(job[2]) for job in jobs) == expected_rows
+    for _, key, movement_rows, activity_rows, _ in jobs:
+        assert (movement_rows['customer_id'] == key).all() and (activity_rows['customer_id'] == key).all()
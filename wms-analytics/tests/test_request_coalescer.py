@@ -0,0 +1,71 @@
+"""Coalesced single predictions: version grouping and parity with the batch endpoint"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from feature_assembly import MODEL_FEATURES
+from request_coalescer import MicroBatcher
+
+
+class RecordingModel:
+    """Predicts one constant label and records the batches it is called with"""
+
+    def __init__(self, label):
+        self.classes_ = np.asarray([label])
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(np.array(X))
+        return np.full(len(X), self.classes_[0])
+
+
+def test_predict_rows_uses_the_model_that_assembled_each_row(service, make_loaded):
+    old, new = RecordingModel('old'), RecordingModel('new')
+    old_loaded, new_loaded = make_loaded('duration', old, 'v1'), make_loaded('duration', new, 'v2')
+    rows = [np.full((1, 5), float(i)) for i in range(5)]
+    items = [(old_loaded, rows[0]), (new_loaded, rows[1]), (old_loaded, rows[2]),
+             (new_loaded, rows[3]), (old_loaded, rows[4])]
+
+    results = service.predict_rows('duration')(items)
+
+    assert results == [('v1', 'old'), ('v2', 'new'), ('v1', 'old'), ('v2', 'new'), ('v1', 'old')]
+    # One call per version, rows in queue order
+    assert [call[:, 0].tolist() for call in old.calls] == [[0.0, 2.0, 4.0]]
+    assert [call[:, 0].tolist() for call in new.calls] == [[1.0, 3.0]]
+
+
+def test_coalesced_rows_match_direct_predictions(service, fitted_models, make_loaded, payloads, encode):
+    loaded = make_loaded('duration', fitted_models['duration'])
+    X = encode(payloads, MODEL_FEATURES['duration'])
+    batcher = MicroBatcher(service.predict_rows('duration'), max_wait_ms=20, max_batch_size=16, name='test')
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: batcher.submit((loaded, X[i:i + 1]), timeout=10), range(len(X))))
+
+    assert [version for version, _ in results] == ['v1'] * len(X)
+    assert [label for _, label in results] == fitted_models['duration'].predict(X).tolist()
+    assert batcher.stats()['batches'] < len(X)
+
+
+def test_single_endpoints_agree_with_batch(serving, client, payloads, monkeypatch):
+    monkeypatch.setattr(serving, 'coalescers', {
+        name: MicroBatcher(serving.predict_rows(name), max_wait_ms=5, name=name) for name in serving.PREDICT_MATRIX
+    })
+    batch = client.post('/api/predict/batch', json={'customers': payloads}).get_json()['results']
+
+    def single(payload):
+        app_client = serving.app.test_client()
+        return {name: app_client.post(f'/api/predict/{name}', json=payload).get_json()
+                for name in ('price', 'profit', 'duration')}
+
+    with ThreadPoolExecutor(8) as pool:
+        singles = list(pool.map(single, payloads))
+
+    for result, answers in zip(batch, singles):
+        predictions = result['predictions']
+        assert answers['price']['predicted_price'] == predictions['price']
+        assert answers['duration']['predicted_duration'] == predictions['duration']
+        assert answers['profit']['is_profitable'] == predictions['profitable']
+        assert answers['profit']['probability'] == predictions['probability']
+        assert {answer['model_version'] for answer in answers.values()} == {'v1'}
@@ -0,0 +1,95 @@
+"""Sampling profiler: request stacks, merging across workers, and /admin/profile"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import sampling_profiler
+from sampling_profiler import ProfileInProgress, SamplingProfiler
+
+TOKEN = 'test-admin-token'
+
+
+def busy_handler(until):
+    while time.monotonic() < until:
+        sum(range(1000))
+
+
+def serve(profiler, endpoint, seconds):
+    """A thread that looks like a request to `endpoint` for `seconds` (None: not a request)"""
+    started = threading.Event()
+
+    def run():
+        if endpoint:
+            profiler.enter(endpoint)
+        started.set()
+        busy_handler(time.monotonic() + seconds)
+        profiler.leave()
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+    return thread
+
+
+def test_only_request_threads_are_sampled():
+    profiler = SamplingProfiler()
+    threads = [serve(profiler, 'predict_batch', 0.5), serve(profiler, None, 0.5)]
+
+    stacks = profiler.sample(0.2, 0.005)
+    for thread in threads:
+        thread.join()
+
+    assert stacks and all(stack.startswith('predict_batch;') for stack in stacks)
+    assert any('test_sampling_profiler.py:busy_handler' in stack for stack in stacks)
+    assert not profiler.sample(0.05, 0.005)  # nothing is served any more
+
+
+def test_profile_merges_the_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(sampling_profiler, 'MERGE_GRACE_SECONDS', 0.2)
+    profiler = SamplingProfiler(str(tmp_path))
+    control_path = os.path.join(str(tmp_path), sampling_profiler.CONTROL_FILE)
+
+    def other_worker():
+        # Answers the profile request as a watcher in another process would
+        while not os.path.exists(control_path):
+            time.sleep(0.01)
+        with open(control_path) as f:
+            request_id = json.load(f)['id']
+        with open(os.path.join(str(tmp_path), f'{sampling_profiler.RESULT_PREFIX}{request_id}-1.json'), 'w') as f:
+            json.dump({'predict_price;flask/app.py:wsgi_app': 5}, f)
+    helper = threading.Thread(target=other_worker)
+    helper.start()
+    thread = serve(profiler, 'predict_batch', 0.5)
+
+    collapsed, workers, samples = profiler.profile(0.2, 0.005)
+    thread.join()
+    helper.join()
+
+    assert workers == 2
+    assert 'predict_price;flask/app.py:wsgi_app 5\n' in collapsed
+    assert samples == sum(int(line.rsplit(' ', 1)[1]) for line in collapsed.splitlines())
+    assert samples > 5
+    assert os.listdir(str(tmp_path)) == [sampling_profiler.CONTROL_FILE]
+    # The request is still within its merge window
+    monkeypatch.setattr(sampling_profiler, 'MERGE_GRACE_SECONDS', 60)
+    with pytest.raises(ProfileInProgress):
+        profiler.profile(0.1)
+
+
+def test_profile_endpoint(serving, client, monkeypatch):
+    monkeypatch.setattr(serving, 'profiler', SamplingProfiler())
+    assert client.post('/admin/profile', json={'seconds': 0.1}).status_code == 403
+    monkeypatch.setattr(serving, 'ADMIN_TOKEN', TOKEN)
+    headers = {'X-Admin-Token': TOKEN}
+
+    assert client.post('/admin/profile', json={'seconds': 0}, headers=headers).status_code == 400
+    assert client.post('/admin/profile', json={'seconds': 'ten'}, headers=headers).status_code == 400
+    response = client.post('/admin/profile', json={'seconds': 0.1, 'interval_ms': 5}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers['X-Profile-Workers'] == '1'
+    assert int(response.headers['X-Profile-Samples']) == sum(
+        int(line.rsplit(' ', 1)[1]) for line in response.get_data(as_text=True).splitlines())
@@ -0,0 +1,80 @@
+"""Prometheus metrics: histograms, the sum over workers, and the service's counts"""
+
+import json
+import os
+
+import pytest
+
+import service_metrics
+from service_metrics import LATENCY_BUCKETS, ServiceMetrics
+
+
+def samples(text):
+    """{sample name with labels: value} from the exposition text"""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = ServiceMetrics()
+    for seconds in (0.0004, 0.003, 0.003, 7.0, 60.0):
+        metrics.observe('ml_request_duration_seconds', seconds, endpoint='predict_batch')
+
+    values = samples(metrics.render())
+
+    bucket = 'ml_request_duration_seconds_bucket{endpoint="predict_batch",le="%s"}'
+    assert values[bucket % '0.0005'] == 1
+    assert values[bucket % '0.0025'] == 1
+    assert values[bucket % '0.005'] == 3
+    assert values[bucket % '5'] == 3
+    assert values[bucket % '10'] == 4
+    assert values[bucket % '+Inf'] == 5
+    assert len([name for name in values if name.startswith('ml_request_duration_seconds_bucket')]) == \
+        len(LATENCY_BUCKETS) + 1
+    assert values['ml_request_duration_seconds_count{endpoint="predict_batch"}'] == 5
+    assert values['ml_request_duration_seconds_sum{endpoint="predict_batch"}'] == pytest.approx(67.0064)
+
+
+def test_labels_are_escaped():
+    metrics = ServiceMetrics()
+    metrics.inc('ml_requests_total', endpoint='a"b\\c\nd', status='200')
+    assert 'ml_requests_total{endpoint="a\\"b\\\\c\\nd",status="200"} 1' in metrics.render()
+
+
+def test_scrape_sums_every_worker(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    other = ServiceMetrics()
+    other.inc('ml_requests_total', 3, endpoint='predict_price', status='200')
+    other.observe('ml_batch_size', 40)
+    # The snapshot of a worker that has since exited
+    snapshot = {**other.snapshot(), 'pid': 2 ** 22 + 1}
+    with open(os.path.join(directory, f"{service_metrics.SNAPSHOT_PREFIX}{snapshot['pid']}.json"), 'w') as f:
+        json.dump(snapshot, f)
+
+    this = ServiceMetrics(directory)
+    monkeypatch.setattr(this, '_ensure_flusher', lambda: None)
+    this.inc('ml_requests_total', endpoint='predict_price', status='200')
+    values = samples(this.render())
+
+    assert values['ml_requests_total{endpoint="predict_price",status="200"}'] == 4
+    assert values['ml_batch_size_count'] == 1
+    assert values['ml_batch_size_bucket{le="50"}'] == 1
+    # Only live workers report memory
+    assert [name for name in values if name.startswith('process_resident_memory_bytes')] == [
+        f'process_resident_memory_bytes{{pid="{os.getpid()}"}}']
+
+
+def test_service_counts_requests_and_stages(serving, client, payloads, monkeypatch):
+    monkeypatch.setattr(serving, 'metrics', ServiceMetrics())
+    client.post('/api/predict/batch', json={'customers': payloads})
+    client.post('/api/predict/price', json={**payloads[0], 'total_bags': 'many'})
+
+    values = samples(client.get('/metrics').get_data(as_text=True))
+
+    assert values['ml_requests_total{endpoint="predict_batch",status="200"}'] == 1
+    assert values['ml_requests_total{endpoint="predict_price",status="400"}'] == 1
+    assert values['ml_request_errors_total{endpoint="predict_price"}'] == 1
+    assert 'ml_request_errors_total{endpoint="predict_batch"}' not in values
+    assert values['ml_batch_size_bucket{le="50"}'] == 1 and values['ml_batch_size_bucket{le="25"}'] == 0
+    for stage in ('parse', 'assemble', 'infer', 'serialize'):
+        assert values[f'ml_stage_duration_seconds_count{{endpoint="predict_batch",stage="{stage}"}}'] == 1
@@ -0,0 +1,42 @@
+"""Training pipeline: fits in the process pool are cached and reused"""
+
+import glob
+import os
+import pickle
+
+import numpy as np
+
+import train_models as tm
+
+
+def test_second_run_reuses_the_pool_fits(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(tm, 'CACHE_DIR', str(tmp_path / 'train_cache'))
+    output_dir = str(tmp_path / 'models')
+    model_path = os.path.join(output_dir, tm.TARGETS['profit']['model_file'])
+
+    first = tm.train(['profit'], output_dir, workers=2, forest_jobs=1)
+    with open(model_path, 'rb') as f:
+        first_model = pickle.load(f)
+    fits = sorted(glob.glob(os.path.join(tm.CACHE_DIR, 'fit-*.pkl')))
+    mtimes = [os.stat(path).st_mtime_ns for path in fits]
+    assert 'Fitting 3 models with 2 worker(s)' in capsys.readouterr().out
+
+    second = tm.train(['profit'], output_dir, workers=2, forest_jobs=1)
+    with open(model_path, 'rb') as f:
+        second_model = pickle.load(f)
+
+    assert 'Fitting' not in capsys.readouterr().out
+    assert len(fits) == len(tm.ESTIMATORS)
+    assert [os.stat(path).st_mtime_ns for path in fits] == mtimes
+    first_models, second_models = first['targets']['profit']['models'], second['targets']['profit']['models']
+    assert not any(m['cached'] for m in first_models.values())
+    assert all(m['cached'] and m['fit_seconds'] == 0 for m in second_models.values())
+    for model_name, metrics in first_models.items():
+        assert {k: v for k, v in second_models[model_name].items() if k not in ('cached', 'fit_seconds')} == \
+            {k: v for k, v in metrics.items() if k not in ('cached', 'fit_seconds')}
+    assert second['targets']['profit']['best_model'] == first['targets']['profit']['best_model']
+    assert type(second_model) is type(first_model)
+    assert second_model.get_params() == first_model.get_params()
+    dataset, _, cached = tm.load_featurized('profit', tm.load_dataset('customer_activities'))
+    assert cached
+    np.testing.assert_array_equal(second_model.predict(dataset['X_test']), first_model.predict(dataset['X_test']))
@@ -0,0 +1,87 @@
+"""Compiled models predict exactly what the scikit-learn models predict"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+import model_registry
+from tree_engine import CompiledModel, compile_model, is_current, save_compiled
+
+RNG = np.random.default_rng(7)
+X_TRAIN = RNG.normal(size=(600, 6))
+Y_BANDS = np.select([X_TRAIN[:, 0] > 0.5, X_TRAIN[:, 1] > 0], ['High Price', 'Medium Price'], 'Low Price')
+Y_BINARY = (X_TRAIN[:, 2] + X_TRAIN[:, 3] > 0).astype(int)
+X_RANDOM = RNG.normal(scale=2.0, size=(2000, 6))
+
+MODELS = {
+    'decision tree': lambda: DecisionTreeClassifier(max_depth=8, random_state=0).fit(X_TRAIN, Y_BANDS),
+    'random forest': lambda: RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0).fit(
+        X_TRAIN, Y_BANDS),
+    'binary forest': lambda: RandomForestClassifier(n_estimators=15, random_state=0).fit(X_TRAIN, Y_BINARY),
+    'logistic regression': lambda: LogisticRegression(max_iter=1000).fit(X_TRAIN, Y_BANDS),
+    'binary logistic regression': lambda: LogisticRegression(max_iter=1000).fit(X_TRAIN, Y_BINARY),
+}
+
+
+def assert_same_predictions(compiled, model):
+    np.testing.assert_array_equal(compiled.predict(X_RANDOM), model.predict(X_RANDOM))
+    np.testing.assert_array_equal(compiled.classes_, model.classes_)
+    if isinstance(model, LogisticRegression):
+        np.testing.assert_allclose(compiled.predict_proba(X_RANDOM), model.predict_proba(X_RANDOM),
+                                   rtol=1e-10, atol=1e-12)
+    else:
+        np.testing.assert_array_equal(compiled.predict_proba(X_RANDOM), model.predict_proba(X_RANDOM))
+
+
+@pytest.mark.parametrize('kind', list(MODELS))
+def test_compiled_model_matches_sklearn(kind):
+    model = MODELS[kind]()
+    assert_same_predictions(CompiledModel(compile_model(model)), model)
+
+
+@pytest.mark.parametrize('kind', list(MODELS))
+def test_saved_model_is_memory_mapped_and_matches(kind, tmp_path):
+    model = MODELS[kind]()
+    path = str(tmp_path / 'model.compiled')
+    save_compiled(model, path)
+
+    compiled = CompiledModel.load(path)
+
+    assert isinstance(compiled.threshold if compiled.kind == 'forest' else compiled.coef, np.memmap)
+    assert_same_predictions(compiled, model)
+
+
+def test_rewritten_pickle_makes_the_artifact_stale(tmp_path):
+    model_path = str(tmp_path / 'model.pkl')
+    compiled_path = str(tmp_path / 'model.compiled')
+    with open(model_path, 'wb') as f:
+        pickle.dump(MODELS['decision tree'](), f)
+    save_compiled(MODELS['decision tree'](), compiled_path, source_path=model_path)
+    assert is_current(compiled_path, model_path)
+
+    with open(model_path, 'wb') as f:
+        pickle.dump(MODELS['random forest'](), f)
+    assert not is_current(compiled_path, model_path)
+    # Touching the artifact afterwards does not make it current again
+    os.utime(os.path.join(compiled_path, 'manifest.json'))
+    assert not is_current(compiled_path, model_path)
+
+
+@pytest.mark.parametrize('model', [DecisionTreeRegressor(max_depth=3), LinearRegression()])
+def test_regressors_are_rejected(model, tmp_path):
+    model.fit(X_TRAIN, X_TRAIN[:, 0])
+    with pytest.raises(ValueError):
+        compile_model(model)
+
+    # publish() serves such a model from its pickle instead of failing
+    model_path = str(tmp_path / 'model.pkl')
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    registry = str(tmp_path / 'registry')
+    version = model_registry.publish('price', model_path, None, registry)
+    assert model_registry.current_version('price', registry) == version
@@ -0,0 +1,73 @@
+"""Data store: every reader returns the same rows in the same order"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import train_models as tm
+import wms_data
+
+
+def test_csv_readers_share_load_order():
+    loaded = wms_data.load_dataset('customer_activities', store_dir='/nonexistent')
+    appended, offset = wms_data.read_csv_appended('customer_activities', 0)
+
+    pd.testing.assert_frame_equal(appended, loaded)
+    dates = loaded['storage_start_date']
+    assert dates.is_monotonic_increasing
+    assert offset > 0
+
+
+def test_training_split_does_not_depend_on_the_reader():
+    loaded = wms_data.load_dataset('customer_activities', store_dir='/nonexistent')
+    appended, _ = wms_data.read_csv_appended('customer_activities', 0)
+    for name in tm.TARGETS:
+        _, key_loaded, _ = tm.load_featurized(name, loaded)
+        _, key_appended, _ = tm.load_featurized(name, appended)
+        assert key_loaded == key_appended
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    """A Parquet store converted from the CSV exports"""
+    store_dir = str(tmp_path_factory.mktemp('data_store'))
+    for name in wms_data.DATASETS:
+        wms_data.convert(name, store_dir=store_dir)
+    return store_dir
+
+
+@pytest.mark.parametrize('name', list(wms_data.DATASETS))
+@pytest.mark.parametrize('columns, start, end', [(None, None, None), (['grain_type'], '2023-06-15', '2024-02-10')])
+def test_parquet_store_returns_the_csv_frame(store, name, columns, start, end):
+    assert wms_data.parquet_available(name, store)
+
+    from_store = wms_data.load_dataset(name, columns, start, end, store_dir=store)
+    from_csv = wms_data.load_dataset(name, columns, start, end, store_dir='/nonexistent')
+
+    pd.testing.assert_frame_equal(from_store, from_csv)
+    assert 0 < len(from_store)
+
+
+@pytest.mark.parametrize('name', list(wms_data.DATASETS))
+def test_store_chunks_hold_every_row_once(store, name):
+    chunks = list(wms_data.iter_dataset(name, chunk_rows=1000, store_dir=store))
+
+    assert max(len(chunk) for chunk in chunks) <= 1000
+    rows = wms_data.in_load_order(name, pd.concat(chunks, ignore_index=True))
+    pd.testing.assert_frame_equal(rows, wms_data.load_dataset(name, store_dir=store), check_categorical=False)
+
+
+def test_append_adds_the_new_export(store, tmp_path):
+    name = 'grain_movements'
+    store_dir = str(tmp_path / 'store')
+    csv_path = os.path.join(wms_data.DATA_DIR, wms_data.DATASETS[name]['csv'])
+    wms_data.convert(name, store_dir=store_dir)
+
+    assert wms_data.append(name, csv_path, store_dir) == len(wms_data.read_csv(name))
+
+    both = wms_data.load_dataset(name, store_dir=store_dir)
+    once = wms_data.load_dataset(name, store_dir=store)
+    assert len(both) == 2 * len(once)
+    # Within a day the appended rows follow the rows already stored
+    pd.testing.assert_frame_equal(both.drop_duplicates(ignore_index=True), once, check_categorical=False)
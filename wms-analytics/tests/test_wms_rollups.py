@@ -0,0 +1,67 @@
+"""Dashboard rollups: date slices and incremental updates"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import wms_data
+import wms_rollups
+
+
+@pytest.fixture(scope='module')
+def rollups():
+    """{rollup name: rollup} computed from the CSV export"""
+    return {name: wms_rollups.load_rollup(name, store_dir='/nonexistent') for name in wms_rollups.ROLLUPS}
+
+
+@pytest.mark.parametrize('name', list(wms_rollups.ROLLUPS))
+@pytest.mark.parametrize('start, end', [(None, None), ('2025-04-01', '2026-03-31'), ('2025-06-01', None),
+                                        (None, '2025-06-15'), ('1990-01-01', '1990-12-31')])
+def test_date_slice_matches_a_filter(rollups, name, start, end):
+    rollup = rollups[name]
+    dates = rollup[wms_rollups.ROLLUPS[name]['date']]
+    mask = pd.Series(True, index=rollup.index)
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end)
+
+    pd.testing.assert_frame_equal(wms_rollups.date_slice(name, rollup, start, end), rollup[mask])
+
+
+@pytest.mark.parametrize('name', list(wms_rollups.ROLLUPS))
+def test_empty_rollup_can_be_sliced(name):
+    rollup = wms_rollups.merge(name)
+
+    assert pd.api.types.is_datetime64_dtype(rollup[wms_rollups.ROLLUPS[name]['date']])
+    assert wms_rollups.date_slice(name, rollup, '2025-01-01', '2025-12-31').empty
+    assert rollup['records'].sum() == 0
+
+
+def test_incremental_update_equals_a_rebuild(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    for name in wms_data.DATASETS:
+        wms_data.convert(name, store_dir=store_dir)
+    wms_rollups.update_rollups(store_dir)
+    new_exports = {}
+    for name, spec in wms_data.DATASETS.items():
+        export = pd.read_csv(os.path.join(wms_data.DATA_DIR, spec['csv']))
+        new_exports[name] = str(tmp_path / spec['csv'])
+        export.iloc[-500:].to_csv(new_exports[name], index=False)
+        wms_data.append(name, new_exports[name], store_dir)
+
+    folded = wms_rollups.update_rollups(store_dir)
+    incremental = {name: wms_rollups.load_rollup(name, store_dir=store_dir) for name in wms_rollups.ROLLUPS}
+    os.remove(os.path.join(wms_rollups.rollup_dir(store_dir), wms_rollups.STATE_FILE))
+    wms_rollups.update_rollups(store_dir)
+
+    assert folded == {name: 500 for name in wms_rollups.ROLLUPS}
+    assert wms_rollups.update_rollups(store_dir) == {name: 0 for name in wms_rollups.ROLLUPS}
+    for name, spec in wms_rollups.ROLLUPS.items():
+        rebuilt = wms_rollups.load_rollup(name, store_dir=store_dir)
+        pd.testing.assert_frame_equal(incremental[name], rebuilt)
+        rows = wms_data.load_dataset(spec['dataset'], store_dir=store_dir)
+        assert rebuilt['records'].sum() == len(rows)
+        for column in spec['sums']:
+            assert rebuilt[column].sum() == pytest.approx(rows[column].sum())
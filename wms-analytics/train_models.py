@@ -0,0 +1,364 @@
+"""
+WMS Analytics - Model Training Pipeline
+=======================================
+Scriptable replacement for running price_prediction.ipynb,
+profit_classification.ipynb and storage_duration.ipynb by hand.
+
+CUSTOMER_ACTIVITIES is loaded and encoded once, then the nine fits (Logistic
+Regression, Decision Tree and Random Forest for each of the three targets)
+run in a process pool, with the forests also using several cores. The rows
+come from wms_data.load_dataset() as in the notebooks, which returns the
+same row order from the CSV export and the Parquet store, and the features,
+splits, estimators and best-model rule (highest test F1) are the
+notebooks', so the same models are selected and saved:
+
+    model1_price_prediction_BEST.pkl        model1_label_encoders.pkl
+    model2_profit_classification_BEST.pkl   model2_label_encoders.pkl
+    model3_storage_duration_BEST.pkl        model3_label_encoders.pkl
+    feature_transform.json                  training_metrics.json
+
+Featurized datasets and fitted models are cached in .train_cache/, keyed by
+a hash of the rows they were built from, so a retrain after a data change
+only redoes the targets whose rows changed.
+
+Run with:
+    python train_models.py
+    python train_models.py --targets profit --workers 3 --forest-jobs 2
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_score, recall_score
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+from feature_assembly import MODEL_FEATURES
+from feature_transform import TRANSFORM_FILE, FeatureTransform
+from tree_engine import COMPILED_SUFFIX, save_compiled
+from wms_data import load_dataset
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('WMS_TRAIN_CACHE', os.path.join(BASE_DIR, '.train_cache'))
+METRICS_FILE = 'training_metrics.json'
+
+# Bump when featurize() changes, so cached datasets are rebuilt
+FEATURIZE_VERSION = 1
+
+# Encoder name -> (raw column, encoded feature column)
+ENCODED_COLUMNS = {
+    'grain': ('grain_type', 'grain_type_encoded'),
+    'activity': ('activity_status', 'activity_status_encoded'),
+    'sold': ('sold_status', 'sold_status_encoded'),
+}
+
+
+# Target builders return (rows, labels). bins is the notebooks' bins=3 for a
+# full training run, or fixed bin edges when labelling new rows the same way.
+
+def price_target(activities, bins=3):
+    rows = activities[activities['sale_price_per_kg'] > 0]
+    return rows, pd.cut(rows['sale_price_per_kg'], bins=bins, labels=['Low Price', 'Medium Price', 'High Price'])
+
+
+def profit_target(activities, bins=None):
+    return activities, (activities['profit_loss'] > 0).astype(int)
+
+
+def duration_target(activities, bins=3):
+    rows = activities[activities['storage_duration_days'] > 0]
+    return rows, pd.cut(rows['storage_duration_days'], bins=bins, labels=['Short-term', 'Medium-term', 'Long-term'])
+
+
+TARGETS = {
+    'price': {
+        'model_file': 'model1_price_prediction_BEST.pkl',
+        'encoder_file': 'model1_label_encoders.pkl',
+        'target': price_target,
+        'source': 'sale_price_per_kg',
+        'encoders': ['grain', 'activity', 'sold'],
+        'stratify': False,
+        'average': 'weighted',
+    },
+    'profit': {
+        'model_file': 'model2_profit_classification_BEST.pkl',
+        'encoder_file': 'model2_label_encoders.pkl',
+        'target': profit_target,
+        'source': 'profit_loss',
+        # profit_classification.ipynb pickles the grain encoder on its own
+        'encoders': ['grain', 'activity'],
+        'saved_encoders': 'grain',
+        'stratify': True,
+        'average': 'binary',
+    },
+    'duration': {
+        'model_file': 'model3_storage_duration_BEST.pkl',
+        'encoder_file': 'model3_label_encoders.pkl',
+        'target': duration_target,
+        'source': 'storage_duration_days',
+        'encoders': ['grain', 'activity'],
+        'stratify': False,
+        'average': 'weighted',
+    },
+}
+
+# In notebook order; ties on test F1 go to the first
+ESTIMATORS = {
+    'Logistic Regression': lambda forest_jobs: LogisticRegression(max_iter=1000, random_state=42),
+    'Decision Tree': lambda forest_jobs: DecisionTreeClassifier(random_state=42, max_depth=10),
+    'Random Forest': lambda forest_jobs: RandomForestClassifier(
+        n_estimators=100, random_state=42, max_depth=10, n_jobs=forest_jobs),
+}
+
+
+def frame_hash(frame):
+    """Content hash of a DataFrame's columns and rows, ignoring its index"""
+    digest = hashlib.sha1(repr(list(frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+# =============================================================================
+# Cache
+# =============================================================================
+
+def _cache_path(kind, key):
+    return os.path.join(CACHE_DIR, f'{kind}-{key}.pkl')
+
+
+def cache_get(kind, key):
+    try:
+        with open(_cache_path(kind, key), 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def cache_put(kind, key, value):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(kind, key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+# =============================================================================
+# Featurization
+# =============================================================================
+
+def featurize(name, activities):
+    """Encoded train/test split for one target, as in its notebook"""
+    spec = TARGETS[name]
+    rows, y = spec['target'](activities)
+    rows = rows.copy()
+    encoders = {}
+    for encoder_name in spec['encoders']:
+        column, encoded = ENCODED_COLUMNS[encoder_name]
+        encoders[encoder_name] = LabelEncoder()
+        rows[encoded] = encoders[encoder_name].fit_transform(rows[column])
+    X = rows[MODEL_FEATURES[name]]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y if spec['stratify'] else None
+    )
+    return {
+        'records': len(rows),
+        'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test,
+        'encoders': encoders,
+    }
+
+
+def load_featurized(name, activities):
+    """featurize() through the on-disk cache; returns (dataset, key, cached)"""
+    spec = TARGETS[name]
+    rows, _ = spec['target'](activities)
+    # Every raw column the features and the label are derived from
+    columns = ([ENCODED_COLUMNS[e][0] for e in spec['encoders']]
+               + [c for c in MODEL_FEATURES[name] if c in rows] + [spec['source']])
+    key = f"{name}-{frame_hash(rows[columns])}-v{FEATURIZE_VERSION}"
+    dataset = cache_get('features', key)
+    if dataset is not None:
+        return dataset, key, True
+    dataset = featurize(name, activities)
+    cache_put('features', key, dataset)
+    return dataset, key, False
+
+
+# =============================================================================
+# Training
+# =============================================================================
+
+def _fit_key(dataset_key, model_name, estimator, average):
+    params = sorted((k, repr(v)) for k, v in estimator.get_params().items() if k != 'n_jobs')
+    raw = repr((dataset_key, model_name, params, average, sklearn.__version__))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def score(model, dataset, average='weighted'):
+    """The notebooks' metrics for a fitted model"""
+    metrics = {}
+    for split in ('train', 'test'):
+        y_true = dataset[f'y_{split}']
+        y_pred = model.predict(dataset[f'X_{split}'])
+        label = split.capitalize()
+        metrics[f'{label} Accuracy'] = accuracy_score(y_true, y_pred)
+        metrics[f'{label} Precision'] = precision_score(y_true, y_pred, average=average, zero_division=0)
+        metrics[f'{label} Recall'] = recall_score(y_true, y_pred, average=average, zero_division=0)
+        metrics[f'{label} F1-Score'] = f1_score(y_true, y_pred, average=average, zero_division=0)
+        if split == 'test':
+            metrics['Confusion Matrix'] = confusion_matrix(y_true, y_pred).tolist()
+    return metrics
+
+
+def fit_one(name, model_name, dataset, forest_jobs):
+    """Fit, cross-validate and score one estimator; runs in a worker"""
+    warnings.filterwarnings('ignore')
+    start = time.perf_counter()
+    model = ESTIMATORS[model_name](forest_jobs)
+    model.fit(dataset['X_train'], dataset['y_train'])
+    metrics = score(model, dataset, TARGETS[name]['average'])
+    metrics['CV Accuracy'] = cross_val_score(
+        model, dataset['X_train'], dataset['y_train'], cv=5, scoring='accuracy').mean()
+    if 'n_jobs' in model.get_params():
+        # Serving predicts a few rows at a time; a thread pool per call only adds latency
+        model.set_params(n_jobs=None)
+    return name, model_name, model, metrics, time.perf_counter() - start
+
+
+def saved_encoders(name, encoders):
+    """Encoders in the form the target's notebook pickles them"""
+    spec = TARGETS[name]
+    return encoders[spec['saved_encoders']] if 'saved_encoders' in spec else encoders
+
+
+def write_pickle(path, value):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def save_best(name, model, encoders, output_dir):
+    spec = TARGETS[name]
+    model_path = os.path.join(output_dir, spec['model_file'])
+    write_pickle(model_path, model)
+    write_pickle(os.path.join(output_dir, spec['encoder_file']), saved_encoders(name, encoders))
+
+    # A compiled copy of the previous model would be stale; recompile it
+    compiled_path = model_path[:-len('.pkl')] + COMPILED_SUFFIX
+    if os.path.isdir(compiled_path):
+        try:
+            save_compiled(model, compiled_path, saved_encoders(name, encoders), source_path=model_path)
+        except ValueError as e:
+            print(f"  {name}: not recompiled ({e}); the service will serve the pickle")
+
+
+def save_transform(encoder_sets, output_dir):
+    """Write the category codes serving encodes payloads with
+
+    Categories of targets not retrained this run are kept from the
+    existing file.
+    """
+    path = os.path.join(output_dir, TRANSFORM_FILE)
+    categories = FeatureTransform.load(path).categories if os.path.exists(path) else {}
+    categories.update(FeatureTransform.from_encoders(*encoder_sets).categories)
+    FeatureTransform(categories).save(path)
+    return path
+
+
+def train(targets, output_dir=BASE_DIR, workers=None, forest_jobs=None, use_cache=True):
+    """Train every estimator for each target and save the best; returns the metrics report"""
+    workers = workers or os.cpu_count() or 1
+    forest_jobs = forest_jobs or max(1, (os.cpu_count() or 1) // workers)
+
+    start = time.perf_counter()
+    activities = load_dataset('customer_activities')
+    print(f"✓ Loaded {len(activities):,} customer activity records ({time.perf_counter() - start:.1f}s)")
+
+    datasets, dataset_keys, results, jobs = {}, {}, {}, []
+    for name in targets:
+        if use_cache:
+            datasets[name], dataset_keys[name], cached = load_featurized(name, activities)
+        else:
+            datasets[name], dataset_keys[name], cached = featurize(name, activities), None, False
+        print(f"✓ {name}: {datasets[name]['records']:,} records featurized{' (cached)' if cached else ''}")
+        results[name] = {}
+        for model_name in ESTIMATORS:
+            fit_key = (_fit_key(dataset_keys[name], model_name, ESTIMATORS[model_name](forest_jobs),
+                                TARGETS[name]['average']) if use_cache else None)
+            cached_fit = cache_get('fit', fit_key) if use_cache else None
+            if cached_fit is not None:
+                model, metrics = cached_fit
+                results[name][model_name] = (model, metrics, 0.0, True)
+            else:
+                jobs.append((name, model_name, fit_key))
+
+    if jobs:
+        workers = min(workers, len(jobs))
+        print(f"Fitting {len(jobs)} models with {workers} worker(s), forests on {forest_jobs} core(s) each")
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(fit_one, name, model_name, datasets[name], forest_jobs): fit_key
+                       for name, model_name, fit_key in jobs}
+            for future in as_completed(futures):
+                name, model_name, model, metrics, seconds = future.result()
+                results[name][model_name] = (model, metrics, seconds, False)
+                if futures[future] is not None:
+                    cache_put('fit', futures[future], (model, metrics))
+                print(f"  {name:<9}{model_name:<22}test F1 {metrics['Test F1-Score']:.4f}  ({seconds:.1f}s)")
+
+    os.makedirs(output_dir, exist_ok=True)
+    report = {'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'sklearn': sklearn.__version__, 'targets': {}}
+    for name in targets:
+        fitted = results[name]
+        best_name = max(ESTIMATORS, key=lambda m: (fitted[m][1]['Test F1-Score'], -list(ESTIMATORS).index(m)))
+        save_best(name, fitted[best_name][0], datasets[name]['encoders'], output_dir)
+        report['targets'][name] = {
+            'model_file': TARGETS[name]['model_file'],
+            'records': datasets[name]['records'],
+            'data_key': dataset_keys[name],
+            'best_model': best_name,
+            'models': {
+                model_name: {**{k: (float(v) if isinstance(v, (float, np.floating)) else v)
+                                for k, v in metrics.items()},
+                             'fit_seconds': round(seconds, 3), 'cached': cached}
+                for model_name, (_, metrics, seconds, cached) in fitted.items()
+            },
+        }
+        print(f"✓ {name}: best {best_name} (test F1 {fitted[best_name][1]['Test F1-Score']:.4f}) "
+              f"-> {TARGETS[name]['model_file']}")
+
+    save_transform([datasets[name]['encoders'] for name in targets], output_dir)
+    metrics_path = os.path.join(output_dir, METRICS_FILE)
+    with open(metrics_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Metrics written to {metrics_path} ({time.perf_counter() - start:.1f}s total)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the WMS prediction models')
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--output-dir', default=BASE_DIR)
+    parser.add_argument('--workers', type=int, default=None, help='fit processes (default: CPU count)')
+    parser.add_argument('--forest-jobs', type=int, default=None,
+                        help='cores per Random Forest fit (default: CPUs / workers)')
+    parser.add_argument('--no-cache', action='store_true', help='ignore and do not write .train_cache/')
+    args = parser.parse_args()
+    train(args.targets, args.output_dir, args.workers, args.forest_jobs, use_cache=not args.no_cache)
+
+
+if __name__ == '__main__':
+    main()
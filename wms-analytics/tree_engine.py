@@ -0,0 +1,316 @@
+"""
+WMS Analytics - Compiled Model Engine
+=====================================
+Flattens the notebooks' best models (Decision Tree, Random Forest or
+Logistic Regression) into packed NumPy arrays and evaluates them without
+scikit-learn.
+
+Trees are stored as one set of node arrays for the whole forest
+(feature, threshold, left/right children and per-node class probabilities)
+plus the root offset of every tree. Tree predictions and probabilities
+match scikit-learn exactly; Logistic Regression labels match exactly and its
+probabilities agree to floating-point rounding.
+
+Compile the trained models with:
+    python tree_engine.py
+
+This writes a `<model>.compiled/` directory next to every
+`model*_BEST.pkl`, which ml_api_service.py loads in place of the pickle as
+long as it was compiled from that pickle: the manifest records the
+pickle's content hash, and a retrained pickle makes the service ignore the
+stale artifact until it is compiled again.
+Each array is a separate `.npy` file opened with `np.load(mmap_mode='r')`,
+so every process serving the model maps the same physical pages from the
+OS page cache instead of holding a private copy. Scalars and metadata live
+in `manifest.json`. Single-file `.npz` artifacts from the first format are
+still readable, but are loaded into memory.
+"""
+
+import glob
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+from model_registry import file_version
+
+FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+MANIFEST_FILE = 'manifest.json'
+COMPILED_SUFFIX = '.compiled'
+
+
+class CompiledModel:
+    """Pure-NumPy batch evaluator for a compiled model"""
+
+    def __init__(self, arrays):
+        self.kind = str(arrays['kind'])
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = int(arrays['n_features'])
+        self.encoders = {
+            key[len('encoder_'):]: arrays[key]
+            for key in arrays if key.startswith('encoder_')
+        }
+
+        if self.kind == 'forest':
+            self.feature = arrays['feature']
+            self.threshold = arrays['threshold']
+            self.left = arrays['left']
+            self.right = arrays['right']
+            self.value = arrays['value']
+            self.roots = arrays['roots']
+            self.max_depth = int(arrays['max_depth'])
+        elif self.kind == 'linear':
+            self.coef = arrays['coef']
+            self.intercept = arrays['intercept']
+            self.multinomial = bool(arrays['multinomial'])
+        else:
+            raise ValueError(f'Unknown compiled model kind: {self.kind}')
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a compiled model written by save_compiled()
+
+        Directory artifacts are memory-mapped read-only unless mmap=False;
+        legacy `.npz` files are always read into memory.
+        """
+        if os.path.isdir(path):
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            arrays = dict(manifest['scalars'])
+            for name in manifest['arrays']:
+                arrays[name] = np.load(os.path.join(path, name + '.npy'),
+                                       mmap_mode='r' if mmap else None, allow_pickle=False)
+        else:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+        if int(arrays['format_version']) not in SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(f'{path}: unsupported format version {int(arrays["format_version"])}')
+        return cls(arrays)
+
+    def _check(self, X):
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected {self.n_features_in_} features, got shape {X.shape}')
+
+    def _forest_proba(self, X):
+        # Trees compare float32 inputs against float64 thresholds, as sklearn does
+        X = np.asarray(X, dtype=np.float32)
+        self._check(X)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)
+
+        # Walk every tree for every row at once; leaves point at themselves
+        node = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        # Accumulate per-tree probabilities in tree order to match sklearn's summation
+        leaf_values = self.value[node]
+        proba = np.zeros((n_samples, self.value.shape[1]), dtype=np.float64)
+        for tree_proba in leaf_values:
+            proba += tree_proba
+        proba /= len(self.roots)
+        return proba
+
+    def _decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self._check(X)
+        scores = X @ self.coef.T + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, X):
+        """Class probabilities, columns ordered as classes_"""
+        if self.kind == 'forest':
+            return self._forest_proba(X)
+
+        scores = self._decision_function(X)
+        if scores.ndim == 1:
+            prob = 1.0 / (1.0 + np.exp(-scores))
+            return np.vstack([1 - prob, prob]).T
+        if self.multinomial:
+            scores = scores - scores.max(axis=1)[:, np.newaxis]
+            np.exp(scores, out=scores)
+            scores /= scores.sum(axis=1)[:, np.newaxis]
+            return scores
+        prob = 1.0 / (1.0 + np.exp(-scores))
+        prob /= prob.sum(axis=1)[:, np.newaxis]
+        return prob
+
+    def predict(self, X):
+        """Predicted class labels"""
+        if self.kind == 'linear':
+            scores = self._decision_function(X)
+            indices = (scores > 0).astype(int) if scores.ndim == 1 else scores.argmax(axis=1)
+        else:
+            indices = self._forest_proba(X).argmax(axis=1)
+        return self.classes_.take(indices, axis=0)
+
+
+# =============================================================================
+# Export (offline; needs the pickled sklearn models)
+# =============================================================================
+
+def _flatten_trees(trees):
+    """Pack sklearn Tree objects into shared node arrays"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        if tree.n_outputs != 1:
+            raise ValueError('Only single-output trees can be compiled')
+        n_nodes = tree.node_count
+        leaf = tree.children_left == -1
+        own = np.arange(n_nodes)
+
+        features.append(np.where(leaf, 0, tree.feature).astype(np.intp))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append((np.where(leaf, own, tree.children_left) + offset).astype(np.intp))
+        rights.append((np.where(leaf, own, tree.children_right) + offset).astype(np.intp))
+
+        # scikit-learn >= 1.4 stores class fractions and returns them as-is;
+        # older versions store counts and normalise them in predict_proba
+        value = tree.value[:, 0, :].astype(np.float64)
+        if not np.allclose(value.sum(axis=1), 1.0):
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value = value / normalizer
+        values.append(value)
+
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.intp),
+        'max_depth': np.asarray(max_depth)
+    }
+
+
+def _as_plain_array(values):
+    """Convert labels to an array that loads without allow_pickle"""
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+def compile_model(model, encoders=None):
+    """Flatten a fitted sklearn model (and its label encoders) into arrays"""
+    if not hasattr(model, 'classes_'):
+        # Regressors (and unfitted models) have no classes to predict
+        raise ValueError(f'Cannot compile {type(model).__name__}: only fitted classifiers are supported')
+    if hasattr(model, 'estimators_'):
+        arrays = _flatten_trees([estimator.tree_ for estimator in model.estimators_])
+        arrays['kind'] = np.asarray('forest')
+    elif hasattr(model, 'tree_'):
+        arrays = _flatten_trees([model.tree_])
+        arrays['kind'] = np.asarray('forest')
+    elif hasattr(model, 'coef_'):
+        multi_class = getattr(model, 'multi_class', 'auto')
+        multinomial = (
+            len(model.classes_) > 2
+            and multi_class != 'ovr'
+            and getattr(model, 'solver', 'lbfgs') != 'liblinear'
+        )
+        arrays = {
+            'kind': np.asarray('linear'),
+            'coef': np.asarray(model.coef_, dtype=np.float64),
+            'intercept': np.asarray(model.intercept_, dtype=np.float64),
+            'multinomial': np.asarray(multinomial)
+        }
+    else:
+        raise ValueError(f'Cannot compile model of type {type(model).__name__}')
+
+    arrays['format_version'] = np.asarray(FORMAT_VERSION)
+    arrays['classes'] = _as_plain_array(model.classes_)
+    arrays['n_features'] = np.asarray(model.n_features_in_)
+
+    # model2 pickles a bare LabelEncoder, the others a dict of encoders
+    if encoders is not None and hasattr(encoders, 'classes_'):
+        encoders = {'grain': encoders}
+    for name, encoder in (encoders or {}).items():
+        arrays[f'encoder_{name}'] = _as_plain_array(encoder.classes_)
+    return arrays
+
+
+def save_compiled(model, path, encoders=None, source_path=None):
+    """Compile a model into a directory of mappable .npy files
+
+    `source_path` is the pickle the model was read from; its content hash
+    goes into the manifest so that is_current() can spot a stale artifact.
+    The directory is written next to its final location and swapped in
+    once complete, so readers never see a half-written artifact.
+    """
+    arrays = compile_model(model, encoders)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = {'scalars': {}, 'arrays': []}
+    if source_path is not None:
+        manifest['source_version'] = file_version(source_path)
+    for name, array in arrays.items():
+        if array.ndim == 0:
+            manifest['scalars'][name] = array.item()
+        else:
+            np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+            manifest['arrays'].append(name)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def is_current(path, source_path):
+    """False when `source_path` is not the pickle the compiled artifact at `path` came from
+
+    Artifacts without a recorded source hash (older ones, and .npz files)
+    are current when they are newer than the pickle. Without a pickle
+    there is nothing to be stale against.
+    """
+    if not os.path.exists(source_path):
+        return True
+    if os.path.isdir(path):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            source_version = json.load(f).get('source_version')
+        if source_version is not None:
+            return source_version == file_version(source_path)
+        path = os.path.join(path, MANIFEST_FILE)
+    return os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+
+def compile_directory(model_dir):
+    """Compile every model*_BEST.pkl in model_dir next to its pickle"""
+    compiled = []
+    for model_path in sorted(glob.glob(os.path.join(model_dir, 'model*_BEST.pkl'))):
+        prefix = os.path.basename(model_path).split('_')[0]
+        encoder_path = os.path.join(model_dir, f'{prefix}_label_encoders.pkl')
+
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        encoders = None
+        if os.path.exists(encoder_path):
+            with open(encoder_path, 'rb') as f:
+                encoders = pickle.load(f)
+
+        out_path = model_path[:-len('.pkl')] + COMPILED_SUFFIX
+        save_compiled(model, out_path, encoders, source_path=model_path)
+        print(f"✓ Compiled {os.path.basename(model_path)} -> {os.path.basename(out_path)}")
+        compiled.append(out_path)
+    return compiled
+
+
+if __name__ == '__main__':
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if not compile_directory(directory):
+        print("✗ No model*_BEST.pkl files found. Run the training notebooks first.")
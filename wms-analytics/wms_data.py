@@ -0,0 +1,315 @@
+"""
+WMS Analytics - Data Store
+==========================
+Shared loader for GRAIN_MOVEMENTS and CUSTOMER_ACTIVITIES, used by the
+dashboard, data_visualization.py and the training notebooks.
+
+The CSV exports can be converted into a typed Parquet store, partitioned by
+month of the dataset's main date column:
+
+    data_store/
+        grain_movements/
+            _common_metadata
+            month=2024-09/part-....parquet
+        customer_activities/
+            month=2023-03/part-....parquet
+
+Dates are stored as timestamps and low-cardinality text columns (grain_type,
+operation, quality_grade, activity_status, ...) as dictionary-encoded
+categories, so loading needs no parsing. load_dataset() reads only the
+requested columns and skips month partitions outside the requested date
+range. Without the store, or without pyarrow, it falls back to the CSVs and
+returns the same columns and types, with the rows in the same order: by the
+main date column, rows of equal date in export order. Seeded train/test
+splits therefore do not depend on which source was read.
+
+Convert the CSVs, or append a new export to the store:
+    python wms_data.py convert
+    python wms_data.py append grain_movements new_movements.csv
+"""
+
+import argparse
+import io
+import os
+import shutil
+import time
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # CSV-only mode
+    pa = None
+
+DATA_DIR = os.environ.get('WMS_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.environ.get('WMS_DATA_STORE', os.path.join(DATA_DIR, 'data_store'))
+
+PARTITION_COLUMN = 'month'
+SCHEMA_FILE = '_common_metadata'
+
+DATASETS = {
+    'grain_movements': {
+        'csv': 'GRAIN_MOVEMENTS.csv',
+        'date_column': 'transaction_date',
+        'dates': ['transaction_date'],
+        'categories': ['transaction_type', 'grain_type', 'operation', 'quality_grade'],
+    },
+    'customer_activities': {
+        'csv': 'CUSTOMER_ACTIVITIES.csv',
+        'date_column': 'storage_start_date',
+        'dates': ['storage_start_date', 'storage_end_date', 'sale_date'],
+        'categories': ['activity_status', 'grain_type', 'sold_status'],
+    },
+}
+
+
+def parquet_available(name, store_dir=STORE_DIR):
+    return pa is not None and os.path.exists(os.path.join(store_dir, name, SCHEMA_FILE))
+
+
+def _typed(name, frame):
+    """Parse dates and categorize text columns of a raw CSV frame"""
+    spec = DATASETS[name]
+    for column in spec['dates']:
+        if column in frame:
+            # Rows are partitioned on the main date, so it must parse
+            errors = 'raise' if column == spec['date_column'] else 'coerce'
+            frame[column] = pd.to_datetime(frame[column], errors=errors)
+    for column in spec['categories']:
+        if column in frame and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def read_csv(name, path=None, columns=None):
+    """Read a CSV export with dates parsed and categories typed"""
+    spec = DATASETS[name]
+    path = path or os.path.join(DATA_DIR, spec['csv'])
+    dtypes = {column: 'category' for column in spec['categories'] if columns is None or column in columns}
+    return _typed(name, pd.read_csv(path, usecols=columns, dtype=dtypes))
+
+
+def read_csv_appended(name, offset, path=None):
+    """Rows added to a CSV export after byte offset; returns (frame, end offset)
+
+    Offset 0 reads the whole export. Only complete lines are read, so an
+    export that is still being written is picked up where it stopped by the
+    next call with the returned offset. Rows come in load_dataset() order.
+    """
+    spec = DATASETS[name]
+    path = path or os.path.join(DATA_DIR, spec['csv'])
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = max(offset, f.tell())
+        f.seek(start)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    dtypes = {column: 'category' for column in spec['categories']}
+    frame = _typed(name, pd.read_csv(io.BytesIO(header + data), dtype=dtypes))
+    return in_load_order(name, frame), start + len(data)
+
+
+def _load_csv(name, columns, start, end):
+    date_column = DATASETS[name]['date_column']
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [date_column]))
+    frame = read_csv(name, columns=read_columns)
+    if start is not None or end is not None:
+        mask = pd.Series(True, index=frame.index)
+        if start is not None:
+            mask &= frame[date_column] >= start
+        if end is not None:
+            mask &= frame[date_column] <= end
+        frame = frame[mask].reset_index(drop=True)
+    return frame if columns is None else frame[list(columns)]
+
+
+def _file_schema(name, store_dir):
+    return pq.read_schema(os.path.join(store_dir, name, SCHEMA_FILE))
+
+
+def _open(name, store_dir):
+    schema = _file_schema(name, store_dir)
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive')
+    return ds.dataset(os.path.join(store_dir, name), format='parquet', partitioning=partitioning,
+                      schema=schema.append(pa.field(PARTITION_COLUMN, pa.string())))
+
+
+def _load_parquet(name, columns, start, end, store_dir):
+    dataset = _open(name, store_dir)
+    date_column = DATASETS[name]['date_column']
+    date_type = dataset.schema.field(date_column).type
+
+    # Month bounds prune whole partitions; the date bounds then filter rows
+    condition = None
+    for bound, op in ((start, 'ge'), (end, 'le')):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        month = ds.field(PARTITION_COLUMN)
+        date = ds.field(date_column)
+        value = pa.scalar(bound.to_pydatetime(), type=date_type)
+        clause = ((month >= bound.strftime('%Y-%m')) & (date >= value) if op == 'ge'
+                  else (month <= bound.strftime('%Y-%m')) & (date <= value))
+        condition = clause if condition is None else condition & clause
+
+    if columns is None:
+        columns = [field.name for field in dataset.schema if field.name != PARTITION_COLUMN]
+    table = dataset.to_table(columns=list(columns), filter=condition)
+    return table.to_pandas()
+
+
+def in_load_order(name, frame):
+    """Rows sorted by the main date column, ties in export order
+
+    The order load_dataset() and read_csv_appended() return, so that a
+    seeded train/test split of the same rows is the same whichever reader
+    produced them.
+    """
+    return frame.sort_values(DATASETS[name]['date_column'], kind='stable', ignore_index=True)
+
+
+def load_dataset(name, columns=None, start=None, end=None, store_dir=STORE_DIR):
+    """Load a dataset as a typed DataFrame
+
+    columns limits the columns read; start and end (inclusive) limit rows by
+    the dataset's main date column (transaction_date or storage_start_date).
+    Reads the Parquet store when it exists, the CSV export otherwise; either
+    way rows come sorted by the main date column, ties in export order.
+    """
+    if name not in DATASETS:
+        raise ValueError(f'Unknown dataset: {name}')
+    date_column = DATASETS[name]['date_column']
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [date_column]))
+    if parquet_available(name, store_dir):
+        frame = _load_parquet(name, read_columns, start, end, store_dir)
+    else:
+        frame = _load_csv(name, read_columns, start, end)
+    # The store holds each month's rows in this order already
+    frame = in_load_order(name, frame)
+    return frame if columns is None else frame[list(columns)]
+
+
+def iter_dataset(name, columns=None, chunk_rows=250_000, store_dir=STORE_DIR):
+    """Yield a dataset as typed DataFrames of at most chunk_rows rows
+
+    For passes over exports too large to load at once. Chunks read from the
+    CSV carry their own category sets, so combine per-chunk results on the
+    category values rather than on the codes.
+    """
+    if name not in DATASETS:
+        raise ValueError(f'Unknown dataset: {name}')
+    if parquet_available(name, store_dir):
+        dataset = _open(name, store_dir)
+        if columns is None:
+            columns = [field.name for field in dataset.schema if field.name != PARTITION_COLUMN]
+        for batch in dataset.to_batches(columns=list(columns), batch_size=chunk_rows):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+
+    spec = DATASETS[name]
+    dtypes = {column: 'category' for column in spec['categories'] if columns is None or column in columns}
+    with pd.read_csv(os.path.join(DATA_DIR, spec['csv']), usecols=columns, dtype=dtypes,
+                     chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _typed(name, chunk)
+
+
+# =============================================================================
+# Conversion and ingest
+# =============================================================================
+
+def _write_partitions(name, frame, dataset_dir, schema):
+    """Append frame to the store as one new file per month"""
+    date_column = DATASETS[name]['date_column']
+    months = frame[date_column].dt.strftime('%Y-%m')
+    batch_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    written = 0
+    for month, part in frame.groupby(months, sort=True):
+        part_dir = os.path.join(dataset_dir, f'{PARTITION_COLUMN}={month}')
+        os.makedirs(part_dir, exist_ok=True)
+        table = pa.Table.from_pandas(part.sort_values(date_column, kind='stable'), preserve_index=False)
+        table = table.cast(schema)
+        # Dot-prefixed files are ignored by readers until they are renamed
+        final_path = os.path.join(part_dir, f'part-{batch_id}.parquet')
+        tmp_path = os.path.join(part_dir, f'.part-{batch_id}.parquet.tmp')
+        pq.write_table(table, tmp_path, compression='zstd', use_dictionary=True)
+        os.replace(tmp_path, final_path)
+        written += len(part)
+    return written
+
+
+def _store_schema(name, frame):
+    """Parquet schema of a typed frame, with categories as string dictionaries"""
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    for column in DATASETS[name]['categories']:
+        index = schema.get_field_index(column)
+        schema = schema.set(index, pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+    return schema.remove_metadata()
+
+
+def convert(name, csv_path=None, store_dir=STORE_DIR):
+    """Rewrite a dataset's store from a CSV export; returns rows written"""
+    if pa is None:
+        raise ImportError('pyarrow is required to write the Parquet store')
+    frame = read_csv(name, path=csv_path)
+    schema = _store_schema(name, frame)
+
+    dataset_dir = os.path.join(store_dir, name)
+    tmp_dir = dataset_dir + '.tmp'
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    written = _write_partitions(name, frame, tmp_dir, schema)
+    pq.write_metadata(schema, os.path.join(tmp_dir, SCHEMA_FILE))
+
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    os.rename(tmp_dir, dataset_dir)
+    return written
+
+
+def append(name, csv_path, store_dir=STORE_DIR):
+    """Add the rows of a new CSV export to an existing store; returns rows written"""
+    if not parquet_available(name, store_dir):
+        raise ValueError(f'{name}: no Parquet store yet, run convert first')
+    frame = read_csv(name, path=csv_path)
+    return _write_partitions(name, frame, os.path.join(store_dir, name), _file_schema(name, store_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the WMS Parquet data store')
+    parser.add_argument('--store', default=STORE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_cmd = commands.add_parser('convert', help='rewrite the store from the CSV exports')
+    convert_cmd.add_argument('datasets', nargs='*', help=f"default: {' '.join(DATASETS)}")
+
+    append_cmd = commands.add_parser('append', help='add a new CSV export to the store')
+    append_cmd.add_argument('dataset', choices=list(DATASETS))
+    append_cmd.add_argument('csv')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        unknown = set(args.datasets) - set(DATASETS)
+        if unknown:
+            parser.error(f"unknown datasets: {', '.join(sorted(unknown))}")
+        for name in args.datasets or DATASETS:
+            start = time.perf_counter()
+            rows = convert(name, store_dir=args.store)
+            print(f"✓ {name}: {rows:,} rows -> {os.path.join(args.store, name)} ({time.perf_counter() - start:.1f}s)")
+    else:
+        rows = append(args.dataset, args.csv, store_dir=args.store)
+        print(f"✓ {args.dataset}: appended {rows:,} rows")
+
+    # Keep the dashboard rollups in step with the store
+    from wms_rollups import update_rollups
+    for name, rows in update_rollups(args.store).items():
+        print(f"✓ {name}: folded in {rows:,} rows")
+
+
+if __name__ == '__main__':
+    main()
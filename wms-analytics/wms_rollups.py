@@ -0,0 +1,197 @@
+"""
+WMS Analytics - Dashboard Rollups
+=================================
+Pre-aggregated daily totals that the Streamlit dashboard queries instead of
+the raw rows:
+
+    movements_daily   (date, grain_type, operation)
+                      -> records, total_weight_kg, number_of_bags
+    activities_daily  (storage_start_date, grain_type, activity_status)
+                      -> records, total_sale_amount, total_rent_paid,
+                         profit_loss, sale_price_per_kg (sum, for means)
+
+The rollups live next to the Parquet store (data_store/rollups/) and are
+maintained incrementally: the store only ever gains part files, so
+update_rollups() folds in the part files it has not seen yet and adds their
+totals to the existing rollup. History is only recomputed when part files
+disappear, i.e. after `wms_data.py convert` rewrote the store.
+
+`wms_data.py convert` and `append` update the rollups automatically; they
+can also be refreshed by hand:
+    python wms_rollups.py
+"""
+
+import glob
+import json
+import os
+
+import pandas as pd
+
+import wms_data
+
+ROLLUP_DIR_NAME = 'rollups'
+STATE_FILE = 'state.json'
+
+ROLLUPS = {
+    'movements_daily': {
+        'dataset': 'grain_movements',
+        'date': 'transaction_date',
+        'keys': ['grain_type', 'operation'],
+        'sums': ['total_weight_kg', 'number_of_bags'],
+    },
+    'activities_daily': {
+        'dataset': 'customer_activities',
+        'date': 'storage_start_date',
+        'keys': ['grain_type', 'activity_status'],
+        'sums': ['total_sale_amount', 'total_rent_paid', 'profit_loss', 'sale_price_per_kg'],
+    },
+}
+
+
+def rollup_dir(store_dir=wms_data.STORE_DIR):
+    return os.path.join(store_dir, ROLLUP_DIR_NAME)
+
+
+def aggregate(name, rows):
+    """Roll raw rows up to one row per day and key"""
+    spec = ROLLUPS[name]
+    keys = [spec['date']] + spec['keys']
+    frame = rows[keys + spec['sums']].copy()
+    frame[spec['date']] = frame[spec['date']].dt.normalize()
+    for key in spec['keys']:
+        frame[key] = frame[key].astype(str)
+    grouped = frame.groupby(keys, sort=False)
+    result = grouped[spec['sums']].sum()
+    result.insert(0, 'records', grouped.size())
+    return result.reset_index()
+
+
+def empty(name):
+    """A rollup without rows, with the column types of a real one
+
+    The date column stays datetime64 so that date_slice() can search it.
+    """
+    spec = ROLLUPS[name]
+    columns = {spec['date']: pd.Series(dtype='datetime64[ns]')}
+    columns.update({key: pd.Series(dtype=object) for key in spec['keys']})
+    columns['records'] = pd.Series(dtype='int64')
+    columns.update({column: pd.Series(dtype='float64') for column in spec['sums']})
+    return pd.DataFrame(columns)
+
+
+def merge(name, *rollups):
+    """Add rollups together, e.g. history plus newly ingested rows"""
+    spec = ROLLUPS[name]
+    keys = [spec['date']] + spec['keys']
+    parts = [r for r in rollups if r is not None and len(r)]
+    if not parts:
+        return empty(name)
+    return pd.concat(parts, ignore_index=True).groupby(keys, sort=True).sum().reset_index()
+
+
+def _part_files(dataset, store_dir):
+    dataset_dir = os.path.join(store_dir, dataset)
+    paths = glob.glob(os.path.join(dataset_dir, f'{wms_data.PARTITION_COLUMN}=*', 'part-*.parquet'))
+    return sorted(os.path.relpath(path, dataset_dir) for path in paths)
+
+
+def _read_state(store_dir):
+    try:
+        with open(os.path.join(rollup_dir(store_dir), STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_atomic(path, write):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_state(path, state):
+    with open(path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def update_rollups(store_dir=wms_data.STORE_DIR):
+    """Fold part files added since the last update into the rollups
+
+    Returns the number of raw rows folded in per rollup.
+    """
+    state = _read_state(store_dir)
+    os.makedirs(rollup_dir(store_dir), exist_ok=True)
+    folded = {}
+    for name, spec in ROLLUPS.items():
+        dataset = spec['dataset']
+        if not wms_data.parquet_available(dataset, store_dir):
+            continue
+        seen = set(state.get(name, []))
+        files = _part_files(dataset, store_dir)
+        rollup_path = os.path.join(rollup_dir(store_dir), f'{name}.parquet')
+
+        existing = None
+        if seen and seen.issubset(files) and os.path.exists(rollup_path):
+            existing = pd.read_parquet(rollup_path)
+        else:
+            seen = set()  # the store was rewritten: rebuild from scratch
+        new_files = [path for path in files if path not in seen]
+        if not new_files and existing is not None:
+            folded[name] = 0
+            continue
+
+        columns = [spec['date']] + spec['keys'] + spec['sums']
+        dataset_dir = os.path.join(store_dir, dataset)
+        new_rows = [wms_data.pq.read_table(os.path.join(dataset_dir, path), columns=columns).to_pandas()
+                    for path in new_files]
+        rows = pd.concat(new_rows, ignore_index=True) if new_rows else None
+        rollup = merge(name, existing, aggregate(name, rows) if rows is not None else None)
+        _write_atomic(rollup_path, lambda path: rollup.to_parquet(path, index=False))
+
+        state[name] = files
+        folded[name] = 0 if rows is None else len(rows)
+
+    _write_atomic(os.path.join(rollup_dir(store_dir), STATE_FILE),
+                  lambda path: _write_state(path, state))
+    return folded
+
+
+def rollups_version(store_dir=wms_data.STORE_DIR):
+    """Changes whenever the rollups do; use it as a cache key"""
+    try:
+        return os.stat(os.path.join(rollup_dir(store_dir), STATE_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_rollup(name, start=None, end=None, store_dir=wms_data.STORE_DIR):
+    """Daily rollup rows with the date in [start, end], sorted by date
+
+    Without a Parquet store the rollup is computed from the CSV export.
+    """
+    spec = ROLLUPS[name]
+    rollup_path = os.path.join(rollup_dir(store_dir), f'{name}.parquet')
+    if wms_data.parquet_available(spec['dataset'], store_dir) and os.path.exists(rollup_path):
+        rollup = pd.read_parquet(rollup_path)
+    else:
+        columns = [spec['date']] + spec['keys'] + spec['sums']
+        rollup = merge(name, aggregate(name, wms_data.load_dataset(spec['dataset'], columns, store_dir=store_dir)))
+
+    return date_slice(name, rollup, start, end)
+
+
+def date_slice(name, rollup, start=None, end=None):
+    """Rows of a rollup with the date in [start, end]
+
+    Rollups are kept sorted by date, so this is two binary searches and a
+    slice rather than a scan of the whole date column.
+    """
+    dates = rollup[ROLLUPS[name]['date']].to_numpy()
+    lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+    hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end).to_datetime64(), side='right')
+    return rollup.iloc[lo:hi]
+
+
+if __name__ == '__main__':
+    for rollup_name, rows in update_rollups().items():
+        print(f"✓ {rollup_name}: folded in {rows:,} new rows")